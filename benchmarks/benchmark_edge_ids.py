@@ -0,0 +1,65 @@
+'''
+	Benchmark of json_validator.assign_edge_ids.
+
+	Times edge ID assignment for graphs of 1k up to 1M edges (a third of them
+	multi-edges) and prints the time per edge, which stays flat when the
+	assignment scales linearly with the number of edges.
+
+	Run from the benchmarks directory: python benchmark_edge_ids.py [max_edges]
+	The correctness of the ID's is checked by tests/edge_ids_test.py.
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from graphs.util.json_validator import assign_edge_ids
+
+def build_graph(num_edges):
+	'''
+		Graph with num_edges edges over num_edges / 3 distinct node pairs,
+		so every pair is connected by three (multi-)edges.
+	'''
+	edges = []
+	for i in xrange(num_edges):
+		pair = i % max(num_edges / 3, 1)
+		edges.append({'data': {'source': pair, 'target': pair + 1}})
+
+	return {'metadata': {}, 'graph': {'nodes': [], 'edges': edges}}
+
+def benchmark(num_edges, repeat=3):
+	'''
+		Best time (seconds) to assign ID's to a graph with num_edges edges.
+	'''
+	best = None
+	for run in xrange(repeat):
+		graph = build_graph(num_edges)
+
+		start = time.time()
+		assign_edge_ids(graph)
+		elapsed = time.time() - start
+
+		if best == None or elapsed < best:
+			best = elapsed
+
+	# Sanity check, all ID's must be unique
+	ids = set([edge['data']['id'] for edge in graph['graph']['edges']])
+	if len(ids) != num_edges:
+		print "Error: assign_edge_ids produced duplicate ID's for", num_edges, "edges"
+
+	return best
+
+if __name__ == '__main__':
+	max_edges = 1000000
+	if len(sys.argv) > 1:
+		max_edges = int(sys.argv[1])
+
+	print "%10s %12s %16s" % ("edges", "seconds", "microsec/edge")
+
+	num_edges = 1000
+	while num_edges <= max_edges:
+		elapsed = benchmark(num_edges)
+		print "%10d %12.4f %16.3f" % (num_edges, elapsed, elapsed * 1e6 / num_edges)
+		num_edges *= 10
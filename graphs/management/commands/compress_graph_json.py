@@ -0,0 +1,38 @@
+'''
+    Rewrites the JSON of every stored graph in the configured storage format,
+    moving JSON that is kept in graph rows to the shared graph_blob table.
+
+    Usage: python manage.py compress_graph_json [--format=zlib] [--batch-size=100]
+'''
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from graphs.util import db
+from graphs.util import json_storage
+
+class Command(BaseCommand):
+    help = 'Rewrites the JSON of every graph compactly (and compressed) in the given storage format.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format',
+            dest='storage_format',
+            default=None,
+            help='Storage format: ' + ', '.join(json_storage.STORAGE_FORMATS) + ' (default: GRAPH_JSON_STORAGE_FORMAT setting)'),
+        make_option('--batch-size',
+            dest='batch_size',
+            type='int',
+            default=100,
+            help='Number of graphs (or blobs) rewritten per transaction'),
+    )
+
+    def handle(self, *args, **options):
+        storage_format = options['storage_format']
+
+        if storage_format != None and storage_format not in json_storage.STORAGE_FORMATS:
+            raise CommandError('Unknown storage format: ' + storage_format)
+
+        stats = db.rewrite_graph_json(storage_format, options['batch_size'])
+
+        self.stdout.write('Rewrote %d graphs and %d shared graph JSON blobs in %s format: %d bytes -> %d bytes' % (stats['graphs'], stats['blobs'], json_storage.resolve_format(storage_format), stats['bytes_before'], stats['bytes_after']))
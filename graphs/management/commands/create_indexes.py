@@ -0,0 +1,22 @@
+'''
+    Creates the indexes of graphs.models that an existing database does not
+    have yet (new databases get every index when their tables are created).
+    Safe to run while GraphSpace is running, and more than once.
+
+    Usage: python manage.py create_indexes
+'''
+
+from django.core.management.base import BaseCommand
+
+import graphs.models as models
+
+class Command(BaseCommand):
+    help = 'Creates the indexes that are missing from an existing GraphSpace database.'
+
+    def handle(self, *args, **options):
+        created = models.create_missing_indexes(models.engine)
+
+        for index_name in created:
+            self.stdout.write('Created index %s' % (index_name))
+
+        self.stdout.write('Created %d missing indexes' % (len(created)))
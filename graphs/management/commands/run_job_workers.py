@@ -0,0 +1,54 @@
+'''
+    Runs a pool of worker processes that execute queued background jobs
+    (see graphs.util.jobs).
+
+    Usage: python manage.py run_job_workers [--workers=4]
+'''
+
+import os
+
+from multiprocessing import Process
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from graphs.util import db
+from graphs.util import jobs
+
+def _worker():
+    # Connections of the parent process must not be shared with the worker
+    db.data_connection.engine.dispose()
+    jobs.work(os.getpid())
+
+class Command(BaseCommand):
+    help = 'Runs worker processes that execute queued graph uploads, updates, deletes and visibility changes.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--workers',
+            dest='workers',
+            type='int',
+            default=4,
+            help='Number of worker processes'),
+    )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('At least one worker is needed')
+
+        # Jobs left running by workers that were stopped (eg by a restart) are marked as failed
+        for job_id in jobs.recover_stale_jobs():
+            self.stdout.write('Job %d was left running by a stopped worker, marked as failed' % job_id)
+
+        workers = [Process(target=_worker) for i in xrange(options['workers'])]
+
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        self.stdout.write('Started %d job workers, spooling to %s' % (len(workers), jobs.JOB_SPOOL_DIR))
+
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping job workers')
@@ -0,0 +1,26 @@
+'''
+    Middleware to manage the per-request SQLAlchemy session.
+'''
+
+import graphs.util.db_init as db_init
+
+class DatabaseSessionMiddleware(object):
+    '''
+        Gives every request its own database session and makes sure it is
+        closed (and its connection returned to the pool) once the request is done.
+    '''
+
+    def process_request(self, request):
+        # Start every request with a fresh thread-local session
+        db_init.db.remove_session()
+        return None
+
+    def process_exception(self, request, exception):
+        # Do not leave a half finished transaction behind for the next request
+        db_init.db.Session.rollback()
+        db_init.db.remove_session()
+        return None
+
+    def process_response(self, request, response):
+        db_init.db.remove_session()
+        return response
@@ -16,7 +16,8 @@ from sqlalchemy.orm import relationship, backref
 from sqlalchemy.types import TIMESTAMP
 from django.db import models
 from django.conf import settings
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import DBAPIError
 
 import bcrypt
 
@@ -139,6 +140,21 @@ class Graph(Base):
     #specify many to many relationship with GraphTag
     # tags = relationship("GraphTag", secondary=graph_to_tag, backref='graph')
 
+class GraphBlob(Base):
+    '''
+        JSON of graphs, kept once per distinct content.  The graph.json
+        column refers to a row by the hash of the JSON (see
+        graphs.util.json_storage), so identical graphs share their JSON.
+    '''
+    __tablename__ = 'graph_blob'
+
+    # SHA-256 hash of the compact JSON text
+    content_hash = Column(String, primary_key = True)
+    # JSON in its storage format (see graphs.util.json_storage)
+    json = Column(String, nullable = False)
+    # number of graphs referring to this row, the row is deleted when it drops to 0
+    ref_count = Column(Integer, nullable = False)
+
 class GraphTag(Base):
     '''
         Table of tags that are assigned to each graph to categorize them.
@@ -210,6 +226,20 @@ class PasswordReset(Base):
 
     #no relationship specified
 
+class ApiToken(Base):
+    '''
+        Tokens REST clients authenticate with instead of a password.  Only a
+        keyed hash of every token is stored (see graphs.util.credentials).
+    '''
+    __tablename__ = 'api_token'
+
+    # HMAC-SHA256 of the token
+    token_hash = Column(String, primary_key = True)
+    user_id = Column(String, ForeignKey('user.user_id', ondelete="CASCADE", onupdate="CASCADE"), nullable = False)
+    # what the token is used for (eg the name of a script)
+    description = Column(String, nullable = True)
+    created = Column(TIMESTAMP, nullable = False)
+
 class Edge(Base):
     '''
         Table of edges that are used on graphs.
@@ -239,6 +269,33 @@ class Edge(Base):
             ForeignKeyConstraint([user_id, graph_id, tail_node_id], [Node.user_id, Node.graph_id, Node.node_id], ondelete="CASCADE", onupdate="CASCADE"), {})
     #no relationship specified
 
+class Job(Base):
+    '''
+        Queue of graph operations (uploads, updates, tag-wide deletes and
+        visibility changes) that run in background workers.  See graphs.util.jobs.
+    '''
+    __tablename__ = 'job'
+
+    job_id = Column(Integer, autoincrement=True, primary_key=True)
+    # user who queued the job
+    user_id = Column(String, ForeignKey('user.user_id', ondelete="CASCADE", onupdate="CASCADE"), nullable = False)
+    # operation to run (see graphs.util.jobs.JOB_TYPES) and its arguments (JSON)
+    job_type = Column(String, nullable = False)
+    arguments = Column(String, nullable = False)
+    # queued, running, done or failed
+    status = Column(String, nullable = False)
+    # items (rows or graphs) processed so far and in total (if known)
+    items_done = Column(Integer, nullable = True)
+    items_total = Column(Integer, nullable = True)
+    # message of a finished job, or error of a failed one
+    result = Column(String, nullable = True)
+    error = Column(String, nullable = True)
+    # id of the worker process running the job
+    worker = Column(Integer, nullable = True)
+    created = Column(TIMESTAMP, nullable = False)
+    started = Column(TIMESTAMP, nullable = True)
+    finished = Column(TIMESTAMP, nullable = True)
+
 
 # CREATE INDEX graph_id_modified_user_id_public on graph(graph_id, modified, user_id, public);
 # CREATE INDEX graph_data_idx on graph(graph_id, modified, user_id, public);
@@ -268,6 +325,9 @@ Index('graph_idx_user_graph_id', Graph.user_id, Graph.graph_id)
 # Table: graph. Columns: user_id, modified, public
 Index('graph_idx_user_id_modified_id_public', Graph.user_id, Graph.graph_id, Graph.modified, Graph.public)
 # Table: graph. Columns: modified, user_id, graph_id, public
+Index('graph_idx_modified_user_id_graph_id', Graph.modified, Graph.user_id, Graph.graph_id)
+# Table: group_to_graph. Columns: group_id, group_owner, modified, user_id, graph_id (group page order)
+Index('group_to_graph_idx_group_id_modified', GroupToGraph.group_id, GroupToGraph.group_owner, GroupToGraph.modified, GroupToGraph.user_id, GroupToGraph.graph_id)
 # Table: graph_to_tag. Columns: graph_id, user_id
 Index('graph_to_tag_idx_graph_id_user_id', GraphToTag.graph_id, GraphToTag.user_id, GraphToTag.tag_id)
 # Table: graph_to_tag. Columns: tag_id
@@ -293,6 +353,16 @@ Index('layout_idx_owner_id', Layout.owner_id)
 Index('node_idx_graph_id_user_id', Node.graph_id, Node.user_id, Node.node_id, Node.label)
 Index('node_index_label_graph_id', Node.label)
 Index('node_index_node_id_graph_id', Node.node_id)
+# Table: edge. Columns: head_node_id, tail_node_id
+Index('edge_idx_head_node_id_tail_node_id', Edge.head_node_id, Edge.tail_node_id)
+# Table: edge. Columns: tail_node_id, head_node_id
+Index('edge_idx_tail_node_id_head_node_id', Edge.tail_node_id, Edge.head_node_id)
+# Table: edge. Columns: graph_id, user_id (edges of a graph, eg when it is updated or deleted)
+Index('edge_idx_graph_id_user_id', Edge.graph_id, Edge.user_id)
+# Table: job. Columns: status, job_id (next queued job)
+Index('job_idx_status_job_id', Job.status, Job.job_id)
+# Table: api_token. Columns: user_id (tokens of a user, eg when they are revoked)
+Index('api_token_idx_user_id', ApiToken.user_id)
 
 # Create an engine that stores data in the local directory's
 # sqlalchemy_example.db file.
@@ -301,3 +371,34 @@ engine = create_engine(settings.DATABASE_LOCATION, echo=False)
 # Create all tables in the engine. This is equivalent to "Create Table"
 # statements in raw SQL.
 Base.metadata.create_all(engine)
+
+def create_missing_indexes(engine):
+    '''
+        Creates the indexes declared above that the database does not have yet.
+        create_all only builds the indexes of the tables it creates, so indexes
+        added to a table that already exists (eg the edge indexes used by the
+        edge search, or the graph and group_to_graph indexes used by keyset
+        pagination) have to be created with the create_indexes management command.
+
+        :return Indexes: Names of the indexes that were created
+    '''
+    created = []
+
+    for table in Base.metadata.sorted_tables:
+        existing = set([index['name'] for index in inspect(engine).get_indexes(table.name)])
+
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+
+            try:
+                index.create(engine)
+            except DBAPIError:
+                # Another process may have created the index in the meantime
+                if index.name in set([other['name'] for other in inspect(engine).get_indexes(table.name)]):
+                    continue
+                raise
+
+            created.append(index.name)
+
+    return created
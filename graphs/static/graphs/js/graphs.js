@@ -82,7 +82,7 @@ $(document).ready(function() {
   function urlAppender(url, queryTerm, queryValue) {
     if (queryValue.length > 0) {
       var tempUrl = updateQueryStringParameter(url, queryTerm, queryValue);
-      window.location.href = removeURLParameter(tempUrl, 'page');
+      window.location.href = removePagePosition(tempUrl);
     } else {
       window.location.href = window.location.href.split('?')[0];
     }
@@ -219,11 +219,11 @@ $(document).ready(function() {
    */
   function setOrderQuery(iconId, sortValue) {
     if (iconId == 'order_graphs_icon') {
-      window.location.href = updateQueryStringParameter(window.location.href, "order", "graph_" + sortValue);
+      window.location.href = updateQueryStringParameter(removePagePosition(window.location.href), "order", "graph_" + sortValue);
     } else if (iconId == 'order_owner_icon') {
-      window.location.href = updateQueryStringParameter(window.location.href, "order", "owner_" + sortValue);
+      window.location.href = updateQueryStringParameter(removePagePosition(window.location.href), "order", "owner_" + sortValue);
     } else if (iconId == 'order_modified_icon') {
-      window.location.href = updateQueryStringParameter(window.location.href, "order", "modified_" + sortValue);
+      window.location.href = updateQueryStringParameter(removePagePosition(window.location.href), "order", "modified_" + sortValue);
     }
   }
 
@@ -255,6 +255,15 @@ $(document).ready(function() {
     }
   }
 
+  /*
+   * Removes the position in the listing (page cursor) from the url,
+   * since it is only valid for the current search, tags and order.
+   * @param url URL to parse
+   */
+  function removePagePosition(url) {
+    return removeURLParameter(removeURLParameter(removeURLParameter(url, 'page'), 'cursor'), 'direction');
+  }
+
   /**
    * Updates specified value in the query.
    */
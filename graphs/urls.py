@@ -79,6 +79,7 @@ urlpatterns = patterns('',
         url(r'^api/users/(?P<user_id>.+)/graph/delete/(?P<graphname>.+)/$', views.remove_graph, name='remove_graph'),
         url(r'^api/users/(?P<user_id>.+)/graph/makeGraphPublic/(?P<graphname>.+)/$', views.make_graph_public, name='make_graph_public'),
         url(r'^api/users/(?P<user_id>.+)/graph/makeGraphPrivate/(?P<graphname>.+)/$', views.make_graph_private, name='make_graph_private'),
+        url(r'^api/users/(?P<user_id>.+)/graphs/batch/$', views.batch_graph_operations, name='batch_graph_operations'),
         url(r'^api/users/(?P<user_id>.+)/graphs/$', views.view_all_graphs_for_user, name='view_all_graphs_for_user'),
 
         # Group REST API endpoints
@@ -99,6 +100,13 @@ urlpatterns = patterns('',
         url(r'^api/tags/user/(?P<username>.+)/(?P<graphname>.+)/$', views.get_all_tags_for_graph, name='get_all_tags_for_graph'),
         url(r'^api/tags/user/(?P<username>.+)/$', views.get_tags_for_user, name='get_tags_for_user'),
 
+        # Job REST API endpoints
+        url(r'^api/jobs/(?P<job_id>\d+)/$', views.job_status, name='job_status'),
+
+        # API token REST API endpoints
+        url(r'^api/users/(?P<user_id>.+)/tokens/add/$', views.add_api_token, name='add_api_token'),
+        url(r'^api/users/(?P<user_id>.+)/tokens/delete/$', views.delete_api_token, name='delete_api_token'),
+
         
         # THE FOLLOWING SECTION CONTAINS ALL LINKS THAT ARE ALREADY IN GRAPHSPACE BUT WITHOUT THE TRAILING '/' CHARACTER
         url(r'^index$', views.index, name='index'),
@@ -172,6 +180,7 @@ urlpatterns = patterns('',
         url(r'^api/users/(?P<user_id>.+)/graph/delete/(?P<graphname>.+)$', views.remove_graph, name='remove_graph'),
         url(r'^api/users/(?P<user_id>.+)/graph/makeGraphPublic/(?P<graphname>.+)$', views.make_graph_public, name='make_graph_public'),
         url(r'^api/users/(?P<user_id>.+)/graph/makeGraphPrivate/(?P<graphname>.+)$', views.make_graph_private, name='make_graph_private'),
+        url(r'^api/users/(?P<user_id>.+)/graphs/batch$', views.batch_graph_operations, name='batch_graph_operations'),
         url(r'^api/users/(?P<user_id>.+)/graphs$', views.view_all_graphs_for_user, name='view_all_graphs_for_user'),
 
        # Group REST API endpoints
@@ -192,5 +201,12 @@ urlpatterns = patterns('',
         url(r'^api/tags/user/(?P<username>.+)/(?P<graphname>.+)$', views.get_all_tags_for_graph, name='get_all_tags_for_graph'),
         url(r'^api/tags/user/(?P<username>.+)$', views.get_tags_for_user, name='get_tags_for_user'),
 
+        # Job REST API endpoints
+        url(r'^api/jobs/(?P<job_id>\d+)$', views.job_status, name='job_status'),
+
+        # API token REST API endpoints
+        url(r'^api/users/(?P<user_id>.+)/tokens/add$', views.add_api_token, name='add_api_token'),
+        url(r'^api/users/(?P<user_id>.+)/tokens/delete$', views.delete_api_token, name='delete_api_token'),
+
         )
 
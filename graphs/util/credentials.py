@@ -0,0 +1,128 @@
+'''
+    Fast checks of the credentials REST clients send with every request.
+
+    Passwords are stored with bcrypt, which is slow on purpose (around 100ms
+    of CPU per check).  Scripts that make thousands of calls can avoid it
+    in two ways:
+
+    - API tokens: random tokens created once per user (POST
+      api/users/<user_id>/tokens/add/) and sent instead of the password.
+      Only an HMAC-SHA256 of a token (keyed with SECRET_KEY) is stored, so
+      checking one is a single lookup of its hash.
+
+    - Verified credentials: a username/password pair that passed the bcrypt
+      check is remembered for CREDENTIAL_CACHE_TTL seconds, so clients that
+      still send their password pay for bcrypt once per TTL.  Only an HMAC of
+      the pair is kept, together with the bcrypt hash it was checked
+      against, so a changed password is never accepted from the cache.
+'''
+
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+from django.conf import settings
+
+# Start of every API token, tells them apart from passwords
+TOKEN_PREFIX = 'gst_'
+
+# Seconds a verified username/password pair is remembered
+CREDENTIAL_CACHE_TTL = getattr(settings, 'CREDENTIAL_CACHE_TTL', 300)
+
+# Most pairs remembered at once (per server process)
+CREDENTIAL_CACHE_MAX_ENTRIES = getattr(settings, 'CREDENTIAL_CACHE_MAX_ENTRIES', 10000)
+
+def _keyed_hash(value):
+    if isinstance(value, unicode):
+        value = value.encode('utf-8')
+
+    key = settings.SECRET_KEY
+    if isinstance(key, unicode):
+        key = key.encode('utf-8')
+
+    return hmac.new(key, value, hashlib.sha256).hexdigest()
+
+def new_api_token():
+    '''
+        Random API token.
+
+        :return Token: gst_ followed by 48 hex characters
+    '''
+    return TOKEN_PREFIX + binascii.hexlify(os.urandom(24))
+
+def is_api_token(value):
+    '''
+        Does the value look like an API token (rather than a password)?
+    '''
+    return isinstance(value, basestring) and value.startswith(TOKEN_PREFIX) and len(value) == len(TOKEN_PREFIX) + 48
+
+def token_hash(token):
+    '''
+        Hash an API token is stored and looked up under.
+
+        :param token: API token
+        :return Hash: Hex HMAC-SHA256 of the token
+    '''
+    return _keyed_hash(token)
+
+class CredentialCache(object):
+    '''
+        Username/password pairs that passed the bcrypt check recently.
+        Safe to share between request threads.
+    '''
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # keyed hash of the pair -> (expiry time, bcrypt hash the password was checked against)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def verified(self, username, password, password_hash):
+        '''
+            Was the pair verified against this bcrypt hash less than ttl seconds ago?
+
+            :param username: Email of the user
+            :param password: Password sent by the client
+            :param password_hash: Current bcrypt hash of the password of the user
+        '''
+        key = _keyed_hash(username + u'\0' + password)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry == None:
+                return False
+
+            if entry[0] < time.time() or entry[1] != password_hash:
+                del self._entries[key]
+                return False
+
+            return True
+
+    def remember(self, username, password, password_hash):
+        '''
+            Remember a pair that passed the bcrypt check.
+        '''
+        key = _keyed_hash(username + u'\0' + password)
+        now = time.time()
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # Drop expired pairs, or start over if all of them are still valid
+                for expired in [entry_key for entry_key in self._entries if self._entries[entry_key][0] < now]:
+                    del self._entries[expired]
+
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+
+            self._entries[key] = (now + self.ttl, password_hash)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Verified credentials of this process, see graphs.util.db.get_valid_user
+verified_credentials = CredentialCache(CREDENTIAL_CACHE_TTL, CREDENTIAL_CACHE_MAX_ENTRIES)
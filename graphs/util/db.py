@@ -3,6 +3,7 @@ import bcrypt
 import json
 import random
 import string
+import time
 import uuid
 
 from collections import Counter, defaultdict
@@ -14,14 +15,20 @@ import sqlite3 as lite
 
 from django.conf import settings
 
-from json_validator import validate_json, assign_edge_ids, convert_json, verify_json
+from json_validator import validate_json, validate_json_stream, assign_edge_ids, convert_json, convert_graph, verify_json, normalize_graph, iter_graph_elements, EdgeIdAssigner
+import json_validator
 import sqlalchemy, sqlalchemy.orm
 from graphs.util.db_conn import Database
 import graphs.util.db_init as db_init
+import graphs.util.search_index as search_index
+import graphs.util.json_storage as json_storage
+import graphs.util.graph_cache as graph_cache
+import graphs.util.credentials as credentials
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy import and_, or_, tuple_
 from sqlalchemy import distinct
 from sqlalchemy import update
+from sqlalchemy import select, union, exists, func, bindparam
 
 import graphs.models as models
 
@@ -31,6 +38,21 @@ data_connection = db_init.db
 DB_NAME = settings.DB_FULL_PATH
 URL_PATH = settings.URL_PATH
 
+# Number of rows sent per statement when bulk inserting graph data
+BULK_INSERT_BATCH_SIZE = getattr(settings, 'BULK_INSERT_BATCH_SIZE', 5000)
+
+# Number of most recently modified graphs whose tags are shown in the tag cloud
+RECENT_GRAPHS_FOR_TAGS = 250
+
+# Number of graphs whose tags are read with one query (see get_tags_for_graphs)
+TAG_LOOKUP_BATCH_SIZE = 500
+
+# Number of graphs deleted with one statement per table (see delete_graphs)
+GRAPH_DELETE_BATCH_SIZE = 500
+
+# Number of graphs read or updated with one statement by the batch operations (see get_graphs_json)
+GRAPH_BATCH_SIZE = 500
+
 def add_everyone_to_password_reset():
 	'''
 		Adds all users to password reset table (cold-start).
@@ -214,12 +236,14 @@ def reUploadInconsistentGraphs(data):
 		incosistent_graphs = open("inconsistency.txt", "a")
 		con = lite.connect(DB_NAME)
 		cur = con.cursor()
+		db_session = data_connection.new_session()
 		graphs_processed = 1
 		for graph in data:
 
 			graph_id = graph[0]
 			user_id = graph[1]
-			graph_json = json.loads(graph[2])
+			graph_text = load_graph_json(db_session, graph[2])
+			graph_json = json.loads(graph_text)
 			created = graph[3]
 			modified = graph[4]
 			public = graph[5]
@@ -230,7 +254,7 @@ def reUploadInconsistentGraphs(data):
 			graphs_processed += 1
 
 			if 'data' in graph_json:
-				graph_json = json.loads(convert_json(graph[2]))
+				graph_json = json.loads(convert_json(graph_text))
 
 			node_list = []
 
@@ -263,7 +287,7 @@ def reUploadInconsistentGraphs(data):
 				cur.execute('delete from edge where graph_id = ? and user_id = ?', (graph_id, user_id))
 				cur.execute('delete from graph_to_tag where graph_id=? and  user_id=?', (graph_id, user_id))
 				con.commit()
-				result = insert_graph(user_id, graph_id, graph[2], created=created, modified=modified, public=public, unlisted=unlisted, default_layout_id=default_layout_id, skip=True)
+				result = insert_graph(user_id, graph_id, graph_text, created=created, modified=modified, public=public, unlisted=unlisted, default_layout_id=default_layout_id, skip=True)
 				if result != None:
 					print result
 				else:
@@ -342,12 +366,16 @@ def id_generator(size=20, chars=string.ascii_uppercase + string.digits):
 	'''
 	return ''.join(random.choice(chars) for _ in range(size))
 
-def get_valid_user(username, password):
+def get_valid_user(username, password, allow_token=True):
 	'''
 		Checks to see if a user/password combination exists.
+		The password may also be an API token of the user (see create_api_token).
+		Combinations that passed the (slow) bcrypt check are remembered for a
+		few minutes (see graphs.util.credentials).
 		
 		:param username: Email of the user in GraphSpace
-		:param password: Password of the user
+		:param password: Password (or API token) of the user
+		:param allow_token: Accept API tokens instead of the password
 		:return username: <Username> | None if wrong information
 	'''
 	# Create database connection
@@ -356,17 +384,73 @@ def get_valid_user(username, password):
 	try:
 		# Get user if they exist in the database
 		valid_user = db_session.query(models.User).filter(models.User.user_id == username).one()
+
+		# API tokens are checked with a single lookup of their hash
+		if allow_token and credentials.is_api_token(password):
+			token = db_session.query(models.ApiToken.user_id).filter(models.ApiToken.token_hash == credentials.token_hash(password)).first()
+			if token != None and token.user_id == username:
+				db_session.close()
+				return valid_user
+
+		# Combination was checked against the current password recently
+		if credentials.verified_credentials.verified(username, password, valid_user.password):
+			db_session.close()
+			return valid_user
+
 		# If hashed password != the hashed password in the database, user trying to log in is not a valid user of GraphSpace
 		if bcrypt.hashpw(password, valid_user.password) != valid_user.password:
 			db_session.close()
 			return None
 
+		credentials.verified_credentials.remember(username, password, valid_user.password)
+
 		db_session.close()
 		return valid_user
 	except NoResultFound:
 		db_session.close()
 		return None	
 
+def create_api_token(username, description=None):
+	'''
+		Creates an API token the user can send instead of their password.
+		The token itself is not stored, it can only be shown once.
+
+		:param username: Email of the user in GraphSpace
+		:param description: What the token is used for (optional)
+		:return Token: API token
+	'''
+	token = credentials.new_api_token()
+
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	db_session.add(models.ApiToken(token_hash = credentials.token_hash(token), user_id = username, description = description, created = datetime.now()))
+	db_session.commit()
+	db_session.close()
+
+	return token
+
+def delete_api_tokens(username, token=None):
+	'''
+		Revokes an API token of a user, or all of them.
+
+		:param username: Email of the user in GraphSpace
+		:param token: Token to revoke (None to revoke every token of the user)
+		:return Number of tokens revoked
+	'''
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	token_query = db_session.query(models.ApiToken).filter(models.ApiToken.user_id == username)
+	if token != None:
+		token_query = token_query.filter(models.ApiToken.token_hash == credentials.token_hash(token))
+
+	revoked = token_query.delete(synchronize_session=False)
+	db_session.commit()
+	db_session.close()
+
+	return revoked
+
 def get_graph(user_id, graph_id):
 	'''
 		Gets the graph.
@@ -568,11 +652,11 @@ def retrieve_cytoscape_json(graphjson):
 		:return JSON: CytoscapeJS-compatible graphname
 	'''
 
-	temp_json = json.loads(graphjson)['graph']
+	temp_json = json.loads(graphjson)
 
     # for Cytoscape.js, if data is in properties, then we need to convert (main difference)
-	if 'data' in temp_json:
-	    return convert_json(graphjson)
+	if 'data' in temp_json['graph']:
+	    return json.dumps(convert_graph(temp_json), indent=4)
 	else:
 	    return graphjson
 
@@ -607,18 +691,121 @@ def get_all_info_for_graph(uid, gid):
 	if graph == None:
 		return None
 
-	graph.json = verify_json(graph.json)
+	# Create database connection
+	db_session = data_connection.new_session()
+	graph_json = load_graph_json(db_session, graph.json)
+	db_session.close()
 
-	return (graph.json, graph.public, graph.graph_id)
+	return (verify_json(graph_json), graph.public, graph.graph_id)
 
-def get_graphs_for_view_type(context, view_type, uid, request):
+def query_graph_version(db_session, uid, gid):
 	'''
-		Gets the graphs that are associated with a certain view from the user
+		Reads what identifies the current version of a graph without reading its JSON:
+		the modified date, the visibility and the reference to its JSON (only
+		the first characters of the graph.json column, see json_storage.referenced_hash).
+
+		:param db_session: Database connection
+		:param uid: Owner of graph
+		:param gid: ID of graph
+		:return Row: (modified, public, reference) or None if the graph does not exist
+	'''
+	return db_session.query(models.Graph.modified, models.Graph.public, func.substr(models.Graph.json, 1, json_storage.REFERENCE_LENGTH).label('reference')).filter(models.Graph.user_id == uid).filter(models.Graph.graph_id == gid).first()
+
+def get_graph_version(uid, gid):
+	'''
+		Version of a graph, used to answer conditional requests for its JSON
+		(see graphs.util.http_cache) without reading the JSON itself.
+
+		:param uid: Owner of graph
+		:param gid: ID of graph
+		:return Version: {'modified', 'public', 'json_hash'} or None if the graph does not exist.
+			json_hash is None if the JSON is kept in the graph row.
+	'''
+	# Create database connection
+	db_session = data_connection.new_session()
+	version = query_graph_version(db_session, uid, gid)
+	db_session.close()
+
+	if version == None:
+		return None
+
+	return {'modified': version.modified, 'public': version.public, 'json_hash': json_storage.referenced_hash(version.reference)}
+
+def get_graph_for_view(uid, gid):
+	'''
+		Returns the graph ready to be drawn with CytoscapeJS: the verified,
+		CytoscapeJS-compatible JSON and the metadata shown next to it.
+		Drawings are cached per JSON content or graph version (see graphs.util.graph_cache),
+		so repeated views only read the modified date and visibility of the graph.
+
+		@param uid: Owner of graph
+		@param gid: ID of graph
+		@return Graph: {'json', 'public', 'graph_id', 'description', 'graph_name', 'filters'} or None
+	'''
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	# Version of the graph (visibility is not part of the drawing, it may change without modifying the graph)
+	version = query_graph_version(db_session, uid, gid)
+
+	if version == None:
+		db_session.close()
+		return None
+
+	# Graphs with identical JSON share their drawing
+	json_hash = json_storage.referenced_hash(version.reference)
+	if json_hash != None:
+		key = ('graph_blob', json_hash)
+	else:
+		key = (uid, gid, version.modified)
+
+	drawing = graph_cache.graphs.get(key)
+
+	if drawing == None:
+		graph_json = db_session.query(models.Graph.json).filter(models.Graph.user_id == uid).filter(models.Graph.graph_id == gid).one()[0]
+
+		# Convert JSON for CytoscapeJS, if needed, and fix node shapes and labels (stored edges already have ID's)
+		json_data = normalize_graph(json.loads(load_graph_json(db_session, graph_json)), edge_ids=False)
+		cytoscape_json = json.dumps(json_data)
+
+		drawing = {'json': cytoscape_json, 'description': '', 'graph_name': '', 'filters': False}
+
+		#add sidebar information for display
+		if 'description' in json_data['metadata']:
+			drawing['description'] = json_data['metadata']['description'] + "</table></html>"
+
+		# If the metadata has either a name or a title (backward-compatible)
+		# display it on the top of the graph
+		if 'name' in json_data['metadata']:
+			drawing['graph_name'] = json_data['metadata']['name']
+		elif 'title' in json_data['metadata']:
+			drawing['graph_name'] = json_data['metadata']['title']
+
+		if len(json_data['graph']['edges']) > 0 and 'k' in json_data['graph']['edges'][0]['data']:
+			drawing['filters'] = True
+
+		graph_cache.graphs.put(key, drawing, graph_cache.size_of(drawing))
+
+	db_session.close()
+
+	# Copy, so callers can not change the cached drawing
+	graph = dict(drawing)
+	graph['public'] = version.public
+	graph['graph_id'] = gid
+
+	return graph
+
+def get_graphs_for_view_type(context, view_type, uid, request, cursor=None, direction='next', page_size=25):
+	'''
+		Gets the page of graphs that are associated with a certain view from the user
 		
 		:param context: Dictionary containing values to pass to front-end
 		:param view_type: Type of view to render (my graphs, shared, public)
 		:param uid: Owner of the graph
 		:param request: Get request
+		:param cursor: Key of the graph the page starts after (None for the first page)
+		:param direction: next or previous (page before the cursor)
+		:param page_size: Number of graphs on a page
 		:return context: Dictionary containing values to pass to front-end
 	'''
 
@@ -722,43 +909,39 @@ def get_graphs_for_view_type(context, view_type, uid, request):
 	# public graphs represent all matching graphs available to everyone
 
 	# In order to produce the number of graphs returned that match the query 
-	# (for the My Graphs, Shared, and Public buttons), I am also retrieving the len
-	# of matched graphs for each view_type.  This feature was requesed by Murali
+	# (for the My Graphs, Shared, and Public buttons), I am also counting the
+	# matched graphs for each view_type.  This feature was requesed by Murali
 
-	# For every query, we need to make request for all the view types (shared, public, my graphs)
-	# because we want to notify the user the number of graphs that are available for each view
-	# that matches the queries
+	# Only the current page of the requested view type is read from the database,
+	# the other view types are only counted
 	if uid == None:
-		context['graph_list'] = view_graphs(uid, search_type, search_terms, tag_list, 'public')
-		context['my_graphs'] = 0
-		context['shared_graphs'] = 0
-		if context['graph_list'] == None:
-			context['public_graphs'] = 0
-		else:
-			context['public_graphs'] = len(context['graph_list'])
-	else:
-		if view_type == 'my graphs':
-			context['graph_list'] = view_graphs(uid, search_type, search_list, tag_list, view_type)
-			context['my_graphs'] = len(context['graph_list'])
-			context['shared_graphs'] = len(view_graphs(uid, search_type, search_list, tag_list, 'shared'))
-			context['public_graphs'] = len(view_graphs(uid, search_type, search_list, tag_list, 'public'))
-		elif view_type == 'shared':
-			context['graph_list'] = view_graphs(uid, search_type, search_list, tag_list, view_type)
-			context['my_graphs'] = len(view_graphs(uid, search_type, search_list, tag_list, 'my graphs'))
-			context['shared_graphs'] = len(context['graph_list'])
-			context['public_graphs'] = len(view_graphs(uid, search_type, search_list, tag_list, 'public'))
-		else:
-			context['graph_list'] = view_graphs(uid, search_type, search_list, tag_list, view_type)
-			context['my_graphs'] = len(view_graphs(uid, search_type, search_list, tag_list, 'my graphs'))
-			context['shared_graphs'] = len(view_graphs(uid, search_type, search_list, tag_list, 'shared'))
-			context['public_graphs'] = len(context['graph_list'])
-
-	#If user has requested the graphs to be ordered in a certain manner, order them as requested
-	if order_by:
-		context['graph_list'] = order_information(order_by, search_terms, context['graph_list'])
+		view_type = 'public'
+
+	# By default, all graphs are ordered via descending modified date (as per Anna's request)
+	if not order_by:
+		order_by = "modified_descending"
+
+	# Get the requested page of graphs (see view_graphs_page)
+	page = view_graphs_page(uid, search_type, search_list, tag_list, view_type, order_by, cursor, direction, page_size)
+
+	context['graph_list'] = page['graphs']
+	context['graph_page'] = page
+
+	# Searches have already counted the matches of every view type
+	counts = page['counts']
+	if counts == None:
+		counts = count_graphs_for_view_types(uid, tag_list)
+
+	context['my_graphs'] = counts['my graphs']
+	context['shared_graphs'] = counts['shared']
+	context['public_graphs'] = counts['public']
+
+	# Most used tags of the most recently modified graphs (tag cloud)
+	if 'matched_graphs' in page:
+		recent_graphs = sorted(page['matched_graphs'], key=lambda graph: graph[SEARCH_RESULT_COLUMNS['modified']], reverse=True)[:RECENT_GRAPHS_FOR_TAGS]
+		context['all_tags'] = count_tags(get_tags_for_graphs([(graph[SEARCH_RESULT_COLUMNS['graph_id']], graph[SEARCH_RESULT_COLUMNS['user_id']]) for graph in recent_graphs]))
 	else:
-		# By default, all graphs are ordered via descending modified date (as per Anna's request)
-		context['graph_list'] = order_information("modified_descending", search_terms, context['graph_list'])
+		context['all_tags'] = most_used_tags_for_view_type(uid, tag_list, view_type)
 	
 	return context	
 
@@ -874,6 +1057,276 @@ def order_information(order_term, search_terms, graphs_list):
 		else:
 			return graphs_list
 
+# Position of the keyset columns in the tuples built by search_result
+SEARCH_RESULT_COLUMNS = {'graph_id': 0, 'modified': 4, 'user_id': 5}
+
+def keyset_columns(order_term):
+	'''
+		Gets the columns a graph listing is ordered by for an order term.
+		The trailing columns break ties, so every graph has a unique position
+		that a page cursor can point at.
+
+		:param order_term: Term to order by (example, graph_ascending, modified_descending, owner_ascending)
+		:return (Columns, Descending): Column names and whether the order is descending
+	'''
+	if order_term in ('graph_ascending', 'graph_descending'):
+		columns = ('graph_id', 'user_id')
+	elif order_term in ('owner_ascending', 'owner_descending'):
+		columns = ('user_id', 'graph_id')
+	else:
+		columns = ('modified', 'user_id', 'graph_id')
+
+		# By default, all graphs are ordered via descending modified date (as per Anna's request)
+		if order_term != 'modified_ascending':
+			order_term = 'modified_descending'
+
+	return columns, order_term.endswith('_descending')
+
+def keyset_page(rows, has_more, cursor, direction, key_of):
+	'''
+		Packs one page of a keyset paginated graph listing.
+
+		:param rows: Rows of the page, in the order they were read
+		:param has_more: Are there more rows in the reading direction?
+		:param cursor: Cursor the page was read from
+		:param direction: next or previous (rows were read backwards)
+		:param key_of: Function returning the keyset of a row
+		:return Page: {'graphs': rows, 'has_next', 'has_previous', 'first_key', 'last_key'}
+	'''
+	if direction == 'previous':
+		rows = list(reversed(rows))
+		has_next = cursor != None
+		has_previous = has_more
+	else:
+		has_next = has_more
+		has_previous = cursor != None
+
+	page = {'graphs': rows, 'has_next': has_next, 'has_previous': has_previous, 'first_key': None, 'last_key': None}
+
+	if len(rows) > 0:
+		page['first_key'] = key_of(rows[0])
+		page['last_key'] = key_of(rows[-1])
+
+	return page
+
+def keyset_page_query(query, order_term, cursor, direction, page_size):
+	'''
+		Orders a graph listing query in SQL and reads the page that starts
+		after the cursor, so a page costs page_size rows no matter how many
+		graphs match.
+
+		:param query: Query selecting (at least) graph_id, modified and user_id columns
+		:param order_term: Term to order by (example, graph_ascending, modified_descending, owner_ascending)
+		:param cursor: Key of the graph the page starts after (None for the first page)
+		:param direction: next or previous (page before the cursor)
+		:param page_size: Number of graphs on a page
+		:return Page: see keyset_page
+	'''
+	columns, descending = keyset_columns(order_term)
+
+	# Map column names of the query to their SQL expressions
+	expressions = dict((column['name'], column['expr']) for column in query.column_descriptions)
+	key = [expressions[name] for name in columns]
+
+	# Reading the previous page walks the listing backwards
+	reverse_order = descending != (direction == 'previous')
+
+	if cursor != None:
+		if reverse_order:
+			query = query.filter(tuple_(*key) < tuple_(*cursor))
+		else:
+			query = query.filter(tuple_(*key) > tuple_(*cursor))
+
+	if reverse_order:
+		query = query.order_by(*[column.desc() for column in key])
+	else:
+		query = query.order_by(*[column.asc() for column in key])
+
+	# Read one extra row to know if there is another page
+	rows = query.limit(page_size + 1).all()
+
+	return keyset_page(rows[:page_size], len(rows) > page_size, cursor, direction, lambda row: tuple([getattr(row, name) for name in columns]))
+
+def keyset_page_list(graphs, column_positions, order_term, cursor, direction, page_size):
+	'''
+		Same as keyset_page_query for graphs that are already in memory (search results).
+
+		:param graphs: Graph tuples
+		:param column_positions: Position of graph_id, modified and user_id in the tuples
+		:param order_term: Term to order by (example, graph_ascending, modified_descending, owner_ascending)
+		:param cursor: Key of the graph the page starts after (None for the first page)
+		:param direction: next or previous (page before the cursor)
+		:param page_size: Number of graphs on a page
+		:return Page: see keyset_page
+	'''
+	columns, descending = keyset_columns(order_term)
+
+	key_of = lambda graph: tuple([graph[column_positions[name]] for name in columns])
+
+	# Reading the previous page walks the listing backwards
+	reverse_order = descending != (direction == 'previous')
+
+	ordered = sorted(graphs, key=key_of, reverse=reverse_order)
+
+	if cursor != None:
+		cursor = tuple(cursor)
+		if reverse_order:
+			ordered = [graph for graph in ordered if key_of(graph) < cursor]
+		else:
+			ordered = [graph for graph in ordered if key_of(graph) > cursor]
+
+	return keyset_page(ordered[:page_size], len(ordered) > page_size, cursor, direction, key_of)
+
+def filter_by_view_type(query, graph_id_column, user_id_column, uid, view_type):
+	'''
+		Limits a query to rows of graphs that belong to a view type.
+		The checks are correlated subqueries, so the query can select from
+		any table that references a graph (graph, node, edge, graph_to_tag, ...).
+
+		:param query: Query to limit
+		:param graph_id_column: Column of the query holding the graph name
+		:param user_id_column: Column of the query holding the graph owner
+		:param uid: Logged in user
+		:param view_type: my graphs, shared, public or all (every graph the user may see)
+		:return Query: Limited query
+	'''
+	# Graphs that the user owns
+	owned = user_id_column == uid
+
+	# Graphs that are shared with a group the user is a member of or owns
+	group_to_graph = models.GroupToGraph.__table__.alias('view_group_to_graph')
+	group_to_user = models.GroupToUser.__table__.alias('view_group_to_user')
+
+	is_member = exists().where(and_(group_to_user.c.group_id == group_to_graph.c.group_id, group_to_user.c.group_owner == group_to_graph.c.group_owner, group_to_user.c.user_id == uid))
+
+	shared = exists().where(and_(group_to_graph.c.graph_id == graph_id_column, group_to_graph.c.user_id == user_id_column, or_(group_to_graph.c.group_owner == uid, is_member)))
+
+	# Graphs that everyone can see
+	public_graph = models.Graph.__table__.alias('view_graph')
+	public = exists().where(and_(public_graph.c.graph_id == graph_id_column, public_graph.c.user_id == user_id_column, public_graph.c.public == 1))
+
+	if view_type == "my graphs":
+		return query.filter(owned)
+	elif view_type == "shared":
+		return query.filter(shared)
+	elif view_type == "public":
+		return query.filter(public)
+	else:
+		return query.filter(or_(owned, shared, public))
+
+def split_graphs_by_view_type(uid, graphs):
+	'''
+		Splits search results of view type "all" into the graphs
+		of each view type.  A graph may belong to more than one view type.
+
+		:param uid: Logged in user
+		:param graphs: Graph tuples returned by search_result (graph_id at 0, owner at 5)
+		:return Graphs: {view_type: [graphs]}
+	'''
+	graphs_by_view = {'my graphs': [], 'shared': [], 'public': []}
+
+	if len(graphs) == 0:
+		return graphs_by_view
+
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	graph_ids = list(set([graph[0] for graph in graphs]))
+
+	shared_graphs = set()
+	public_graphs = set()
+
+	# Look up the visibility of all matched graphs (chunked to stay below SQLite's variable limit)
+	for start in xrange(0, len(graph_ids), 500):
+		graph_id_chunk = graph_ids[start:start + 500]
+
+		shared_query = db_session.query(models.Graph.graph_id, models.Graph.user_id).filter(models.Graph.graph_id.in_(graph_id_chunk))
+		shared_graphs.update([(graph.graph_id, graph.user_id) for graph in filter_by_view_type(shared_query, models.Graph.graph_id, models.Graph.user_id, uid, "shared").all()])
+
+		public_graphs.update([(graph.graph_id, graph.user_id) for graph in db_session.query(models.Graph.graph_id, models.Graph.user_id).filter(models.Graph.graph_id.in_(graph_id_chunk)).filter(models.Graph.public == 1).all()])
+
+	db_session.close()
+
+	for graph in graphs:
+		key = (graph[0], graph[5])
+
+		if graph[5] == uid:
+			graphs_by_view['my graphs'].append(graph)
+
+		if key in shared_graphs:
+			graphs_by_view['shared'].append(graph)
+
+		if key in public_graphs:
+			graphs_by_view['public'].append(graph)
+
+	return graphs_by_view
+
+def view_graphs_page(uid, search_type, search_terms, tag_terms, view_type, order_term, cursor=None, direction='next', page_size=25):
+	'''
+		Gets one page of the graphs of a view type, ordered by order_term.
+
+		Listings without search terms are ordered and paginated in SQL (keyset
+		pagination), so a page only reads page_size rows. Searches run once
+		over every graph the user can see, are split by view type and then
+		paginated in memory; they also return the number of matching graphs
+		for every view type (My Graphs, Shared and Public buttons).
+
+		:param uid: Logged in user
+		:param search_type: Type of search (partial or full)
+		:param search_terms: Criteria that to filter graphs 
+		:param tag_terms: Only display graphs with these tags
+		:param view_type: View type whose graphs are returned
+		:param order_term: Term to order by (example, graph_ascending, modified_descending, owner_ascending)
+		:param cursor: Key of the graph the page starts after (None for the first page)
+		:param direction: next or previous (page before the cursor)
+		:param page_size: Number of graphs on a page
+		:return Page: see keyset_page, plus 'counts' ({view_type: count} or None) and 'matched_graphs' for searches
+	'''
+	# Searching is expensive, so do it once for all view types
+	if search_terms and len(search_terms) > 0:
+		graphs_by_view = split_graphs_by_view_type(uid, view_graphs(uid, search_type, search_terms, tag_terms, 'all'))
+
+		page = keyset_page_list(graphs_by_view[view_type], SEARCH_RESULT_COLUMNS, order_term, cursor, direction, page_size)
+
+		page['counts'] = dict()
+		for view in graphs_by_view:
+			page['counts'][view] = len(graphs_by_view[view])
+
+		page['matched_graphs'] = graphs_by_view[view_type]
+		return page
+
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	if tag_terms and len(tag_terms) > 0:
+		query = graphs_with_tags_query(uid, tag_terms, view_type, db_session)
+	else:
+		query = graphs_of_type_query(view_type, uid, db_session)
+
+	page = keyset_page_query(query, order_term, cursor, direction, page_size)
+	page['counts'] = None
+
+	db_session.close()
+	return page
+
+def count_graphs_for_view_types(uid, tag_terms):
+	'''
+		Counts the graphs of every view type (My Graphs, Shared and Public buttons).
+
+		:param uid: Logged in user
+		:param tag_terms: Only count graphs with these tags
+		:return Counts: {view_type: count}
+	'''
+	counts = dict()
+
+	for view in ['my graphs', 'shared', 'public']:
+		if tag_terms and len(tag_terms) > 0:
+			counts[view] = count_graphs_with_tags(uid, tag_terms, view)
+		else:
+			counts[view] = count_graphs_of_type(view, uid)
+
+	return counts
+
 def view_graphs(uid, search_type, search_terms, tag_terms, view_type):
 	'''
 		Gets the graphs that are associated with a certain view from the user
@@ -882,6 +1335,7 @@ def view_graphs(uid, search_type, search_terms, tag_terms, view_type):
 		:param search_type: Type of search (partial or full)
 		:param search_terms: Criteria that to filter graphs 
 		:param tag_terms: Only display graphs with these tags
+		:param view_type: my graphs, shared, public or all (only for searches)
 		:return context: Dictionary containing values to pass to front-end
 	'''
 
@@ -915,6 +1369,23 @@ def view_graphs(uid, search_type, search_terms, tag_terms, view_type):
 	else:
 		return view_graphs_of_type(view_type, uid)
 		
+def graphs_with_tags_query(uid, tag_terms, view_type, db_session):
+	'''
+		Builds a query of all graphs that contain every one of the specified tags.
+
+		:param uid: Logged in user
+		:param tag_terms: Tags that all graphs must contain
+		:param view_type: Type of view to limit the graphs to (my graphs, shared, public, all)
+		:param db_session: Database session
+		:return Query: Query of (graph_id, modified, user_id)
+	'''
+	tag_terms = list(set(tag_terms))
+
+	# A graph matches if it has as many of the tags as were asked for (simulating the and operator)
+	query = db_session.query(models.Graph.graph_id, models.Graph.modified, models.Graph.user_id).filter(models.Graph.graph_id == models.GraphToTag.graph_id).filter(models.Graph.user_id == models.GraphToTag.user_id).filter(models.GraphToTag.tag_id.in_(tag_terms)).group_by(models.Graph.graph_id, models.Graph.user_id, models.Graph.modified).having(func.count(distinct(models.GraphToTag.tag_id)) == len(tag_terms))
+
+	return filter_by_view_type(query, models.Graph.graph_id, models.Graph.user_id, uid, view_type)
+
 def tag_result(uid, tag_terms, view_type):
 	'''
 		Gets all graphs that contain the specified tags for a user and a view_type.
@@ -925,60 +1396,36 @@ def tag_result(uid, tag_terms, view_type):
 		:return Graphs: [graphs]
 	'''
 	if len(tag_terms) > 0:
-		# Place holder that stores all the graphs
-		initial_graphs_with_tags = []	
-
 		# Create database connection
 		db_session = data_connection.new_session()
 
-		# Go through all the tag terms, based on the view type and append them the initial place holder
-		for tag in tag_terms:
-			intial_graphs_with_tags = []
+		graphs = graphs_with_tags_query(uid, tag_terms, view_type, db_session).all()
 
-			if view_type == 'my graphs':
-				try:
-					intial_graphs_with_tags += db_session.query(models.Graph.graph_id, models.Graph.modified, models.Graph.user_id).filter(models.Graph.graph_id == models.GraphToTag.graph_id).filter(models.Graph.user_id == models.GraphToTag.user_id).filter(models.GraphToTag.tag_id == tag).filter(models.Graph.user_id == uid).all()
-				except NoResultFound:
-					print 'No graphs that you own match the tag term'
-
-			elif view_type == 'shared':
-
-				# Append all graphs that are shared with groups that the user is a member of
-				intial_graphs_with_tags += db_session.query(models.GroupToGraph.graph_id, models.GroupToGraph.modified, models.GroupToGraph.user_id).filter(models.GroupToGraph.group_id == models.GroupToUser.group_id).filter(models.GroupToGraph.group_owner == models.GroupToUser.group_owner).filter(models.GroupToUser.user_id == uid).filter(models.GraphToTag.tag_id == tag).filter(models.GraphToTag.graph_id == models.GroupToGraph.graph_id).filter(models.GraphToTag.user_id == models.GroupToGraph.user_id).all()
-				# Append all graphs that the user shared for any groups that they own
-				intial_graphs_with_tags += db_session.query(models.GroupToGraph.graph_id, models.GroupToGraph.modified, models.GroupToGraph.user_id).filter(models.GroupToGraph.group_id == models.Group.group_id).filter(models.Group.owner_id == uid).filter(models.GroupToGraph.group_owner == models.Group.owner_id).filter(models.GraphToTag.tag_id == tag).filter(models.GraphToTag.graph_id == models.GroupToGraph.graph_id).filter(models.GraphToTag.user_id == models.GroupToGraph.user_id).all()
-			else:
-				try:
-					intial_graphs_with_tags += db_session.query(models.Graph.graph_id, models.Graph.modified, models.Graph.user_id).filter(models.Graph.graph_id == models.GraphToTag.graph_id).filter(models.Graph.user_id == models.GraphToTag.user_id).filter(models.GraphToTag.tag_id == tag).filter(models.Graph.public == 1).all()
-				except NoResultFound:
-					print 'No graphs that you own match the tag term'
-
-		# Go through and count the list of occurrences of matched graph
-		graph_repititions = defaultdict(int)
+		db_session.close()
+		return graphs
 
-		# Counting the number of occurences
-		for graph in intial_graphs_with_tags:
-			graph_repititions[graph] += 1
+	else:
+		return []
 
-		# Go through and aggregate all graph together
-		graph_mappings = defaultdict(list)
+def count_graphs_with_tags(uid, tag_terms, view_type):
+	'''
+		Counts the graphs that contain the specified tags for a user and a view_type.
 
-		# If the number of times a graph appears matches the number of search terms
-		# it is a graph we want (simulating the and operator for all search terms)
-		for graph in intial_graphs_with_tags:
+		:param uid: Owner of graph
+		:param tag_terms: Tags that all graphs must contain
+		:param view_type: Type of view to count the graphs in (my graphs, shared, public)
+		:return Count: Number of graphs
+	'''
+	if len(tag_terms) == 0:
+		return 0
 
-			# Graph matches all search terms
-			if graph_repititions[graph] == len(tag_terms):
+	# Create database connection
+	db_session = data_connection.new_session()
 
-				# If we haven't seen this graph yet 
-				if graph not in graph_mappings:
-					graph_mappings[graph] = graph
-				
-		# Go through all the graphs and insert tags for the graphs that match all search terms
-		return graph_mappings.values()
+	count = graphs_with_tags_query(uid, tag_terms, view_type, db_session).count()
 
-	else:
-		return []
+	db_session.close()
+	return count
 
 def search_result(uid, search_type, search_terms, view_type):
 	'''
@@ -1159,32 +1606,25 @@ def find_all_graphs_containing_search_word(uid, search_type, search_word, view_t
 		:param uid: Owner of the graph
 		:param search_type: Type of search (full_search or partial_search)
 		:param search_word: Graph names being searched for
-		:param view_type: Type of view to limit the graphs to (my graphs, shared, public)
+		:param view_type: Type of view to limit the graphs to (my graphs, shared, public, all)
 		:param cur: Database cursor
 		:return Graphs: [Graphs]
 	'''
-	matched_graphs = []
 	# Return all graphs that have a graph name that partially matches the search word
 	if search_type == 'partial_search':
-		# Select graphs that match the given view type
-		if view_type == "my graphs":
-			matched_graphs = db_session.query(models.Graph.graph_id, models.Graph.user_id, models.Graph.modified).filter(models.Graph.graph_id.like("%" + search_word + "%")).filter(models.Graph.user_id == uid).all()
-		elif view_type == "shared":
-			matched_graphs = db_session.query(models.GroupToGraph.graph_id, models.GroupToGraph.user_id, models.GroupToGraph.modified).filter(models.GroupToGraph.group_id == models.GroupToUser.group_id).filter(models.GroupToGraph.group_owner == models.GroupToUser.group_owner).filter(models.GroupToUser.user_id == uid).filter(models.GroupToGraph.graph_id.like("%" + search_word + "%")).all()
-			matched_graphs += db_session.query(models.GroupToGraph.graph_id, models.GroupToGraph.user_id, models.GroupToGraph.modified).filter(models.GroupToGraph.graph_id.like("%" + search_word + "%")).filter(models.Group.owner_id == uid).filter(models.Group.group_id == models.GroupToGraph.group_id).filter(models.Group.owner_id == models.GroupToGraph.group_owner).all()
-		elif view_type == "public":
-			matched_graphs = db_session.query(models.Graph.graph_id, models.Graph.user_id, models.Graph.modified, models.Graph.public).filter(models.Graph.graph_id.like("%" + search_word + "%")).filter(models.Graph.public == 1).all()
+		# Names of all graphs partially matching the search word (answered by the search index)
+		matching_graph_ids = search_index.graph_ids_like(db_session, "%" + search_word + "%").subquery()
+		name_condition = models.Graph.graph_id.in_(matching_graph_ids)
 
 	# Return all graphs that have a gaph name that exactly matches the search word
 	elif search_type == 'full_search':
-		# Select graphs that match the given view type
-		if view_type == "my graphs":
-			matched_graphs = db_session.query(models.Graph.graph_id, models.Graph.modified, models.Graph.user_id, models.Graph.public).filter(models.Graph.graph_id == search_word).filter(models.Graph.user_id == uid).all()
-		elif view_type == "shared":
-			matched_graphs = db_session.query(models.GroupToGraph.graph_id, models.GroupToGraph.user_id, models.GroupToGraph.modified).filter(models.GroupToGraph.group_id == models.GroupToUser.group_id).filter(models.GroupToGraph.group_owner == models.GroupToUser.group_owner).filter(models.GroupToUser.user_id == uid).filter(models.GroupToGraph.graph_id == search_word).all()
-			matched_graphs += db_session.query(models.GroupToGraph.graph_id, models.GroupToGraph.user_id, models.GroupToGraph.modified).filter(models.GroupToGraph.graph_id == search_word).filter(models.Group.owner_id == uid).filter(models.Group.group_id == models.GroupToGraph.group_id).filter(models.Group.owner_id == models.GroupToGraph.group_owner).all()
-		elif view_type == "public":
-			matched_graphs = db_session.query(models.Graph.graph_id, models.Graph.modified, models.Graph.user_id, models.Graph.public).filter(models.Graph.graph_id == search_word).filter(models.Graph.public == 1).all()
+		name_condition = models.Graph.graph_id == search_word
+
+	else:
+		return []
+
+	# Select graphs that match the given view type
+	matched_graphs = filter_by_view_type(db_session.query(models.Graph.graph_id, models.Graph.user_id, models.Graph.modified).filter(name_condition), models.Graph.graph_id, models.Graph.user_id, uid, view_type).all()
 
 	graph_dict = dict()
 
@@ -1198,108 +1638,92 @@ def find_all_graphs_containing_search_word(uid, search_type, search_word, view_t
 
 	return graph_dict.values()
 
-def find_all_graphs_containing_edges(uid, search_type, search_word, view_type, db_session):
+def matching_node_ids(search_type, node_term, db_session):
 	'''
-		Finds graphs that have the edges that are being searched for.
+		Builds a subquery of all node ids whose label or id matches a term.
 
-		:param uid: Owner of the graph
 		:param search_type: Type of search (partial_search or full_search)
-		:param search_word: Edge being searched for
-		:param view_type: Type of view to limit the graphs to
-		:param cur: Database cursor
-		:return Edges: [Edges]
+		:param node_term: Term to match against node labels and node ids
+		:param db_session: Database session
+		:return Alias: Single column (node_id) subquery
 	'''
+	if search_type == "partial_search":
+		# Partial matches are answered by the search index
+		nodes = search_index.node_table()
+
+		# Nodes with a partially matching label or node id
+		by_label = db_session.query(nodes.c.node_id).filter(nodes.c.label.like("%" + node_term + "%"))
+		by_id = db_session.query(nodes.c.node_id).filter(nodes.c.node_id.like("%" + node_term + "%"))
+	else:
+		# Nodes with an exactly matching label or node id
+		by_label = db_session.query(models.Node.node_id).filter(models.Node.label == node_term)
+		by_id = db_session.query(models.Node.node_id).filter(models.Node.node_id == node_term)
 
-	# List to keep track of all graphs that contain edges that match the search_word
-	initial_graphs_matching_edges = []
+	# UNION removes duplicate node ids inside the database
+	return union(by_label.statement, by_id.statement).alias()
 
+def matching_edges_query(search_type, search_word, db_session):
+	'''
+		Builds a query of all edges connecting a node matching the head term
+		to a node matching the tail term (in either direction, so that undirected
+		edges are found as well).  The candidate nodes are joined against the
+		edge table as subqueries, so the cost grows with the number of matches.
+
+		:param search_type: Type of search (partial_search or full_search)
+		:param search_word: Edge being searched for (head:tail)
+		:param db_session: Database session
+		:return Query: Query of Edge rows, to be scoped further by the caller
+	'''
 	# Separate the edge into its two node ID's
 	# This is done because in the database, an edge ID is comprised of target:source nodes
 	node_ids = search_word.split(":")
 
-	# Get head and tail node references
-	head_node = node_ids[0]
-	tail_node = node_ids[1]
-
-	# List of all head node ids
-	head_nodes = []
+	# Candidate head and tail nodes
+	head_nodes = matching_node_ids(search_type, node_ids[0], db_session)
+	tail_nodes = matching_node_ids(search_type, node_ids[1], db_session)
 
-	# List of all tail node ids
-	tail_nodes = []
+	head_ids = select([head_nodes.c.node_id])
+	tail_ids = select([tail_nodes.c.node_id])
 
-	# Match all edges that contain the edges that exactly match the search_word
-	if search_type == "full_search":
-
-		# Get all (head) nodes that contain a label matching search_word
-		head_nodes += db_session.query(models.Node.node_id).filter(models.Node.label == head_node).all()
-		
-		# Get all (tail) nodes that contain a label matching search_word
-		tail_nodes += db_session.query(models.Node.node_id).filter(models.Node.label == tail_node).all()
+	# head:tail or tail:head (to resolve undirected edge search issue)
+	return db_session.query(models.Edge).filter(or_(
+		and_(models.Edge.head_node_id.in_(head_ids), models.Edge.tail_node_id.in_(tail_ids)),
+		and_(models.Edge.head_node_id.in_(tail_ids), models.Edge.tail_node_id.in_(head_ids))
+	))
 
-		# Get all (head) nodes that contain a node id matching search_word 
-		head_nodes += db_session.query(models.Node.node_id).filter(models.Node.node_id == head_node).all()
+def find_all_graphs_containing_edges(uid, search_type, search_word, view_type, db_session):
+	'''
+		Finds graphs that have the edges that are being searched for.
 
-		# Get all (tail) nodes that contain a node id matched search_word 
-		tail_nodes += db_session.query(models.Node.node_id).filter(models.Node.node_id == tail_node).all()
-		
-	elif search_type == "partial_search":
-
-		# Get all (head) nodes that contain a partially matching label
-		head_nodes += db_session.query(models.Node.node_id).filter(models.Node.label.like("%" + head_node + "%")).all()
-		
-		# Get all (tail) nodes that contain a label partially matching label
-		tail_nodes += db_session.query(models.Node.node_id).filter(models.Node.label.like("%" + tail_node + "%")).all()
-
-		# Get all (head) nodes that contain a node id partially matching search_word 
-		head_nodes += db_session.query(models.Node.node_id).filter(models.Node.node_id.like("%" + head_node + "%")).all()
-		
-		# Get all (head) nodes that contain a node id partially matching search_word 
-		tail_nodes += db_session.query(models.Node.node_id).filter(models.Node.node_id.like("%" + tail_node + "%")).all()
+		:param uid: Owner of the graph
+		:param search_type: Type of search (partial_search or full_search)
+		:param search_word: Edge being searched for
+		:param view_type: Type of view to limit the graphs to
+		:param cur: Database cursor
+		:return Edges: [Edges]
+	'''
 
-	# Remove all the duplicates
-	head_nodes = list(set(head_nodes))
-	tail_nodes = list(set(tail_nodes))
+	# All edges matching the search_word, for every graph
+	edge_query = matching_edges_query(search_type, search_word, db_session)
 
-	# Go through head and tail nodes to see if there are any graphs
-	# that match the given view type (my graphs, shared, public).
+	# Limit the edges to graphs that match the given view type (my graphs, shared, public).
 	# In other words, return all graphs that having matching edges
 	# for the given view type.
 
 	# TODO: ASK MURALI ABOUT BIDIRECTION EDGES
+	edge_query = filter_by_view_type(edge_query, models.Edge.graph_id, models.Edge.user_id, uid, view_type)
 
-	# If there are both head and tail nodes
-	if len(head_nodes) > 0 and len(tail_nodes) > 0:
-		# Go through all permutations of these nodes
-		# compile graphs that match the given view_type (my graphs, shared, public)
-		for i in xrange(len(head_nodes)):
-			for j in xrange(len(tail_nodes)):
-				h_node =  head_nodes[i][0]
-				t_node =  tail_nodes[j][0]
-				# For each view type, we query edges twice because we use head:tail and tail:head (to resolve undirected edge search issue)
-				if view_type == "public":
-					initial_graphs_matching_edges += db_session.query(models.Edge).filter(models.Edge.head_node_id == h_node).filter(models.Edge.tail_node_id == t_node).filter(models.Edge.graph_id == models.Graph.graph_id).filter(models.Graph.public == 1).all()
-					initial_graphs_matching_edges += db_session.query(models.Edge).filter(models.Edge.head_node_id == t_node).filter(models.Edge.tail_node_id == h_node).filter(models.Edge.graph_id == models.Graph.graph_id).filter(models.Graph.public == 1).all()
-				elif view_type == "shared":
-					initial_graphs_matching_edges += db_session.query(models.Edge).filter(models.GroupToGraph.user_id == uid).filter(models.Edge.graph_id == models.GroupToGraph.graph_id).filter(models.Edge.head_node_id == t_node).filter(models.Edge.tail_node_id == h_node).filter(models.Edge.graph_id == models.Graph.graph_id).all()
-					initial_graphs_matching_edges += db_session.query(models.Edge).filter(models.GroupToGraph.user_id == uid).filter(models.Edge.graph_id == models.GroupToGraph.graph_id).filter(models.Edge.head_node_id == t_node).filter(models.Edge.tail_node_id == h_node).filter(models.Edge.graph_id == models.Graph.graph_id).all()
-				else:
-					initial_graphs_matching_edges += db_session.query(models.Edge).filter(models.Edge.head_node_id == h_node).filter(models.Edge.tail_node_id == t_node).filter(models.Edge.graph_id == models.Graph.graph_id).filter(models.Edge.user_id == uid).all()
-					initial_graphs_matching_edges += db_session.query(models.Edge).filter(models.Edge.head_node_id == t_node).filter(models.Edge.tail_node_id == h_node).filter(models.Edge.graph_id == models.Graph.graph_id).filter(models.Edge.user_id == uid).all()
-
-
-		graph_dict = dict()
+	graph_dict = dict()
 
-		# Remove duplicates for all graphs that match have the same edge matching search term
-		for edge in initial_graphs_matching_edges:
-			key = edge.head_node_id + edge.graph_id + edge.user_id + edge.tail_node_id + edge.edge_id
-			if key in graph_dict:
-				continue
-			else:
-				graph_dict[key] = edge
+	# Remove duplicates for all graphs that match have the same edge matching search term
+	for edge in edge_query.all():
+		key = edge.head_node_id + edge.graph_id + edge.user_id + edge.tail_node_id + edge.edge_id
+		if key in graph_dict:
+			continue
+		else:
+			graph_dict[key] = edge
 
-		return graph_dict.values()
-	else:
-		return []
+	return graph_dict.values()
 
 def find_all_graphs_containing_nodes(uid, search_type, search_word, view_type, db_session):
 	'''
@@ -1317,106 +1741,22 @@ def find_all_graphs_containing_nodes(uid, search_type, search_word, view_type, d
 	initial_graphs_matching_nodes = []
 
 	# If search type wants to partially match node
-	if view_type == "my graphs":
-
-		if search_type == "partial_search":
-			# Get all partially matching nodes containing the label
-			initial_graphs_matching_nodes += db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.label.like("%" + search_word + "%")).filter(models.Node.user_id == uid).all()
-			
-			# Get all partially matching nodes containing the node id
-			initial_graphs_matching_nodes += db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.node_id.like("%" + search_word + "%")).filter(models.Node.user_id == uid).all()
-		else:
-			# Get all partially matching nodes containing the label
-			initial_graphs_matching_nodes += db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.label == search_word).filter(models.Node.user_id == uid).all()
-			
-			# Get all partially matching nodes containing the node id
-			initial_graphs_matching_nodes += db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.node_id == search_word).filter(models.Node.user_id == uid).all()
-	
-	# Shared graphs
-	elif view_type == "shared":
-		# Get all the groups that a user is a member of
-		groups_user_belongs_to = db_session.query(models.GroupToUser.group_id, models.GroupToUser.group_owner).filter(models.GroupToUser.user_id == uid).all()
-
-		# Get all graphs that are part of groups that the user belongs to
-		graphs_in_group = list()
-
-		# Go through each group and add graphs keys to the set
-		for single_group in groups_user_belongs_to:
-			group_id = single_group.group_id
-			group_owner = single_group.group_owner
-
-			graphs_in_group += db_session.query(models.GroupToGraph.graph_id, models.GroupToGraph.user_id).filter(models.GroupToGraph.group_id == group_id).filter(models.GroupToGraph.group_owner == group_owner).all()
-
-		# Go through all groups that the user owns
-		groups_user_owns = db_session.query(models.Group).filter(models.Group.owner_id == uid).all()
-
-		for single_group in groups_user_owns:
-			graphs_in_group += db_session.query(models.GroupToGraph.graph_id, models.GroupToGraph.user_id).filter(models.GroupToGraph.group_id == single_group.group_id).filter(models.GroupToGraph.group_owner == single_group.owner_id).all()
+	if search_type == "partial_search":
+		# Partial matches are answered by the search index
+		nodes = search_index.node_table()
 
-		if search_type == "partial_search":
-			# Get all graphs that contain a partially matched label and user does not own (since it's shared)
-			all_matched_node_graphs = db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.label.like("%" + search_word + "%")).all()
-
-			# Collect all graphs that are shared with user and matches terms
-			final_graphs = []
-
-			# Go through all matched graphs to see which graphs 
-			# are also shared with user and take the intersection
-			for matched in all_matched_node_graphs:
-				search_graph = (matched.graph_id, matched.user_id)
-				if search_graph in graphs_in_group:
-					final_graphs.append(matched)
-
-			# Get all graphs that contain a partially matched node and user does not own (since it's shared)
-			all_matched_node_graphs = db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.node_id.like("%" + search_word + "%")).all()
-
-			# Go through all matched graphs to see which graphs 
-			# are also shared with user and take the intersection
-			for matched in all_matched_node_graphs:
-				search_graph = (matched.graph_id, matched.user_id)
-				if search_graph in graphs_in_group:
-					final_graphs.append(matched)
-
-			initial_graphs_matching_nodes = final_graphs
-		else:
-			# Get all graphs that contain a partially matched label and user does not own (since it's shared)
-			all_matched_node_graphs = db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.label == search_word).all()
-
-			# Collect all graphs that are shared with user and matches terms
-			final_graphs = []
-
-			# Go through all matched graphs to see which graphs 
-			# are also shared with user and take the intersection
-			for matched in all_matched_node_graphs:
-				search_graph = (matched.graph_id, matched.user_id)
-				if search_graph in graphs_in_group:
-					final_graphs.append(matched)
-
-			# Get all graphs that contain a partially matched node and user does not own (since it's shared)
-			all_matched_node_graphs = db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.node_id == search_word).all()
-
-			# Go through all matched graphs to see which graphs 
-			# are also shared with user and take the intersection
-			for matched in all_matched_node_graphs:
-				search_graph = (matched.graph_id, matched.user_id)
-				if search_graph in graphs_in_group:
-					final_graphs.append(matched)
-
-			initial_graphs_matching_nodes = final_graphs
-	# public graphs
+		# Nodes containing the search word in their label or node id
+		conditions = [nodes.c.label.like("%" + search_word + "%"), nodes.c.node_id.like("%" + search_word + "%")]
 	else:
-		if search_type == "partial_search":
-			# Get all partially matching nodes containing the label
-			initial_graphs_matching_nodes += db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.label.like("%" + search_word + "%")).filter(models.Node.graph_id == models.Graph.graph_id).filter(models.Node.user_id == models.Graph.user_id).filter(models.Graph.public == 1).all()
+		nodes = models.Node.__table__
 
-			# Get all partially matching nodes containing the node id
-			initial_graphs_matching_nodes += db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.node_id.like("%" + search_word + "%")).filter(models.Node.graph_id == models.Graph.graph_id).filter(models.Node.user_id == models.Graph.user_id).filter(models.Graph.public == 1).all()
-		else:
-			# Get all partially matching nodes containing the label
-			initial_graphs_matching_nodes += db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.label == search_word).filter(models.Node.graph_id == models.Graph.graph_id).filter(models.Node.user_id == models.Graph.user_id).filter(models.Graph.public == 1).all()
+		# Nodes whose label or node id is the search word
+		conditions = [nodes.c.label == search_word, nodes.c.node_id == search_word]
 
-			# Get all partially matching nodes containing the node id
-			initial_graphs_matching_nodes += db_session.query(models.Node.graph_id, models.Node.node_id, models.Node.label, models.Node.modified, models.Node.user_id).filter(models.Node.node_id == search_word).filter(models.Node.graph_id == models.Graph.graph_id).filter(models.Node.user_id == models.Graph.user_id).filter(models.Graph.public == 1).all()
+	# Get all matching nodes of graphs that belong to the view type
+	for condition in conditions:
+		node_query = db_session.query(nodes.c.graph_id, nodes.c.node_id, nodes.c.label, nodes.c.modified, nodes.c.user_id).filter(condition)
+		initial_graphs_matching_nodes += filter_by_view_type(node_query, nodes.c.graph_id, nodes.c.user_id, uid, view_type).all()
 
 	graph_dict = dict()
 
@@ -1842,7 +2182,10 @@ def insert_graph(username, graphname, graph_json, created=None, modified=None, p
 	# Create database connection
 	db_session = data_connection.new_session()
 
-	validationErrors = validate_json(graph_json)
+	# Load JSON string into JSON structure (the only time it is parsed)
+	graphJson = json.loads(graph_json)
+
+	validationErrors = validate_json(graphJson)
 
 	if validationErrors != None:
 		return validationErrors 
@@ -1850,15 +2193,9 @@ def insert_graph(username, graphname, graph_json, created=None, modified=None, p
 	# Get the current time
 	curTime = datetime.now()
 
-	# Load JSON string into JSON structure
-	graphJson = json.loads(graph_json)
-
-	# Needed for old graphs, converts CytoscapeWeb to CytoscapeJS standard
-	if 'data' in graphJson['graph']:
-		graphJson = json.loads(convert_json(graph_json))
-
-	# Attach ID's to each edge for traversing the element
-	graphJson = assign_edge_ids(graphJson)	
+	# Convert old graphs and attach ID's to each edge for traversing the element (one pass, see normalize_graph).
+	# Node shapes and labels are stored as they were uploaded, get_graph_for_view normalizes them
+	graphJson = normalize_graph(graphJson, default_shapes=False, label_to_content=False)
 
 	nodes = graphJson['graph']['nodes']
 	
@@ -1875,11 +2212,15 @@ def insert_graph(username, graphname, graph_json, created=None, modified=None, p
 	elif created == None:
 		created = curTime
 
+	# JSON is shared with identical graphs (see store_graph_json)
+	json_text = json_storage.dumps(graphJson)
+	json_reference = store_graph_json(db_session, json_storage.content_hash(json_text), lambda: json_storage.encode(json_text))
+
 	# Construct new graph to add to database
-	new_graph = models.Graph(graph_id = graphname, user_id = username, json = json.dumps(graphJson, sort_keys=True, indent=4), created = created, modified = modified, public = public, shared_with_groups = shared_with_groups, default_layout_id = default_layout_id)
+	new_graph = models.Graph(graph_id = graphname, user_id = username, json = json_reference, created = created, modified = modified, public = public, shared_with_groups = shared_with_groups, default_layout_id = default_layout_id)
 
+	# The graph row is committed together with its tags, edges and nodes
 	db_session.add(new_graph)
-	db_session.commit()
 
 	if 'tags' in graphJson['metadata']:
 		tags = graphJson['metadata']['tags']
@@ -1893,9 +2234,38 @@ def insert_graph(username, graphname, graph_json, created=None, modified=None, p
 	# If everything works, return Nothing 
 	return None
 
+def bulk_insert(db_session, table, rows, batch_size=None):
+	'''
+		Inserts a list of rows into a table using batched executemany statements
+		that run inside the transaction of db_session.  Nothing is committed here,
+		the caller is responsible for committing once all rows are sent.
+
+		:param db_session: Database connection
+		:param table: SQLAlchemy Table (eg models.Node.__table__)
+		:param rows: List of dictionaries mapping column names to values
+		:param batch_size: Number of rows sent per statement (defaults to settings.BULK_INSERT_BATCH_SIZE)
+		:return Number of rows inserted
+	'''
+	if batch_size == None:
+		batch_size = BULK_INSERT_BATCH_SIZE
+
+	# Nothing to insert
+	if len(rows) == 0:
+		return 0
+
+	statement = table.insert()
+
+	# Send rows in chunks so that a huge graph does not build one gigantic statement
+	for start in xrange(0, len(rows), batch_size):
+		db_session.execute(statement, rows[start:start + batch_size])
+
+	return len(rows)
+
 def insert_data_for_graph(graphJson, graphname, username, tags, nodes, modified, public, db_session):
 	'''
 		Inserts metadata about a graph into its respective tables.
+		All tags, edges and nodes are written with batched inserts and
+		committed in a single transaction.
 
 		:param graphJson: JSON of graph
 		:param graphname: Name of graph
@@ -1906,97 +2276,299 @@ def insert_data_for_graph(graphJson, graphname, username, tags, nodes, modified,
 		:param public: Nodes to insert into nodes table
 		:param db_session: Database connection
 	'''
-	# Add all tags for this graph into graph_tag and graph_to_tag tables
-	for tag in tags:
-		tag_exists = db_session.query(models.GraphTag).filter(models.GraphTag.tag_id == tag).first()
+	start_time = time.time()
 
-		# If the tag doesn't already exists in the database, add it
-		if tag_exists == None:
-			new_tag = models.GraphTag(tag_id = tag)
-			db_session.add(new_tag)
-			db_session.commit()
+	# Make sure any pending ORM objects (eg the graph row) are part of this transaction
+	db_session.flush()
 
-		# Add to Graph to Tag table so that we can retrieve all graphs with tag
-		new_graph_to_tag = models.GraphToTag(graph_id = graphname, user_id = username, tag_id = tag)
-		db_session.add(new_graph_to_tag)
-		db_session.commit()
+	tag_rows, graph_to_tag_rows = tag_rows_for_graph(graphname, username, tags, db_session)
+
+	# Edges without an ID get a unique source-target ID (insert_graph already assigned them)
+	assign_edge_ids(graphJson, keep_existing=True)
 
 	# Go through edges and parse them accordingly
 	edges = graphJson['graph']['edges']
 
-	# If there are edges with same source and directed
-	dupEdges = []
-
-	# Number to differentiate between two duplicate edges
-	rand = 0
+	edge_rows = []
 
 	for edge in edges:
-		# Is the edge directed?
-		is_directed = 1
+		edge_rows.append(edge_row(graphname, username, edge['data']))
 
 		# Make edge undirected if it doesn't have target_arrow_shape attribute
 		if 'target_arrow_shape' not in edge['data']:
 			edge['data']['target_arrow_shape'] = "none"	
-			is_directed = 0
 
-		# To make sure int and floats are also accepted as source and target nodes of an edge
-		source_node = str(edge['data']['source'])
-		target_node = str(edge['data']['target'])
+	node_rows = []
 
-		# Keep track of all the duplicate edges
-		# If there are two duplicate edges, append a counter and store it as an ID
-		if source_node + '-' + target_node in dupEdges:
-			rand += 1
-			if 'id' not in edge['data']:
-				edge['data']['id'] = source_node + '-' + target_node + rand
+	# Go through all nodes in JSON and add to node table
+	for node in nodes:
+		node_rows.append(node_row(graphname, username, node['data'], modified))
 
+	# Send everything to the database in batches and commit once
+	try:
+		rows_inserted = bulk_insert(db_session, models.GraphTag.__table__, tag_rows)
+		rows_inserted += bulk_insert(db_session, models.GraphToTag.__table__, graph_to_tag_rows)
+		rows_inserted += bulk_insert(db_session, models.Edge.__table__, edge_rows)
+		rows_inserted += bulk_insert(db_session, models.Node.__table__, node_rows)
 
-		# If this is first time we've seen an edge, simply get its ID without the counter
-		else:
-			if 'id' not in edge['data']:
-				edge['data']['id'] = source_node + '-' + target_node
+		# Keep the search index in sync with the node table
+		search_index.index_graph(db_session, username, graphname, node_rows, BULK_INSERT_BATCH_SIZE)
 
-		dupEdges.append(source_node + '-' + target_node)
+		db_session.commit()
+	except Exception:
+		db_session.rollback()
+		raise
 
-		# TRICKY NOTE: An edge's ID is used as the label property
-		# The reason is because edge uses an 'id' column as the primary key.
-		# The label was the column I decided to avoid completely reconstructing the database
-		# POSSIBLE SOLUTION: If edge is bidirectional, we insert two edges with inverse source and target nodes
-		if is_directed == 0:
-			new_edge = models.Edge(user_id = username, graph_id = graphname, head_node_id = source_node, tail_node_id = target_node, edge_id = edge['data']['id'], directed = is_directed, id = None)
-			db_session.add(new_edge)
+	elapsed = time.time() - start_time
+	print "Inserted %d rows for graph %s in %.3f seconds (%.0f rows/sec)" % (rows_inserted, graphname, elapsed, rows_inserted / max(elapsed, 1e-6))
 
-			# ASK MURALI ABOUT THIS
-			# new_edge = models.Edge(user_id = username, graph_id = graphname, head_node_id = edge['data']['target'], tail_node_id = edge['data']['source'], edge_id = edge['data']['id'], directed = is_directed, id = None)
-			# db_session.add(new_edge)
+def tag_rows_for_graph(graphname, username, tags, db_session):
+	'''
+		Rows to insert for the tags of a graph.
 
-		else:
-			new_edge = models.Edge(user_id = username, graph_id = graphname, head_node_id = source_node, tail_node_id = target_node, edge_id = edge['data']['id'], directed = is_directed, id = None)
-			db_session.add(new_edge)
+		:param graphname: Name of graph
+		:param username: Owner of graph
+		:param tags: Tags of graph
+		:param db_session: Database connection
+		:return (tag_rows, graph_to_tag_rows): Rows for the graph_tag table (new tags only) and the graph_to_tag table
+	'''
+	# Remove duplicate tags while preserving their order
+	tags = add_unique_to_list([], tags)
 
-		db_session.commit()
+	tag_rows = []
+	graph_to_tag_rows = []
 
-	# Go through all nodes in JSON and add to node table
-	for node in nodes:
-		# Used for backwards-compatibility since some JSON have label 
-		# but new CytoscapeJS uses the content property
-		if 'label' in node['data']:
-			node['data']['content'] = node['data']['label']
-			del node['data']['label']
+	if len(tags) > 0:
+		# Find all tags that already exist with one query
+		existing_tags = db_session.query(models.GraphTag.tag_id).filter(models.GraphTag.tag_id.in_(tags)).all()
+		existing_tags = set([tag[0] for tag in existing_tags])
+
+		for tag in tags:
+			# If the tag doesn't already exists in the database, add it
+			if tag not in existing_tags:
+				tag_rows.append({'tag_id': tag})
+
+			# Add to Graph to Tag table so that we can retrieve all graphs with tag
+			graph_to_tag_rows.append({'graph_id': graphname, 'user_id': username, 'tag_id': tag})
+
+	return tag_rows, graph_to_tag_rows
+
+def edge_row(graphname, username, edge):
+	'''
+		Row of the edge table for an edge.
+
+		:param graphname: Name of graph
+		:param username: Owner of graph
+		:param edge: Data of the edge (with its ID assigned)
+		:return Row: Dictionary mapping column names to values
+	'''
+	# Edges without a target_arrow_shape attribute are undirected
+	is_directed = 1
+	if 'target_arrow_shape' not in edge:
+		is_directed = 0
+
+	# To make sure int and floats are also accepted as source and target nodes of an edge
+	source_node = unicode(edge['source'])
+	target_node = unicode(edge['target'])
+
+	# TRICKY NOTE: An edge's ID is used as the label property
+	# The reason is because edge uses an 'id' column as the primary key.
+	# The label was the column I decided to avoid completely reconstructing the database
+	# POSSIBLE SOLUTION: If edge is bidirectional, we insert two edges with inverse source and target nodes
+	# ASK MURALI ABOUT THIS (undirected edges are currently stored once, in the given direction)
+	return {'user_id': username, 'graph_id': graphname, 'head_node_id': source_node, 'tail_node_id': target_node, 'edge_id': edge['id'], 'directed': is_directed}
+
+def node_row(graphname, username, node, modified):
+	'''
+		Row of the node table for a node.
+
+		:param graphname: Name of graph
+		:param username: Owner of graph
+		:param node: Data of the node
+		:param modified: Modification date of graph
+		:return Row: Dictionary mapping column names to values
+	'''
+	# Used for backwards-compatibility since some JSON have label 
+	# but new CytoscapeJS uses the content property
+	if 'label' in node:
+		label = node['label']
+	else:
+		label = node.get('content', "")
+
+	# Node ids are stored as text (ints and floats are accepted in the JSON)
+	return {'node_id': unicode(node['id']), 'label': label, 'user_id': username, 'graph_id': graphname, 'modified': modified}
+
+def insert_graph_stream(username, graphname, stream, created=None, modified=None, public=0, shared_with_groups=0, default_layout_id=None, progress=None):
+	'''
+		Inserts a uniquely named graph under a username, reading its JSON
+		from a file-like object (eg an uploaded file) instead of a string.
 
-		# If the node has any content inside of it, display that content, otherwise, just make it an empty string
-		if 'content' not in node['data']:
-			node['data']['content'] = ""
+		The file is read twice with the incremental ijson parser: once to
+		validate it (see validate_json_stream), and once to insert it.  While
+		it is inserted, every edge gets its ID as soon as it is parsed and
+		the rows of nodes and edges are sent to the database once
+		BULK_INSERT_BATCH_SIZE rows are waiting, so the rows held in memory
+		are bounded by the batch size instead of the size of the graph.  The stored JSON is built with
+		json_storage.GraphJsonWriter and is the same as insert_graph stores.
+		Everything is committed in a single transaction.
 
-		# Add node to table
-		new_node = models.Node(node_id = node['data']['id'], label = node['data']['content'], user_id = username, graph_id = graphname, modified = modified)
+		Falls back to insert_graph if ijson is not installed.
+
+		:param username: Email of user in GraphSpace
+		:param graphname: Name of graph to insert
+		:param stream: File-like object to read the JSON of graph from (must support seek)
+		:param created: When was graph created
+		:param public: Is graph public?
+		:param shared_with_groups: Is graph shared with any groups?
+		:param default_layout_id: Default layout of the graph
+		:param progress: Called with the number of rows inserted so far after every batch (optional)
+	'''
+
+	# Check to see if graph already exists
+	graph_exists = get_graph(username, graphname)
+
+	# If graph already exists for user, alert them
+	if graph_exists != None:
+		return 'Graph ' + graphname + ' already exists for ' + username + '!'
+
+	if json_validator.ijson == None:
+		return insert_graph(username, graphname, stream.read(), created, modified, public, shared_with_groups, default_layout_id)
+
+	# Validate the whole graph before anything is written
+	validationErrors = validate_json_stream(stream)
+
+	if validationErrors != None:
+		return validationErrors
+
+	# Read the graph again, this time to insert it
+	stream.seek(0)
+
+	start_time = time.time()
+
+	# Get the current time
+	curTime = datetime.now()
+
+	# If we're not passed in any time values, use the current time as timestamps
+	if modified == None and created == None:
+		modified = curTime
+		created = curTime
+
+	# If we're given a creation time but no modified time, use current time
+	elif modified == None:
+		modified = curTime
+
+	# If we're given a modified time but no creation time, use current time
+	elif created == None:
+		created = curTime
+
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	writer = json_storage.GraphJsonWriter()
+
+	# Properties of the graph other than its nodes and edges
+	graph_properties = {}
+	top_properties = {}
+	cytoscape_web = False
+
+	edge_ids = EdgeIdAssigner()
+	node_rows = []
+	edge_rows = []
+	rows_inserted = 0
+
+	try:
+		# The JSON is written once all nodes and edges are read
+		new_graph = models.Graph(graph_id = graphname, user_id = username, json = '', created = created, modified = modified, public = public, shared_with_groups = shared_with_groups, default_layout_id = default_layout_id)
+		db_session.add(new_graph)
+		db_session.flush()
+
+		search_index.index_graph(db_session, username, graphname, [], BULK_INSERT_BATCH_SIZE)
+
+		for section, key, value in iter_graph_elements(stream):
+
+			if section == 'nodes':
+				# Node shapes and labels are stored as they were uploaded (see insert_graph)
+				writer.add('nodes', value)
+				node_rows.append(node_row(graphname, username, value['data'], curTime))
+
+				if len(node_rows) >= BULK_INSERT_BATCH_SIZE:
+					rows_inserted += bulk_insert(db_session, models.Node.__table__, node_rows)
+					search_index.index_nodes(db_session, node_rows, BULK_INSERT_BATCH_SIZE)
+					node_rows = []
+
+					if progress != None:
+						progress(rows_inserted)
+
+			elif section == 'edges':
+				# Attach ID's to each edge for traversing the element (see assign_edge_ids)
+				edge_ids.assign(value['data'])
+				writer.add('edges', value)
+				edge_rows.append(edge_row(graphname, username, value['data']))
+
+				if len(edge_rows) >= BULK_INSERT_BATCH_SIZE:
+					rows_inserted += bulk_insert(db_session, models.Edge.__table__, edge_rows)
+					edge_rows = []
+
+					if progress != None:
+						progress(rows_inserted)
+
+			elif section == 'graph':
+				graph_properties[key] = value
+
+			elif section == 'top':
+				top_properties[key] = value
+
+			elif section == 'format':
+				cytoscape_web = True
+
+		# Send the rows of the last batch
+		rows_inserted += bulk_insert(db_session, models.Node.__table__, node_rows)
+		search_index.index_nodes(db_session, node_rows, BULK_INSERT_BATCH_SIZE)
+		rows_inserted += bulk_insert(db_session, models.Edge.__table__, edge_rows)
+
+		metadata = top_properties.get('metadata', {})
+
+		# Old graphs only keep their metadata, nodes and edges (see convert_graph)
+		if cytoscape_web:
+			graph_properties = {}
+			top_properties = {'metadata': metadata}
+
+		if 'tags' in metadata:
+			tags = metadata['tags']
+		else:
+			tags = []
+
+		tag_rows, graph_to_tag_rows = tag_rows_for_graph(graphname, username, tags, db_session)
+		rows_inserted += bulk_insert(db_session, models.GraphTag.__table__, tag_rows)
+		rows_inserted += bulk_insert(db_session, models.GraphToTag.__table__, graph_to_tag_rows)
+
+		# JSON is shared with identical graphs (see store_graph_json)
+		new_graph.json = store_graph_json(db_session, writer.content_hash(graph_properties, top_properties), lambda: writer.encode(graph_properties, top_properties))
 
-		db_session.add(new_node)
 		db_session.commit()
-			
+	except Exception:
+		db_session.rollback()
+		raise
+	finally:
+		writer.close()
+		db_session.close()
+
+	elapsed = time.time() - start_time
+	print "Inserted %d rows for graph %s in %.3f seconds (%.0f rows/sec)" % (rows_inserted, graphname, elapsed, rows_inserted / max(elapsed, 1e-6))
+
+	# If everything works, return Nothing
+	return None
+
 def update_graph(username, graphname, graph_json):
 	'''
 		Updates the JSON for a graph.
+
+		The new JSON is compared against the nodes (by node id), edges (by
+		source, target and id) and tags stored for the graph, and only the
+		differences are written: new rows are inserted, missing rows are
+		deleted and changed rows are updated, all in a single transaction.
+		The graph keeps its creation date, sharing and default layout.
+		Nodes that did not change keep their modification date.
 	
 		:param username: Email of user in GraphSpace
 		:param graphname: Name of graph to insert
@@ -2010,129 +2582,531 @@ def update_graph(username, graphname, graph_json):
 	if graph == None:
 		return "Can't update " + graphname + " because it does not exist for " + username
 
+	# Load JSON string into JSON structure (the only time it is parsed)
+	graphJson = json.loads(graph_json)
+
+	validationErrors = validate_json(graphJson)
+
+	if validationErrors != None:
+		return validationErrors
+
+	start_time = time.time()
+
+	# Get the current time
+	curTime = datetime.now()
+
+	# Convert old graphs and attach ID's to each edge (see insert_graph)
+	graphJson = normalize_graph(graphJson, default_shapes=False, label_to_content=False)
+
+	json_text = json_storage.dumps(graphJson)
+	json_hash = json_storage.content_hash(json_text)
+
+	# Same JSON as stored, nothing to do
+	if json_storage.referenced_hash(graph.json) == json_hash:
+		print "Graph %s is unchanged" % graphname
+		return None
+
 	# Get database connection
 	db_session = data_connection.new_session()
 
-	# Delete from graph
-	db_session.delete(graph)
-	db_session.commit()
-
 	try:
-		# Get all tags for the graph
-		gt_to_delete = db_session.query(models.GraphToTag).filter(models.GraphToTag.graph_id == graphname).filter(models.GraphToTag.user_id == username).all()
+		# JSON the graph refers to, read again inside this transaction (another update may have replaced it since get_graph)
+		current = db_session.query(models.Graph.json).filter(models.Graph.user_id == username).filter(models.Graph.graph_id == graphname).first()
+
+		if current == None:
+			db_session.rollback()
+			return "Can't update " + graphname + " because it does not exist for " + username
+
+		node_changes = diff_nodes(db_session, username, graphname, graphJson['graph']['nodes'], curTime)
+		edge_changes = diff_edges(db_session, username, graphname, graphJson['graph']['edges'])
+
+		if 'tags' in graphJson['metadata']:
+			tags = graphJson['metadata']['tags']
+		else:
+			tags = []
+
+		tag_changes = diff_tags(db_session, username, graphname, tags)
+
+		# Edges go first, so no edge refers to a node that is already gone
+		rows_changed = bulk_delete(db_session, models.Edge.__table__, [models.Edge.id], edge_changes['delete'])
+		rows_changed += bulk_delete(db_session, models.Node.__table__, [models.Node.user_id, models.Node.graph_id, models.Node.node_id], node_changes['delete'])
+		rows_changed += bulk_delete(db_session, models.GraphToTag.__table__, [models.GraphToTag.user_id, models.GraphToTag.graph_id, models.GraphToTag.tag_id], tag_changes['delete'])
+
+		rows_changed += bulk_update(db_session, models.Node.__table__, [models.Node.user_id, models.Node.graph_id, models.Node.node_id], node_changes['update'])
+		rows_changed += bulk_update(db_session, models.Edge.__table__, [models.Edge.id], edge_changes['update'])
+
+		rows_changed += bulk_insert(db_session, models.Node.__table__, node_changes['insert'])
+		rows_changed += bulk_insert(db_session, models.Edge.__table__, edge_changes['insert'])
+		rows_changed += bulk_insert(db_session, models.GraphTag.__table__, tag_changes['new_tags'])
+		rows_changed += bulk_insert(db_session, models.GraphToTag.__table__, tag_changes['insert'])
+
+		# Keep the search index in sync with the node table (relabeled nodes are re-indexed)
+		search_index.unindex_nodes(db_session, username, graphname, [row['b_node_id'] for row in node_changes['delete'] + node_changes['update']], BULK_INSERT_BATCH_SIZE)
+		search_index.index_nodes(db_session, node_changes['insert'] + node_changes['reindex'], BULK_INSERT_BATCH_SIZE)
+
+		# Refer to the new JSON.  Everything else about the graph (creation date, sharing, default layout) stays as it is
+		json_reference = store_graph_json(db_session, json_hash, lambda: json_storage.encode(json_text))
+
+		# Only replace the JSON read above: if an overlapping update replaced it first, the old JSON
+		# has already been let go of and must not be released twice
+		replaced = db_session.query(models.Graph).filter(models.Graph.user_id == username).filter(models.Graph.graph_id == graphname).filter(models.Graph.json == current.json).update({'json': json_reference, 'modified': curTime}, synchronize_session=False)
+
+		if replaced == 0:
+			db_session.rollback()
+			return "Can't update " + graphname + " because it was changed by another update, please try again"
+
+		# Let go of the old JSON
+		release_graph_json(db_session, [current.json])
+
+		db_session.commit()
+	except Exception:
+		db_session.rollback()
+		raise
+	finally:
+		db_session.close()
+
+	# Drop the cached drawing of the old version
+	graph_cache.discard_graph(username, graphname)
+
+	elapsed = time.time() - start_time
+	print "Updated graph %s: %d rows changed in %.3f seconds" % (graphname, rows_changed, elapsed)
+
+	return None
+
+def diff_nodes(db_session, username, graphname, nodes, modified):
+	'''
+		Compares the nodes of a graph with the nodes stored for it.
+
+		:param db_session: Database connection
+		:param username: Owner of graph
+		:param graphname: Name of graph
+		:param nodes: Nodes of the new JSON of the graph (normalized)
+		:param modified: Modification date of inserted and updated nodes
+		:return Changes: {'insert': node rows, 'delete': keys, 'update': keys with new values, 'reindex': node rows of updated nodes}
+	'''
+	# node_id -> label of every stored node
+	stored = dict(db_session.query(models.Node.node_id, models.Node.label).filter(models.Node.user_id == username).filter(models.Node.graph_id == graphname).all())
+
+	changes = {'insert': [], 'delete': [], 'update': [], 'reindex': []}
+	seen = set()
+
+	for node in nodes:
+		row = node_row(graphname, username, node['data'], modified)
+		seen.add(row['node_id'])
+
+		if row['node_id'] not in stored:
+			changes['insert'].append(row)
+		elif stored[row['node_id']] != row['label']:
+			changes['update'].append({'b_user_id': username, 'b_graph_id': graphname, 'b_node_id': row['node_id'], 'label': row['label'], 'modified': modified})
+			changes['reindex'].append(row)
+
+	for node_id in stored:
+		if node_id not in seen:
+			changes['delete'].append({'b_user_id': username, 'b_graph_id': graphname, 'b_node_id': node_id})
+
+	return changes
+
+def diff_edges(db_session, username, graphname, edges):
+	'''
+		Compares the edges of a graph with the edges stored for it.
+		Edges are matched on (source, target, id).
+
+		:param db_session: Database connection
+		:param username: Owner of graph
+		:param graphname: Name of graph
+		:param edges: Edges of the new JSON of the graph (with their ID's assigned)
+		:return Changes: {'insert': edge rows, 'delete': keys, 'update': keys with new values}
+	'''
+	# (source, target, id) -> (row id, directed) of every stored edge
+	stored = {}
+	for edge in db_session.query(models.Edge.head_node_id, models.Edge.tail_node_id, models.Edge.edge_id, models.Edge.id, models.Edge.directed).filter(models.Edge.user_id == username).filter(models.Edge.graph_id == graphname):
+		stored[(edge.head_node_id, edge.tail_node_id, edge.edge_id)] = (edge.id, edge.directed)
+
+	changes = {'insert': [], 'delete': [], 'update': []}
+	seen = set()
+
+	for edge in edges:
+		row = edge_row(graphname, username, edge['data'])
+		key = (row['head_node_id'], row['tail_node_id'], row['edge_id'])
+		seen.add(key)
+
+		if key not in stored:
+			changes['insert'].append(row)
+		elif stored[key][1] != row['directed']:
+			changes['update'].append({'b_id': stored[key][0], 'directed': row['directed']})
+
+	for key in stored:
+		if key not in seen:
+			changes['delete'].append({'b_id': stored[key][0]})
+
+	return changes
+
+def diff_tags(db_session, username, graphname, tags):
+	'''
+		Compares the tags of a graph with the tags stored for it.
+
+		:param db_session: Database connection
+		:param username: Owner of graph
+		:param graphname: Name of graph
+		:param tags: Tags in the new JSON of the graph
+		:return Changes: {'new_tags': graph_tag rows, 'insert': graph_to_tag rows, 'delete': keys}
+	'''
+	stored = set([tag[0] for tag in db_session.query(models.GraphToTag.tag_id).filter(models.GraphToTag.user_id == username).filter(models.GraphToTag.graph_id == graphname).all()])
+
+	# Only tags the graph did not have yet need rows
+	tags = add_unique_to_list([], tags)
+	tag_rows, graph_to_tag_rows = tag_rows_for_graph(graphname, username, [tag for tag in tags if tag not in stored], db_session)
+
+	delete = [{'b_user_id': username, 'b_graph_id': graphname, 'b_tag_id': tag} for tag in stored if tag not in set(tags)]
+
+	return {'new_tags': tag_rows, 'insert': graph_to_tag_rows, 'delete': delete}
+
+def bulk_delete(db_session, table, key_columns, keys, batch_size=None):
+	'''
+		Deletes rows by key using batched executemany statements that run inside
+		the transaction of db_session (see bulk_insert).
+
+		:param db_session: Database connection
+		:param table: SQLAlchemy Table (eg models.Node.__table__)
+		:param key_columns: Columns that identify a row
+		:param keys: List of dictionaries mapping b_<column name> to the value of each key column
+		:param batch_size: Number of rows sent per statement (defaults to settings.BULK_INSERT_BATCH_SIZE)
+		:return Number of rows deleted
+	'''
+	if batch_size == None:
+		batch_size = BULK_INSERT_BATCH_SIZE
+
+	if len(keys) == 0:
+		return 0
+
+	statement = table.delete().where(and_(*[column == bindparam('b_' + column.name) for column in key_columns]))
+
+	for start in xrange(0, len(keys), batch_size):
+		db_session.execute(statement, keys[start:start + batch_size])
+
+	return len(keys)
+
+def bulk_update(db_session, table, key_columns, rows, batch_size=None):
+	'''
+		Updates rows by key using batched executemany statements that run inside
+		the transaction of db_session (see bulk_insert).
 
-		# Remove all graph_to_tag associations
-		for gt in gt_to_delete:
-			db_session.delete(gt)
+		:param db_session: Database connection
+		:param table: SQLAlchemy Table (eg models.Node.__table__)
+		:param key_columns: Columns that identify a row
+		:param rows: List of dictionaries mapping b_<column name> to the value of each key
+			column, and the names of the columns to update to their new values
+		:param batch_size: Number of rows sent per statement (defaults to settings.BULK_INSERT_BATCH_SIZE)
+		:return Number of rows updated
+	'''
+	if batch_size == None:
+		batch_size = BULK_INSERT_BATCH_SIZE
+
+	if len(rows) == 0:
+		return 0
+
+	statement = table.update().where(and_(*[column == bindparam('b_' + column.name) for column in key_columns]))
+
+	for start in xrange(0, len(rows), batch_size):
+		db_session.execute(statement, rows[start:start + batch_size])
+
+	return len(rows)
+
+def store_graph_json(db_session, json_hash, encode):
+	'''
+		Adds a reference to graph JSON in the graph_blob table, inserting
+		the JSON if no other graph has the same content yet.  Runs inside the
+		transaction of db_session, nothing is committed here.
+
+		:param db_session: Database connection
+		:param json_hash: Hash of the compact JSON text (see json_storage.content_hash)
+		:param encode: Called without arguments to get the value to store (see json_storage.encode),
+			only if the JSON is not stored yet
+		:return Value: Reference to write to the graph.json column
+	'''
+	blob_table = models.GraphBlob.__table__
+
+	# Identical JSON is already stored, share it
+	shared = db_session.execute(blob_table.update().where(blob_table.c.content_hash == json_hash).values(ref_count=blob_table.c.ref_count + 1))
+
+	if shared.rowcount == 0:
+		db_session.execute(blob_table.insert(), [{'content_hash': json_hash, 'json': encode(), 'ref_count': 1}])
+
+	return json_storage.reference(json_hash)
+
+def release_graph_json(db_session, values):
+	'''
+		Drops references to graph JSON in the graph_blob table (eg of deleted
+		graphs) and deletes JSON no graph refers to anymore.  Values that are
+		stored in the graph row itself are ignored.  Runs inside the
+		transaction of db_session, nothing is committed here.
+
+		:param db_session: Database connection
+		:param values: Values of the graph.json column (or their first json_storage.REFERENCE_LENGTH characters)
+	'''
+	# Number of references to drop per hash
+	released = Counter()
+	for value in values:
+		json_hash = json_storage.referenced_hash(value)
+		if json_hash != None:
+			released[json_hash] += 1
+
+	if len(released) == 0:
+		return
+
+	blob_table = models.GraphBlob.__table__
+
+	release = blob_table.update().where(blob_table.c.content_hash == bindparam('b_content_hash')).values(ref_count=blob_table.c.ref_count - bindparam('b_count'))
+	db_session.execute(release, [{'b_content_hash': json_hash, 'b_count': released[json_hash]} for json_hash in released])
+
+	hashes = list(released)
+	for start in xrange(0, len(hashes), GRAPH_DELETE_BATCH_SIZE):
+		db_session.execute(blob_table.delete().where(blob_table.c.content_hash.in_(hashes[start:start + GRAPH_DELETE_BATCH_SIZE])).where(blob_table.c.ref_count <= 0))
+
+def load_graph_json(db_session, value):
+	'''
+		JSON text of a graph.json value, read from the graph_blob table if
+		the value is a reference.
+
+		:param db_session: Database connection
+		:param value: Value read from the graph.json column
+		:return JSON: JSON text of the graph
+	'''
+	json_hash = json_storage.referenced_hash(value)
+
+	if json_hash == None:
+		return json_storage.decode(value)
+
+	blob = db_session.query(models.GraphBlob.json).filter(models.GraphBlob.content_hash == json_hash).one()
+	return json_storage.decode(blob.json)
+
+def get_graph_json(username, graphname):
+	'''
+		Get the JSON of the graph to view.
+
+		:param username: Email of user in GraphSpace
+		:param password: Password of the user
+		:return JSON: JSON of graph to view
+	'''
+	# Get the graph
+	graph = get_graph(username, graphname)
+
+	# If graph doesn't exist, return None
+	if graph == None:
+		return None
+
+	# Create database connection
+	db_session = data_connection.new_session()
+	graph_json = load_graph_json(db_session, graph.json)
+	db_session.close()
+
+	return graph_json
+
+def rewrite_graph_json(storage_format=None, batch_size=100):
+	'''
+		Rewrites the JSON of every graph compactly in a storage format
+		(see graphs.util.json_storage). Used to migrate graphs that were
+		stored as indented text, or in the graph row itself: their JSON is
+		moved to the graph_blob table, shared with identical graphs (see
+		store_graph_json). JSON that is already in the graph_blob table is
+		re-encoded if it is stored in another format. Rows are read and
+		written batch_size at a time, each batch in its own transaction.
+
+		:param storage_format: text, zlib or zstd (None for the configured format)
+		:param batch_size: Number of graphs (or blobs) rewritten per transaction
+		:return Stats: {'graphs': graphs moved to the graph_blob table, 'blobs': re-encoded blobs,
+			'bytes_before': size before, 'bytes_after': size after}
+	'''
+	storage_format = json_storage.resolve_format(storage_format)
+
+	stats = {'graphs': 0, 'blobs': 0, 'bytes_before': 0, 'bytes_after': 0}
+
+	graph_table = models.Graph.__table__
+	blob_table = models.GraphBlob.__table__
+
+	# Parameter names of the updates differ from the column names (SQLAlchemy reserves those)
+	update_json = graph_table.update().where(graph_table.c.graph_id == bindparam('b_graph_id')).where(graph_table.c.user_id == bindparam('b_user_id')).values(json=bindparam('b_json'))
+	update_blob = blob_table.update().where(blob_table.c.content_hash == bindparam('b_content_hash')).values(json=bindparam('b_json'))
+
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	# Walk through the graphs in (user_id, graph_id) order, continuing after the last graph of the previous batch
+	last_key = None
+
+	while True:
+		query = db_session.query(models.Graph.user_id, models.Graph.graph_id, models.Graph.json)
+		if last_key != None:
+			query = query.filter(tuple_(models.Graph.user_id, models.Graph.graph_id) > tuple_(*last_key))
+
+		graphs = query.order_by(models.Graph.user_id, models.Graph.graph_id).limit(batch_size).all()
+
+		if len(graphs) == 0:
+			break
+
+		# Sizes of the JSON that is stored for the first time
+		new_blobs = []
+
+		def encode(json_text):
+			value = json_storage.encode(json_text, storage_format)
+			new_blobs.append(len(value))
+			return value
+
+		updates = []
+
+		try:
+			for graph in graphs:
+				# Already in the graph_blob table
+				if json_storage.referenced_hash(graph.json) != None:
+					continue
+
+				# Re-serialize, which drops the indentation of old graphs
+				json_text = json_storage.dumps(json.loads(json_storage.decode(graph.json)))
+				value = store_graph_json(db_session, json_storage.content_hash(json_text), lambda: encode(json_text))
+
+				stats['bytes_before'] += len(graph.json)
+				stats['bytes_after'] += len(value)
+
+				updates.append({'b_graph_id': graph.graph_id, 'b_user_id': graph.user_id, 'b_json': value})
+
+			if len(updates) > 0:
+				db_session.execute(update_json, updates)
 			db_session.commit()
+		except Exception:
+			db_session.rollback()
+			db_session.close()
+			raise
 
-	except NoResultFound:
-		print "No tags for graph"
+		stats['graphs'] += len(updates)
+		stats['bytes_after'] += sum(new_blobs)
+		last_key = (graphs[-1].user_id, graphs[-1].graph_id)
+
+		print "Moved %d graphs (%d bytes -> %d bytes)" % (stats['graphs'], stats['bytes_before'], stats['bytes_after'])
+
+	# Re-encode shared JSON that is stored in another format
+	last_hash = None
+
+	while True:
+		query = db_session.query(models.GraphBlob.content_hash, models.GraphBlob.json)
+		if last_hash != None:
+			query = query.filter(models.GraphBlob.content_hash > last_hash)
+
+		blobs = query.order_by(models.GraphBlob.content_hash).limit(batch_size).all()
+
+		if len(blobs) == 0:
+			break
 
-	try:
-		# Delete from edge
-		edges_to_delete = db_session.query(models.Edge).filter(models.Edge.graph_id == graphname).filter(models.Edge.user_id == username).all()
+		updates = []
+		for blob in blobs:
+			if json_storage.format_of(blob.json) == storage_format:
+				continue
 
-		for edge in edges_to_delete:
-			db_session.delete(edge)
-			db_session.commit()
+			# JSON in the graph_blob table is already compact
+			value = json_storage.encode(json_storage.decode(blob.json), storage_format)
 
-	except NoResultFound:
-		print "No edges in graph to delete"
+			stats['bytes_before'] += len(blob.json)
+			stats['bytes_after'] += len(value)
 
-	try:
-		# Delete from node
-		nodes_to_delete = db_session.query(models.Node).filter(models.Node.graph_id == graphname).filter(models.Node.user_id == username).all()
+			updates.append({'b_content_hash': blob.content_hash, 'b_json': value})
 
-		for node in nodes_to_delete:
-			db_session.delete(node)
+		try:
+			if len(updates) > 0:
+				db_session.execute(update_blob, updates)
 			db_session.commit()
+		except Exception:
+			db_session.rollback()
+			db_session.close()
+			raise
 
-	except NoResultFound:
-		print "No nodes in graph to delete"
+		stats['blobs'] += len(updates)
+		last_hash = blobs[-1].content_hash
 
-	# Re-insert graph
-	result = insert_graph(username, graphname, graph_json, graph.created, datetime.now(), graph.public, graph.shared_with_groups, graph.default_layout_id)
+		print "Re-encoded %d blobs (%d bytes -> %d bytes)" % (stats['blobs'], stats['bytes_before'], stats['bytes_after'])
 
-	return result
+	db_session.close()
+	return stats
 
-def get_graph_json(username, graphname):
+def delete_graph(username, graphname):
 	'''
-		Get the JSON of the graph to view.
+		Deletes graph from database.
 
 		:param username: Email of user in GraphSpace
 		:param password: Password of the user
-		:return JSON: JSON of graph to view
 	'''
-	# Get the graph
-	graph = get_graph(username, graphname)
 
-	# If graph doesn't exist, return None
-	if graph == None:
-		return None
-
-	return graph.json
+	try:
+		delete_graphs([(username, graphname)])
+	except Exception as ex:
+		print ex
+		return
 
-def delete_graph(username, graphname):
+def delete_graphs(graphs, progress=None):
 	'''
-		Deletes graph from database.
+		Deletes many graphs together with their tags, group shares, edges,
+		nodes and layouts.  Every table is cleared with one DELETE ... WHERE
+		statement per GRAPH_DELETE_BATCH_SIZE graphs of an owner, and
+		everything is committed in a single transaction.
 
-		:param username: Email of user in GraphSpace
-		:param password: Password of the user
+		:param graphs: [(user_id, graph_id)] of graphs to delete
+		:param progress: Called with the number of graphs deleted so far after every batch (optional)
+		:return Number of graphs deleted
 	'''
+	# graph ids of every owner, so that each statement matches on a single owner
+	graphs_by_owner = defaultdict(set)
+	for user_id, graph_id in graphs:
+		graphs_by_owner[user_id].add(graph_id)
 
-	# Get graph
-	graph = get_graph(username, graphname)
+	if len(graphs_by_owner) == 0:
+		return 0
 
-	if graph == None:
-		return
+	start_time = time.time()
 
 	# Create database connection
 	db_session = data_connection.new_session()
 
+	graphs_deleted = 0
+
 	try:
-		# Delete graph 
-		db_session.delete(graph)
+		for user_id in graphs_by_owner:
+			graph_ids = list(graphs_by_owner[user_id])
 
-		db_session.commit()
-		# Delete from graph_to_tag
-		gt = db_session.query(models.GraphToTag).filter(models.GraphToTag.user_id == username).filter(models.GraphToTag.graph_id == graphname).all()
+			for start in xrange(0, len(graph_ids), GRAPH_DELETE_BATCH_SIZE):
+				batch = graph_ids[start:start + GRAPH_DELETE_BATCH_SIZE]
 
-		for g_tags in gt:
-			db_session.delete(g_tags)
-			db_session.commit()
-		# Delete from group_to_graph
-		gg = db_session.query(models.GroupToGraph).filter(models.GroupToGraph.user_id == username).filter(models.GroupToGraph.graph_id == graphname).all()
+				# JSON that is not shared with other graphs is deleted (only the references are read)
+				references = db_session.query(func.substr(models.Graph.json, 1, json_storage.REFERENCE_LENGTH)).filter(models.Graph.user_id == user_id).filter(models.Graph.graph_id.in_(batch)).all()
+				release_graph_json(db_session, [reference[0] for reference in references])
 
-		for g_gruop in gg:
-			db_session.delete(g_gruop)
-			db_session.commit()
-		# Delete from edge
-		edge = db_session.query(models.Edge).filter(models.Edge.graph_id == graphname).filter(models.Edge.user_id == username).all()
+				# Rows that refer to the graphs go first, the graph rows last
+				for table in (models.GraphToTag, models.GroupToGraph, models.Edge, models.Node, models.Layout):
+					db_session.execute(table.__table__.delete().where(table.user_id == user_id).where(table.graph_id.in_(batch)))
 
-		for e in edge:
-			db_session.delete(e)
-			db_session.commit()
+				result = db_session.execute(models.Graph.__table__.delete().where(models.Graph.user_id == user_id).where(models.Graph.graph_id.in_(batch)))
+				graphs_deleted += result.rowcount
 
-		# Delete from node
-		node = db_session.query(models.Node).filter(models.Node.user_id == username).filter(models.Node.graph_id == graphname).all()
+				# Remove the graphs from the search index
+				for graph_id in batch:
+					search_index.unindex_graph(db_session, user_id, graph_id)
 
-		for n in node:
-			db_session.delete(n)
-			db_session.commit()
-		# Delete from layout
-		layout = db_session.query(models.Layout).filter(models.Layout.graph_id == graphname).filter(models.Layout.user_id == username).all()
+				if progress != None:
+					progress(graphs_deleted)
 
-		for l in layout:
-			db_session.delete(l)
-			db_session.commit()
 		db_session.commit()
+	except Exception:
+		db_session.rollback()
+		raise
+	finally:
 		db_session.close()
 
-	except Exception as ex:
-		print ex
-		db_session.close()
-		return	
+	# Drop the cached drawings of the graphs
+	for user_id in graphs_by_owner:
+		for graph_id in graphs_by_owner[user_id]:
+			graph_cache.discard_graph(user_id, graph_id)
+
+	elapsed = time.time() - start_time
+	print "Deleted %d graphs in %.3f seconds" % (graphs_deleted, elapsed)
+
+	return graphs_deleted
 
 def get_all_graphs_for_user(username):
 	'''
@@ -2404,27 +3378,21 @@ def can_see_shared_graph(logged_in_user, graph_owner, graphname):
 		:return boolean: True if can see it, false otherwise
 	'''
 
-	# Get all groups that this graph is shared with
-	groups = get_all_groups_for_this_graph(graph_owner, graphname)
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	# The user is a member of the group
+	is_member = exists().where(and_(models.GroupToUser.group_id == models.GroupToGraph.group_id, models.GroupToUser.group_owner == models.GroupToGraph.group_owner, models.GroupToUser.user_id == logged_in_user))
 
-	# If there are any groups that share this graph
-	# check to see if the logged in user is a member in that group.
-	# If they are, then they are allowed to see the graph
-	if len(groups) > 0:
-		for group in groups:
-			
-			# If logged in user owns a group that the graph is shared with
-			if logged_in_user == group.owner_id:
-				return True
+	# If there are any groups that share this graph which the logged in user owns
+	# or is a member of, then they are allowed to see the graph.
+	# Both checks are answered from the group_to_graph and group_to_user indexes
+	shared_group = db_session.query(models.GroupToGraph.group_id).filter(models.GroupToGraph.graph_id == graphname).filter(models.GroupToGraph.user_id == graph_owner).filter(or_(models.GroupToGraph.group_owner == logged_in_user, is_member)).first()
 
-			# Get all members of the group
-			members = get_group_members(group.owner_id, group.group_id)
+	db_session.close()
 
-			# If the user is a member of a group that graph is shared with,
-			# the user may view this graph
-			for member in members:
-				if logged_in_user == member.user_id:
-					return True
+	if shared_group != None:
+		return True
 
 	return None
 
@@ -2662,88 +3630,19 @@ def find_all_graphs_containing_edges_in_group(uid, search_type, search_word, db_
 		@param groupOwner: Owner of group
 		@param groupId: ID of group
 	'''
-	# List to keep track of all graphs that contain edges that match the search_word
-	initial_graphs_matching_edges = []
-
-	# Separate the edge into its two node ID's
-	# This is done because in the database, an edge ID is comprised of target:source nodes
-	node_ids = search_word.split(":")
-
-	# Get head and tail node references
-	head_node = node_ids[0]
-	tail_node = node_ids[1]
-
-	# List of all head node ids
-	head_nodes = []
-
-	# List of all tail node ids
-	tail_nodes = []
-
-	# Match all edges that contain the edges that exactly match the search_word
-	if search_type == "full_search":
-
-		# Get all (head) nodes that contain a label matching search_word
-		head_nodes += db_session.query(models.Node.node_id).filter(models.Node.label == head_node).all()
-		
-		# Get all (tail) nodes that contain a label matching search_word
-		tail_nodes += db_session.query(models.Node.node_id).filter(models.Node.label == tail_node).all()
-
-		# Get all (head) nodes that contain a node id matching search_word 
-		head_nodes += db_session.query(models.Node.node_id).filter(models.Node.node_id == head_node).all()
-
-		# Get all (tail) nodes that contain a node id matched search_word 
-		tail_nodes += db_session.query(models.Node.node_id).filter(models.Node.node_id == tail_node).all()
-		
-	elif search_type == "partial_search":
-
-		# Get all (head) nodes that contain a partially matching label
-		head_nodes += db_session.query(models.Node.node_id).filter(models.Node.label.like("%" + head_node + "%")).all()
-		
-		# Get all (tail) nodes that contain a label partially matching label
-		tail_nodes += db_session.query(models.Node.node_id).filter(models.Node.label.like("%" + tail_node + "%")).all()
-
-		# Get all (head) nodes that contain a node id partially matching search_word 
-		head_nodes += db_session.query(models.Node.node_id).filter(models.Node.node_id.like("%" + head_node + "%")).all()
-		
-		# Get all (head) nodes that contain a node id partially matching search_word 
-		tail_nodes += db_session.query(models.Node.node_id).filter(models.Node.node_id.like("%" + tail_node + "%")).all()
-
-	# Remove all the duplicates
-	head_nodes = list(set(head_nodes))
-	tail_nodes = list(set(tail_nodes))
-
-	# Go through head and tail nodes to see if there are any graphs
-	# that match the given view type (my graphs, shared, public).
-	# In other words, return all graphs that having matching edges
-	# for the given view type.
-
-	# TODO: ASK MURALI ABOUT BIDIRECTION EDGES
+	# All edges matching the search_word, limited to graphs shared with this group
+	edge_query = matching_edges_query(search_type, search_word, db_session).filter(models.Edge.graph_id == models.GroupToGraph.graph_id).filter(models.Edge.user_id == uid).filter(models.GroupToGraph.user_id == models.Edge.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner)
 
-	# If there are both head and tail nodes
-	if len(head_nodes) > 0 and len(tail_nodes) > 0:
-		# Go through all permutations of these nodes
-		# compile graphs that match the given view_type (my graphs, shared, public)
-		for i in xrange(len(head_nodes)):
-			for j in xrange(len(tail_nodes)):
-				h_node =  head_nodes[i][0]
-				t_node =  tail_nodes[j][0]
-				
-				# We make two queries because we want to have tail:head and head:tail search (to resolve undirected edges searching)
-				initial_graphs_matching_edges += db_session.query(models.Edge).filter(models.Edge.head_node_id == h_node).filter(models.Edge.tail_node_id == t_node).filter(models.Edge.graph_id == models.GroupToGraph.graph_id).filter(models.Edge.user_id == uid).filter(models.GroupToGraph.user_id == models.Edge.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).all()
-				initial_graphs_matching_edges += db_session.query(models.Edge).filter(models.Edge.head_node_id == t_node).filter(models.Edge.tail_node_id == h_node).filter(models.Edge.graph_id == models.GroupToGraph.graph_id).filter(models.Edge.user_id == uid).filter(models.GroupToGraph.user_id == models.Edge.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).all()
-
-		graph_dict = dict()
-		# Remove duplicates for all graphs that match have the same edge matching search term
-		for graph in initial_graphs_matching_edges:
-			key = graph.head_node_id + graph.graph_id + graph.user_id + graph.tail_node_id + graph.edge_id
-			if key in graph_dict:
-				continue
-			else:
-				graph_dict[key] = graph
+	graph_dict = dict()
+	# Remove duplicates for all graphs that match have the same edge matching search term
+	for graph in edge_query.all():
+		key = graph.head_node_id + graph.graph_id + graph.user_id + graph.tail_node_id + graph.edge_id
+		if key in graph_dict:
+			continue
+		else:
+			graph_dict[key] = graph
 
-		return graph_dict.values()
-	else:
-		return []
+	return graph_dict.values()
 
 
 def find_all_graphs_containing_nodes_in_group(uid, search_type, search_word, db_session, groupId, groupOwner):
@@ -2762,12 +3661,15 @@ def find_all_graphs_containing_nodes_in_group(uid, search_type, search_word, db_
 
 	# If we only want partially matched nodes
 	if search_type == 'partial_search':
+		# Partial matches are answered by the search index
+		nodes = search_index.node_table()
+
 
 		# Get all nodes that have a partially matching label
-		node_data = db_session.query(models.Node).filter(models.Node.label.like("%" + search_word + "%")).filter(models.Node.graph_id == models.GroupToGraph.graph_id).filter(models.GroupToGraph.user_id == models.Node.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).all()
+		node_data = db_session.query(nodes.c.graph_id, nodes.c.node_id, nodes.c.label, nodes.c.modified, nodes.c.user_id).filter(nodes.c.label.like("%" + search_word + "%")).filter(nodes.c.graph_id == models.GroupToGraph.graph_id).filter(models.GroupToGraph.user_id == nodes.c.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).all()
 
 		# Get all nodes that have a partially matching node id
-		node_data += db_session.query(models.Node).filter(models.Node.node_id.like("%" + search_word + "%")).filter(models.Node.graph_id == models.GroupToGraph.graph_id).filter(models.GroupToGraph.user_id == models.Node.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).all()
+		node_data += db_session.query(nodes.c.graph_id, nodes.c.node_id, nodes.c.label, nodes.c.modified, nodes.c.user_id).filter(nodes.c.node_id.like("%" + search_word + "%")).filter(nodes.c.graph_id == models.GroupToGraph.graph_id).filter(models.GroupToGraph.user_id == nodes.c.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).all()
 	else:
 		# Get all nodes that have an exact matching label
 		node_data = db_session.query(models.Node).filter(models.Node.label == search_word).filter(models.Node.graph_id == models.GroupToGraph.graph_id).filter(models.GroupToGraph.user_id == models.Node.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).all()
@@ -2804,7 +3706,7 @@ def find_all_graphs_containing_search_word_in_group(uid, search_type, search_wor
 	if search_type == 'partial_search':
 		try:
 			#Get all graphs that have ID that partially match search term
-			matched_graphs = db_session.query(models.Graph).filter(models.Graph.graph_id.like("%" + search_word + "%")).filter(models.GroupToGraph.graph_id == models.Graph.graph_id).filter(models.GroupToGraph.user_id == models.Graph.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).all()
+			matched_graphs = db_session.query(models.Graph).filter(models.Graph.graph_id.in_(search_index.graph_ids_like(db_session, "%" + search_word + "%").subquery())).filter(models.GroupToGraph.graph_id == models.Graph.graph_id).filter(models.GroupToGraph.user_id == models.Graph.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).all()
 
 		except NoResultFound:
 			print "No shared graphs matching search term"
@@ -2838,55 +3740,28 @@ def tag_result_for_graphs_in_group(groupOwner, groupId, tag_terms, db_session):
 		@param groupId: ID of group
 		@param tag_terms: Tag terms to search for
 		@param db_session: Database connection
+		@return Graphs: [(graph_id, modified, user_id, public)]
 	'''
-	intial_graphs_with_tags = []
-
 	if len(tag_terms) > 0:
-		for tag in tag_terms:
-			try:
-				# Find graphs that have tag being searched for
-				intial_graphs_with_tags += db_session.query(models.Graph).filter(models.Graph.graph_id == models.GraphToTag.graph_id).filter(models.Graph.user_id == models.GraphToTag.user_id).filter(models.GraphToTag.tag_id == tag).filter(models.GroupToGraph.graph_id == models.Graph.graph_id).filter(models.GroupToGraph.user_id == models.Graph.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).all()
-
-			except NoResultFound:
-				print "No shared graphs with tag"
-
-		# Go through and count the list of occurrences of matched graph
-		graph_repititions = defaultdict(int)
-
-		# Counting the number of occurences
-		for graph in intial_graphs_with_tags:
-			graph_repititions[graph] += 1
-
-		# Go through and aggregate all graph together
-		graph_mappings = defaultdict(list)
-
-		# If the number of times a graph appears matches the number of search terms
-		# it is a graph we want (simulating the and operator for all search terms)
-		for graph in intial_graphs_with_tags:
+		tag_terms = list(set(tag_terms))
 
-			graph_tuple = (graph.graph_id, get_all_tags_for_graph(graph.graph_id, graph.user_id), graph.modified, graph.user_id, graph.public)
-
-			# Graph matches all search terms
-			if graph_repititions[graph] == len(tag_terms):
-
-				# If we haven't seen this graph yet 
-				if graph not in graph_mappings:
-					graph_mappings[graph] = graph_tuple
-				
-		# Go through all the graphs and insert tags for the graphs that match all search terms
-		return graph_mappings.values()
+		# A graph matches if it has as many of the tags as were asked for (simulating the and operator)
+		return db_session.query(models.Graph.graph_id, models.Graph.modified, models.Graph.user_id, models.Graph.public).filter(models.Graph.graph_id == models.GraphToTag.graph_id).filter(models.Graph.user_id == models.GraphToTag.user_id).filter(models.GraphToTag.tag_id.in_(tag_terms)).filter(models.GroupToGraph.graph_id == models.Graph.graph_id).filter(models.GroupToGraph.user_id == models.Graph.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).group_by(models.Graph.graph_id, models.Graph.user_id, models.Graph.modified, models.Graph.public).having(func.count(distinct(models.GraphToTag.tag_id)) == len(tag_terms)).all()
 	else:
 		return []
 
-def get_all_graphs_for_group(uid, groupOwner, groupId, request):
+def get_all_graphs_for_group(uid, groupOwner, groupId, request, cursor=None, direction='next', page_size=25):
 	'''
-		Get all graphs that belong to this group.
+		Get one page of the graphs that belong to this group.
 
 		:param groupOwner: Owner of group
 		:param groupId: Id of group
 		:param search_terms: Terms to be searched for
 		:param tag_terms: Tags to be searched for in graphs
-		:return Graphs: [graphs]
+		:param cursor: Key of the graph the page starts after (None for the first page)
+		:param direction: next or previous (page before the cursor)
+		:param page_size: Number of graphs on a page
+		:return Page: see keyset_page
 	'''
 
 	# Get connection to databse
@@ -2961,20 +3836,23 @@ def get_all_graphs_for_group(uid, groupOwner, groupId, request):
 	elif tag_terms:
 		graph_data = tag_result_for_graphs_in_group(groupOwner, groupId, cleaned_tags, db_session)
 	else:
-		try:
-			graph_data = db_session.query(models.GroupToGraph.graph_id, models.GroupToGraph.modified, models.GroupToGraph.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).all()
+		# Plain listing of the group, ordered and paginated in SQL
+		query = db_session.query(models.GroupToGraph.graph_id, models.GroupToGraph.modified, models.GroupToGraph.user_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner)
 
-		except NoResultFound:
-			print 'no result found'
+		page = keyset_page_query(query, order_by, cursor, direction, page_size)
+
+		db_session.close()
+		return page
 
-	# If user wants to sort the data
-	if order_by:
-		graph_data = order_information(order_by, search_terms, graph_data)
+	# Search and tag results are already in memory, order and paginate them there
+	if search_terms:
+		column_positions = SEARCH_RESULT_COLUMNS
 	else:
-		graph_data = order_information("modified_descending", search_terms, graph_data)
+		# Tuples of tag_result_for_graphs_in_group
+		column_positions = {'graph_id': 0, 'modified': 1, 'user_id': 2}
 
 	db_session.close()
-	return graph_data
+	return keyset_page_list(graph_data, column_positions, order_by, cursor, direction, page_size)
 
 def get_all_groups_for_user_with_sharing_info(graphowner, graphname):
 	'''
@@ -3204,6 +4082,29 @@ def unshare_graph_with_group(owner, graph, groupId, groupOwner):
 
 # ---------------- END REST API ------------------------------
 
+def graphs_of_type_query(view_type, username, db_session):
+	'''
+		Builds a query of the graphs of this type e.g. shared, my graphs, public.
+
+		:param view_type: Type of view (shared, public)
+		:param username: Name of user
+		:param db_session: Database session
+		:return Query: Query of (graph_id, modified, user_id)
+	'''
+	# Select graphs depending on view_type
+	if view_type == "public":
+		# Get all public graphs
+		return db_session.query(models.Graph.graph_id, models.Graph.modified, models.Graph.user_id).distinct(models.Graph.graph_id).filter(models.Graph.public == 1)
+
+	elif view_type == "shared":
+		# Same definition of shared as searches use (groups the user is a member of or owns)
+		query = db_session.query(models.Graph.graph_id, models.Graph.modified, models.Graph.user_id)
+		return filter_by_view_type(query, models.Graph.graph_id, models.Graph.user_id, username, "shared")
+
+	else:
+		# Get all my graphs
+		return db_session.query(models.Graph.graph_id, models.Graph.modified, models.Graph.user_id).filter(models.Graph.user_id == username)
+
 def view_graphs_of_type(view_type, username):
 	'''
 		View graphs of this type e.g. shared, my graphs, public.
@@ -3216,32 +4117,28 @@ def view_graphs_of_type(view_type, username):
 	# Create database connection
 	db_session = data_connection.new_session()
 
-	graphs = []
+	graphs = graphs_of_type_query(view_type, username, db_session).all()
 
-	# Select graphs depending on view_type
-	if view_type == "public":
-		# Get all public graphs
-		try:
-			graphs = db_session.query(models.Graph.graph_id, models.Graph.modified, models.Graph.user_id).distinct(models.Graph.graph_id).filter(models.Graph.public == 1).all()
-		except NoResultFound:
-			print "No public graphs"
+	db_session.close()
+	return graphs
 
-	elif view_type == "shared":
-		try:
-			graphs = db_session.query(models.GroupToGraph.graph_id, models.GroupToGraph.modified, models.GroupToGraph.user_id).distinct(models.GroupToGraph.graph_id, models.GroupToGraph.user_id, models.GroupToGraph.modified).filter(models.GroupToGraph.group_id == models.GroupToUser.group_id).filter(models.GroupToGraph.group_owner == models.GroupToUser.group_owner).filter(models.GroupToUser.user_id == username).all()
-		except NoResultFound:
-			print "No shared graphs"
-	else:
-		try:
-			# Get all my graphs
-			graphs = db_session.query(models.Graph.graph_id, models.Graph.modified, models.Graph.user_id).filter(models.Graph.user_id == username).all()
-		except NoResultFound:
-			print "No owned graphs"
+def count_graphs_of_type(view_type, username):
+	'''
+		Counts the graphs of this type e.g. shared, my graphs, public
+		without loading them.
 
-	return graphs
+		:param view_type: Type of view (shared, public)
+		:param username: Name of user
+		:return Count: Number of graphs
+	'''
+
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	count = graphs_of_type_query(view_type, username, db_session).count()
 
 	db_session.close()
-	return cleaned_graphs
+	return count
 
 def is_public_graph(username, graph):
 	'''
@@ -3322,6 +4219,152 @@ def change_graph_visibility(isPublic, user_id, graphName):
 
 	db_session.close()
 
+def find_existing_graphs(user_id, graph_ids):
+	'''
+		Which of many graphs of a user exist, read with one query per GRAPH_BATCH_SIZE graphs.
+
+		:param user_id: Owner of the graphs
+		:param graph_ids: IDs of graphs
+		:return Set of the IDs of the graphs that exist
+	'''
+	graph_ids = list(set(graph_ids))
+
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	existing = set()
+	for start in xrange(0, len(graph_ids), GRAPH_BATCH_SIZE):
+		batch = graph_ids[start:start + GRAPH_BATCH_SIZE]
+		existing.update([graph.graph_id for graph in db_session.query(models.Graph.graph_id).filter(models.Graph.user_id == user_id).filter(models.Graph.graph_id.in_(batch)).all()])
+
+	db_session.close()
+	return existing
+
+def get_graphs_json(user_id, graph_ids):
+	'''
+		JSON of many graphs of a user.  Graph rows are read with one query per
+		GRAPH_BATCH_SIZE graphs, and the JSON they refer to with one more.
+
+		:param user_id: Owner of the graphs
+		:param graph_ids: IDs of graphs
+		:return Dictionary: graph id -> JSON text, for the graphs that exist
+	'''
+	graph_ids = list(set(graph_ids))
+
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	graphs_json = {}
+	for start in xrange(0, len(graph_ids), GRAPH_BATCH_SIZE):
+		batch = graph_ids[start:start + GRAPH_BATCH_SIZE]
+		graphs = db_session.query(models.Graph.graph_id, models.Graph.json).filter(models.Graph.user_id == user_id).filter(models.Graph.graph_id.in_(batch)).all()
+
+		# JSON kept in the graph_blob table, read for all graphs of the batch at once (graphs with identical JSON share a row)
+		hashes = set()
+		for graph in graphs:
+			json_hash = json_storage.referenced_hash(graph.json)
+			if json_hash != None:
+				hashes.add(json_hash)
+
+		blobs = {}
+		if len(hashes) > 0:
+			for blob in db_session.query(models.GraphBlob.content_hash, models.GraphBlob.json).filter(models.GraphBlob.content_hash.in_(list(hashes))).all():
+				blobs[blob.content_hash] = json_storage.decode(blob.json)
+
+		for graph in graphs:
+			json_hash = json_storage.referenced_hash(graph.json)
+			if json_hash != None:
+				graphs_json[graph.graph_id] = blobs[json_hash]
+			else:
+				graphs_json[graph.graph_id] = json_storage.decode(graph.json)
+
+	db_session.close()
+	return graphs_json
+
+def change_graphs_visibility(isPublic, user_id, graph_ids):
+	'''
+		Makes many graphs of a user, and their layouts that are shared with groups,
+		public or private (see change_graph_visibility).  One UPDATE per table for
+		every GRAPH_BATCH_SIZE graphs, all in a single transaction.
+
+		:param isPublic: 1 to make the graphs public, 0 to make them private
+		:param user_id: Owner of the graphs
+		:param graph_ids: IDs of graphs
+		:return Set of the IDs of the graphs that were changed (the ones that exist)
+	'''
+	existing = find_existing_graphs(user_id, graph_ids)
+	changed = list(existing)
+
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	try:
+		for start in xrange(0, len(changed), GRAPH_BATCH_SIZE):
+			batch = changed[start:start + GRAPH_BATCH_SIZE]
+			db_session.query(models.Graph).filter(models.Graph.user_id == user_id).filter(models.Graph.graph_id.in_(batch)).update({'public': isPublic}, synchronize_session=False)
+			db_session.query(models.Layout).filter(models.Layout.user_id == user_id).filter(models.Layout.graph_id.in_(batch)).filter(models.Layout.shared_with_groups == 1).update({'public': isPublic}, synchronize_session=False)
+		db_session.commit()
+	except Exception:
+		db_session.rollback()
+		raise
+	finally:
+		db_session.close()
+
+	return existing
+
+def share_graphs_with_group(user_id, graph_ids, groupId, groupOwner):
+	'''
+		Shares many graphs of a user with a group (see share_graph_with_group).
+		The group and the membership of the user are checked once, and graphs
+		that are not shared yet are added with one bulk insert.
+
+		:param user_id: Owner of the graphs
+		:param graph_ids: IDs of graphs
+		:param groupId: Group ID
+		:param groupOwner: Group Owner
+		:return (Error or None, set of the IDs of the graphs that are shared with the group)
+	'''
+	# Check to see if the group exists
+	if get_group(groupOwner, groupId) == None:
+		return ("Group does not exist", set())
+
+	graph_ids = list(set(graph_ids))
+
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	try:
+		# Is a user a member or the owner of the group trying to share graphs with
+		group_member = db_session.query(models.GroupToUser).filter(models.GroupToUser.user_id == user_id).filter(models.GroupToUser.group_id == groupId).filter(models.GroupToUser.group_owner == groupOwner).first()
+
+		if group_member == None and groupOwner != user_id:
+			return ("You must be the owner or a member of group " + groupId + " to share graphs with it", set())
+
+		shared = set()
+		new_shares = []
+
+		for start in xrange(0, len(graph_ids), GRAPH_BATCH_SIZE):
+			batch = graph_ids[start:start + GRAPH_BATCH_SIZE]
+
+			# Graphs that exist, and those that are already shared
+			graphs = db_session.query(models.Graph.graph_id, models.Graph.modified).filter(models.Graph.user_id == user_id).filter(models.Graph.graph_id.in_(batch)).all()
+			already_shared = set([share.graph_id for share in db_session.query(models.GroupToGraph.graph_id).filter(models.GroupToGraph.group_id == groupId).filter(models.GroupToGraph.group_owner == groupOwner).filter(models.GroupToGraph.user_id == user_id).filter(models.GroupToGraph.graph_id.in_(batch)).all()])
+
+			for graph in graphs:
+				shared.add(graph.graph_id)
+				if graph.graph_id not in already_shared:
+					new_shares.append({'group_id': groupId, 'group_owner': groupOwner, 'user_id': user_id, 'graph_id': graph.graph_id, 'modified': graph.modified})
+
+		bulk_insert(db_session, models.GroupToGraph.__table__, new_shares)
+		db_session.commit()
+	except Exception:
+		db_session.rollback()
+		raise
+	finally:
+		db_session.close()
+
+	return (None, shared)
+
 
 # Changes the name of a layout
 def changeLayoutName(uid, gid, old_layout_name, new_layout_name, loggedIn):
@@ -3800,6 +4843,106 @@ def get_all_tags_for_graph(graphname, username):
 		db_session.close()
 		return None
 
+def get_tags_for_graphs(graphs):
+	'''
+		Returns the tags of many graphs at once (one query per
+		TAG_LOOKUP_BATCH_SIZE graphs instead of one per graph).
+
+		:param graphs: [(graph_id, user_id)]
+		:return Tags: {(graph_id, user_id): [tags of graph]}
+	'''
+	graph_keys = set(graphs)
+
+	# Every graph gets an entry, even if it has no tags
+	tags_by_graph = dict((key, []) for key in graph_keys)
+
+	if len(graph_keys) == 0:
+		return tags_by_graph
+
+	# Get database connection
+	db_session = data_connection.new_session()
+
+	graph_keys = list(graph_keys)
+
+	for start in xrange(0, len(graph_keys), TAG_LOOKUP_BATCH_SIZE):
+		batch = graph_keys[start:start + TAG_LOOKUP_BATCH_SIZE]
+
+		graph_ids = set([key[0] for key in batch])
+		user_ids = set([key[1] for key in batch])
+
+		# Narrow down by graph and owner, the exact pairs are matched below
+		tag_rows = db_session.query(models.GraphToTag.graph_id, models.GraphToTag.user_id, models.GraphToTag.tag_id).distinct().filter(models.GraphToTag.graph_id.in_(graph_ids)).filter(models.GraphToTag.user_id.in_(user_ids)).order_by(models.GraphToTag.tag_id).all()
+
+		for tag_row in tag_rows:
+			key = (tag_row.graph_id, tag_row.user_id)
+			if key in tags_by_graph:
+				# Get string from unicode so that I can parse it easier
+				tags_by_graph[key].append(str(tag_row.tag_id))
+
+	db_session.close()
+	return tags_by_graph
+
+def most_used_tags(graphs_query, limit=10):
+	'''
+		Returns the most used tags of the RECENT_GRAPHS_FOR_TAGS most recently
+		modified graphs of a listing, counted in a single query.
+
+		:param graphs_query: Query selecting (at least) graph_id, modified and user_id columns
+		:param limit: Number of tags to return
+		:return Tags: [tags], most used first
+	'''
+	# Map column names of the query to their SQL expressions
+	expressions = dict((column['name'], column['expr']) for column in graphs_query.column_descriptions)
+
+	recent_graphs = graphs_query.order_by(expressions['modified'].desc()).limit(RECENT_GRAPHS_FOR_TAGS).subquery()
+
+	tag_count = func.count(models.GraphToTag.tag_id)
+
+	tag_rows = graphs_query.session.query(models.GraphToTag.tag_id, tag_count).filter(models.GraphToTag.graph_id == recent_graphs.c.graph_id).filter(models.GraphToTag.user_id == recent_graphs.c.user_id).filter(models.GraphToTag.tag_id != '').group_by(models.GraphToTag.tag_id).order_by(tag_count.desc(), models.GraphToTag.tag_id).limit(limit).all()
+
+	return [str(tag_row[0]) for tag_row in tag_rows]
+
+def most_used_tags_for_view_type(uid, tag_terms, view_type, limit=10):
+	'''
+		Most used tags of the recently modified graphs of a view type
+		(the tag cloud of the graphs page).
+
+		:param uid: Logged in user
+		:param tag_terms: Only count graphs with these tags
+		:param view_type: Type of view (my graphs, shared, public)
+		:param limit: Number of tags to return
+		:return Tags: [tags], most used first
+	'''
+	# Create database connection
+	db_session = data_connection.new_session()
+
+	if tag_terms and len(tag_terms) > 0:
+		query = graphs_with_tags_query(uid, tag_terms, view_type, db_session)
+	else:
+		query = graphs_of_type_query(view_type, uid, db_session)
+
+	tags = most_used_tags(query, limit)
+
+	db_session.close()
+	return tags
+
+def count_tags(tags_by_graph, limit=10):
+	'''
+		Most used tags of graphs whose tags are already known.
+
+		:param tags_by_graph: {(graph_id, user_id): [tags of graph]} (see get_tags_for_graphs)
+		:param limit: Number of tags to return
+		:return Tags: [tags], most used first
+	'''
+	tag_counts = defaultdict(int)
+
+	for graph_tags in tags_by_graph.values():
+		for tag in graph_tags:
+			if len(tag) > 0:
+				tag_counts[tag] += 1
+
+	return [tag for tag, count in sorted(tag_counts.items(), key=lambda item: (-item[1], item[0]))[:limit]]
+
 def change_graph_visibility_for_tag(isPublic, tagname, username):
 	'''
 		Makes all graphs under a tag owned by username public.
@@ -3845,12 +4988,13 @@ def change_graph_visibility_for_tag(isPublic, tagname, username):
 		db_session.close()
 		return None
 
-def delete_all_graphs_for_tag(tagname, username):
+def delete_all_graphs_for_tag(tagname, username, progress=None):
 	'''
 		Deletes all graphs under a tag owned by username.
 
 		:param tagname: Name of tag to search for
 		:param username: Email of user in GraphSpace
+		:param progress: Called with the number of graphs deleted so far (optional, see delete_graphs)
 		:return <Message>
 	'''
 	# Create connection to database
@@ -3858,21 +5002,11 @@ def delete_all_graphs_for_tag(tagname, username):
 
 	try:
 		# Get all the graphs that the user owns which match the tag
-		graph_list = db_session.query(models.Graph).filter(models.GraphToTag.tag_id == tagname).filter(models.GraphToTag.user_id == username).filter(models.Graph.graph_id == models.GraphToTag.graph_id).filter(models.Graph.user_id == models.GraphToTag.user_id).all()
-
-		# Delete all these graphs from the graphs table
-		for graph in graph_list:
-			db_session.delete(graph)
-
-		# Get all the rows in graph_to_tag that the user owns
-		delete_tags = db_session.query(models.GraphToTag).filter(models.GraphToTag.tag_id == tagname).filter(models.GraphToTag.user_id == username).all()
-
-		# Delete all those rows from graph_to_tag database
-		for tag_to_delete in delete_tags:
-			db_session.delete(tag_to_delete)
-
-		db_session.commit()
+		graph_list = db_session.query(models.GraphToTag.user_id, models.GraphToTag.graph_id).filter(models.GraphToTag.tag_id == tagname).filter(models.GraphToTag.user_id == username).all()
 		db_session.close()
+
+		# Delete the graphs with all of their nodes, edges, tags, shares and layouts
+		delete_graphs([(graph.user_id, graph.graph_id) for graph in graph_list], progress)
 		return "Done"
 	except Exception as ex:
 		print ex
@@ -3896,7 +5030,7 @@ def getGraphInfo(uid, gid):
 		# Retrieves json, public (visibility), and graph id of graph
 		data = db_session.query(models.Graph.json, models.Graph.public, models.Graph.graph_id).filter(models.Graph.graph_id == gid).filter(models.Graph.user_id == uid).one()
 		data = list(data)
-		data[0] = verify_json(data[0])
+		data[0] = verify_json(load_graph_json(db_session, data[0]))
 
 		db_session.close()
 		return data
@@ -3920,8 +5054,9 @@ def retrieveJSON(uid, gid):
 	try:
 		# Returns json if it exists, otherwise nothing
 		data =  db_session.query(models.Graph.json).filter(models.Graph.user_id == uid).filter(models.Graph.graph_id == gid).one()
+		graph_json = load_graph_json(db_session, data[0])
 		db_session.close()
-		return data
+		return (graph_json, )
 	except Exception as ex:
 		print "No JSON found for " + gid
 		print "Error " + ex
@@ -1,6 +1,6 @@
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import NullPool, QueuePool, StaticPool
 import sqlalchemy
 import graphs.models as models
 from django.conf import settings
@@ -8,6 +8,11 @@ from django.conf import settings
 # database locations
 _originaldb = settings.DATABASE_LOCATION
 
+# connection pool sizing
+_pool_size = getattr(settings, 'DATABASE_POOL_SIZE', 10)
+_pool_max_overflow = getattr(settings, 'DATABASE_POOL_MAX_OVERFLOW', 20)
+_pool_recycle = getattr(settings, 'DATABASE_POOL_RECYCLE', 3600)
+
 class Database(object):
     '''
         Create a database object to query from.
@@ -17,12 +22,13 @@ class Database(object):
         self.connection = None
 
         if self.db == 'prod':
-            self.engine = create_engine(_originaldb, echo=False)
+            self.engine = self._create_pooled_engine(_originaldb)
         else:
-            self.engine = create_engine('sqlite:///:memory:', echo=False)
+            # An in-memory database only exists inside a single connection, so share it
+            self.engine = create_engine('sqlite:///:memory:', echo=False, poolclass=StaticPool, connect_args={'check_same_thread': False})
 
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+        # Thread-local session registry, every thread (request) gets its own session
+        self.Session = scoped_session(sessionmaker(bind=self.engine))
 
         if self.db == 'prod':
             self.meta = sqlalchemy.schema.MetaData()
@@ -30,15 +36,42 @@ class Database(object):
         else:
             self.meta = None
 
+    def _create_pooled_engine(self, location):
+        '''
+            Create an engine that keeps a pool of open connections so that
+            a request reuses connections instead of opening one per query.
+        '''
+        connect_args = {}
+
+        # Pooled SQLite connections are handed between request threads
+        if location.startswith('sqlite'):
+            connect_args['check_same_thread'] = False
+
+        return create_engine(location, echo=False, poolclass=QueuePool, pool_size=_pool_size, max_overflow=_pool_max_overflow, pool_recycle=_pool_recycle, connect_args=connect_args)
+
+    @property
+    def session(self):
+        '''
+            Session belonging to the current thread.
+        '''
+        return self.Session()
+
     def new_session(self):
         '''
-            Create a new session in this database. This is needed to avoid 1 seesion per thread
-            error raised if you don't create a new session for every new page load or query request.
+            Return the session of the current thread (request), reset to a clean state.
+            Sessions are never shared between threads, so concurrent requests can no
+            longer close each other's sessions. The underlying connection is returned
+            to the pool and reused by the next query of the request.
+        '''
+        session = self.Session()
+        session.close()
+        return session
+
+    def remove_session(self):
+        '''
+            Close and discard the session of the current thread. Called at the end of every request.
         '''
-        self.session.close()
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
-        return self.session
+        self.Session.remove()
     
     def connect(self):
         '''
@@ -52,4 +85,4 @@ class Database(object):
             Close the connection to the database engine.
         '''
         if self.connection is not None:
-            self.connection.close()
\ No newline at end of file
+            self.connection.close()
@@ -3,10 +3,14 @@
 '''
 
 from graphs.util.db_conn import Database
+from graphs.util.search_index import create_search_index
 
 #connect to database
 db = Database('prod')
 
+#create (or reuse) the full-text index used by node and graph name searches
+create_search_index(db.engine)
+
 #get tables from database
 graph = db.meta.tables['graph']
 node = db.meta.tables['node']
@@ -0,0 +1,114 @@
+'''
+    In-process cache of graphs that are ready to be drawn.
+
+    Entries are keyed on the hash of the JSON of a graph ('graph_blob', hash),
+    so graphs with identical JSON share an entry, or on (user_id, graph_id,
+    modified) for graphs whose JSON is kept in the graph row.  Either way an
+    updated graph gets a new key and is never served stale.  The cache is bounded by the
+    number of bytes its entries take up instead of the number of entries,
+    since graphs range from a few nodes to many megabytes of JSON.  When
+    the bound is reached, the least recently used entries are evicted.
+'''
+
+import sys
+import threading
+
+from collections import OrderedDict
+
+from django.conf import settings
+
+# Default bound of the graph cache (bytes)
+GRAPH_CACHE_MAX_BYTES = getattr(settings, 'GRAPH_CACHE_MAX_BYTES', 64 * 1024 * 1024)
+
+# Default bound of the cache of compressed responses (bytes)
+RESPONSE_CACHE_MAX_BYTES = getattr(settings, 'RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)
+
+class ByteLRUCache(object):
+    '''
+        Least recently used cache bounded by the total size of its values.
+        Safe to share between request threads.
+    '''
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        # key -> (value, size), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        '''
+            Value stored under key, or None.  Marks the entry as recently used.
+        '''
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry == None:
+                self.misses += 1
+                return None
+
+            # Re-inserting moves the entry to the most recently used end
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, size):
+        '''
+            Store value under key.  Values larger than the whole cache are not stored.
+
+            :param size: Size of the value in bytes
+        '''
+        with self._lock:
+            self._remove(key)
+
+            if size > self.max_bytes:
+                return
+
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+
+            # Evict least recently used entries until the cache fits again
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def discard(self, match):
+        '''
+            Remove every entry whose key match(key) is true for.
+        '''
+        with self._lock:
+            for key in [key for key in self._entries if match(key)]:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry != None:
+            self.current_bytes -= entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+# Graphs of this process, see graphs.util.db.get_graph_for_view
+graphs = ByteLRUCache(GRAPH_CACHE_MAX_BYTES)
+
+# Response bodies keyed on (ETag, content coding), see graphs.util.http_cache.
+# ETags change with every version of a graph, so entries never go stale
+responses = ByteLRUCache(RESPONSE_CACHE_MAX_BYTES)
+
+def size_of(entry):
+    '''
+        Approximate number of bytes an entry (dictionary of strings and flags) takes up.
+    '''
+    return sys.getsizeof(entry) + sum([sys.getsizeof(value) for value in entry.values()])
+
+def discard_graph(user_id, graph_id):
+    '''
+        Drop every cached version of a graph (when it is updated or deleted).
+    '''
+    graphs.discard(lambda key: key[0] == user_id and key[1] == graph_id)
@@ -0,0 +1,187 @@
+'''
+    Conditional and compressed responses for graph JSON.
+
+    Responses that carry the JSON of a graph get a strong ETag derived from
+    the version of the graph: the hash of its JSON when the JSON is kept in
+    the graph_blob table, or (user_id, graph_id, modified) otherwise (see
+    db.get_graph_version).  The version is read without reading the JSON,
+    so a client that already has the current version (If-None-Match) gets
+    a 304 Not Modified for the cost of one small query.
+
+    Bodies are compressed with gzip or deflate when the client accepts it.
+    Every representation (identity, gzip, deflate) has its own ETag, and
+    the bodies are cached per ETag in graph_cache.responses, so a graph is
+    read, rendered and compressed once per version.
+
+    Pages that also depend on the user viewing them (view_graph) get an
+    ETag derived from the rendered page instead (content_etag).
+'''
+
+import hashlib
+import zlib
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from django.utils.text import compress_string
+
+import graphs.util.graph_cache as graph_cache
+
+# Content codings we compress with, in order of preference
+ENCODINGS = ('gzip', 'deflate')
+
+def graph_etag(kind, uid, gid, version):
+    '''
+        ETag of a representation of a graph, without the content coding.
+
+        :param kind: Name of the representation (eg json or view_json)
+        :param uid: Owner of graph
+        :param gid: ID of graph
+        :param version: Version of the graph (see db.get_graph_version)
+        :return ETag: Unquoted ETag
+    '''
+    # Graphs with identical JSON share their representations
+    if version['json_hash'] != None:
+        return kind + '-' + version['json_hash']
+
+    key = u'\0'.join([uid, gid, unicode(version['modified'])])
+    return kind + '-' + hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def content_etag(kind, body):
+    '''
+        ETag of a response that is only known once it is rendered (eg a page that depends on the user).
+
+        :param kind: Name of the representation
+        :param body: Body of the response
+        :return ETag: Unquoted ETag
+    '''
+    if isinstance(body, unicode):
+        body = body.encode('utf-8')
+
+    return kind + '-' + hashlib.sha1(body).hexdigest()
+
+def accepted_encoding(request):
+    '''
+        Content coding to answer a request with.
+
+        :param request: HTTP Request
+        :return Encoding: gzip, deflate or None (identity)
+    '''
+    accepted = set()
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        parts = coding.split(';')
+        name = parts[0].strip().lower()
+
+        # Codings with q=0 are explicitly refused
+        refused = False
+        for parameter in parts[1:]:
+            parameter = parameter.strip().replace(' ', '')
+            if parameter.startswith('q='):
+                try:
+                    refused = float(parameter[2:]) == 0
+                except ValueError:
+                    pass
+
+        if not refused:
+            accepted.add(name)
+
+    for encoding in ENCODINGS:
+        if encoding in accepted:
+            return encoding
+
+    return None
+
+def representation_etag(etag, encoding):
+    '''
+        Quoted ETag of a representation in a content coding.
+    '''
+    if encoding != None:
+        etag = etag + '-' + encoding
+    return quote_etag(etag)
+
+def cached_response(request, etag):
+    '''
+        Response for a request that can be answered without building the body:
+        304 Not Modified if the client has the representation it asks for,
+        or the body cached for it by compressed_response.
+
+        :param request: HTTP Request
+        :param etag: ETag of the representation (see graph_etag)
+        :return Response: HttpResponse, or None if the body has to be built
+    '''
+    response = not_modified(request, etag)
+    if response != None:
+        return response
+
+    encoding = accepted_encoding(request)
+    entry = graph_cache.responses.get((etag, encoding))
+    if entry == None:
+        return None
+
+    return _response(entry[0], entry[1], representation_etag(etag, encoding), encoding)
+
+def not_modified(request, etag):
+    '''
+        304 Not Modified response if the client already has the representation
+        it asks for (its ETag is in If-None-Match).
+
+        :param request: HTTP Request
+        :param etag: ETag of the representation (see graph_etag)
+        :return Response: HttpResponse, or None if the client does not have it
+    '''
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match == None:
+        return None
+
+    quoted = representation_etag(etag, accepted_encoding(request))
+
+    client_etags = parse_etags(if_none_match)
+    if '*' not in client_etags and quoted not in [quote_etag(client_etag) for client_etag in client_etags]:
+        return None
+
+    response = HttpResponse(status=304)
+    _set_headers(response, quoted)
+    return response
+
+def compressed_response(request, etag, body, content_type, cache=True):
+    '''
+        Response with the body compressed in the coding the client accepts.
+
+        :param request: HTTP Request
+        :param etag: ETag of the representation (see graph_etag)
+        :param body: Uncompressed body
+        :param content_type: Content type of the body
+        :param cache: Keep the body for later requests (see cached_response)
+        :return Response: HttpResponse
+    '''
+    encoding = accepted_encoding(request)
+
+    if isinstance(body, unicode):
+        body = body.encode('utf-8')
+
+    if encoding == 'gzip':
+        body = compress_string(body)
+    elif encoding == 'deflate':
+        body = zlib.compress(body)
+
+    if cache:
+        graph_cache.responses.put((etag, encoding), (body, content_type), len(body))
+
+    return _response(body, content_type, representation_etag(etag, encoding), encoding)
+
+def _response(body, content_type, quoted_etag, encoding):
+    response = HttpResponse(body, content_type=content_type)
+    response['Content-Length'] = str(len(body))
+
+    if encoding != None:
+        response['Content-Encoding'] = encoding
+
+    _set_headers(response, quoted_etag)
+    return response
+
+def _set_headers(response, quoted_etag):
+    response['ETag'] = quoted_etag
+
+    # Browsers keep the response but check that it is still current on every load
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
@@ -0,0 +1,396 @@
+'''
+    Background jobs for graph operations that are too slow to run inside a
+    request (uploading or updating a big graph, deleting or changing the
+    visibility of every graph with a tag).
+
+    Views queue a job with enqueue and answer right away with its id.  Jobs
+    are kept in the job table, which worker processes poll for queued jobs
+    (python manage.py run_job_workers --workers=4).  A worker claims a job
+    by moving it from queued to running with a conditional UPDATE, so every
+    job runs exactly once no matter how many workers there are.
+
+    A worker that dies in the middle of a job (killed, out of memory,
+    restarted by a deploy) leaves the job running.  Such jobs are marked as
+    failed, and their files removed, by recover_stale_jobs, which runs when
+    the workers start and whenever a worker looks for a new job.  Jobs are
+    not run again, since the same job would likely kill the next worker too.
+
+    SQLite allows a single writer, so a running job can not write its
+    progress to the job table while its own transaction is open.  Progress
+    is written to a small file in JOB_SPOOL_DIR instead and read by
+    get_job while the job runs.  Uploaded files are kept in the same
+    directory until the job that needs them has finished.
+'''
+
+import errno
+import json
+import os
+import tempfile
+import time
+import traceback
+
+from datetime import datetime
+
+from django.conf import settings
+
+import graphs.models as models
+from graphs.util import db
+
+# Directory for uploaded files and progress of running jobs
+JOB_SPOOL_DIR = getattr(settings, 'JOB_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'graphspace_jobs'))
+
+# Seconds an idle worker waits before looking for new jobs
+JOB_POLL_INTERVAL = getattr(settings, 'JOB_POLL_INTERVAL', 1)
+
+# Seconds after which a running job is considered lost even if a process with its worker's id exists
+JOB_TIMEOUT = getattr(settings, 'JOB_TIMEOUT', 24 * 60 * 60)
+
+# Seconds between two writes of the progress of a job
+PROGRESS_INTERVAL = 1
+
+def _upload_graph(job, arguments, progress):
+    path = arguments['path']
+    with open(path, 'rb') as stream:
+        error = db.insert_graph_stream(job.user_id, arguments['graph_id'], stream, progress=progress)
+
+    if error != None:
+        raise JobError(error)
+    return "Graph inserted into GraphSpace!"
+
+def _update_graph(job, arguments, progress):
+    path = arguments['path']
+    with open(path, 'rb') as stream:
+        error = db.update_graph(job.user_id, arguments['graph_id'], stream.read())
+
+    if error != None:
+        raise JobError(error)
+    return "Updated " + arguments['graph_id'] + " for " + job.user_id + '.'
+
+def _delete_graphs_for_tag(job, arguments, progress):
+    if db.delete_all_graphs_for_tag(arguments['tag'], job.user_id, progress) == None:
+        raise JobError("Graphs with tag could not be deleted")
+    return "Graphs with tag have been deleted"
+
+def _change_visibility_for_tag(job, arguments, progress):
+    error = db.change_graph_visibility_for_tag(arguments['public'], arguments['tag'], job.user_id)
+
+    if error != None:
+        raise JobError(error)
+
+    if arguments['public'] == 1:
+        return "Graphs with tag have been made public"
+    return "Graphs with tag have been made private"
+
+# Operations that can run as jobs: job type -> function(job, arguments, progress)
+# The function returns a message, or raises JobError
+JOB_TYPES = {
+    'upload_graph': _upload_graph,
+    'update_graph': _update_graph,
+    'delete_graphs_for_tag': _delete_graphs_for_tag,
+    'change_visibility_for_tag': _change_visibility_for_tag
+}
+
+class JobError(Exception):
+    '''
+        Error message of a job that failed (eg an invalid graph).
+    '''
+    pass
+
+def enqueue(user_id, job_type, arguments, upload=None):
+    '''
+        Queue a job.
+
+        :param user_id: User the job runs for
+        :param job_type: Operation to run (see JOB_TYPES)
+        :param arguments: Arguments of the operation (dictionary that can be serialized to JSON)
+        :param upload: Uploaded file the operation reads (optional), kept in JOB_SPOOL_DIR until the job is done
+        :return Job id
+    '''
+    if job_type not in JOB_TYPES:
+        raise ValueError("Unknown job type: " + job_type)
+
+    arguments = dict(arguments)
+
+    if upload != None:
+        arguments['path'] = _spool_upload(upload)
+
+    db_session = db.data_connection.new_session()
+
+    job = models.Job(user_id = user_id, job_type = job_type, arguments = json.dumps(arguments), status = 'queued', items_done = 0, created = datetime.now())
+    db_session.add(job)
+    db_session.commit()
+
+    job_id = job.job_id
+    db_session.close()
+
+    return job_id
+
+def get_job(job_id):
+    '''
+        Status of a job.
+
+        :param job_id: Id of the job
+        :return Job: {'job_id', 'user_id', 'job_type', 'status', 'items_done', 'items_total',
+            'items_per_second', 'result', 'error', 'created', 'started', 'finished'}, or None
+    '''
+    db_session = db.data_connection.new_session()
+    job = db_session.query(models.Job).filter(models.Job.job_id == job_id).first()
+    db_session.close()
+
+    if job == None:
+        return None
+
+    items_done = job.items_done
+    items_total = job.items_total
+
+    # Running jobs keep their progress outside of the database
+    if job.status == 'running':
+        current = _read_progress(job.job_id)
+        if current != None:
+            items_done = current['items_done']
+            items_total = current['items_total']
+
+    # Throughput so far (or overall, once the job is finished)
+    items_per_second = None
+    if job.started != None and items_done != None:
+        end = job.finished
+        if end == None:
+            end = datetime.now()
+        seconds = (end - job.started).total_seconds()
+        if seconds > 0:
+            items_per_second = round(items_done / seconds, 1)
+
+    return {
+        'job_id': job.job_id,
+        'user_id': job.user_id,
+        'job_type': job.job_type,
+        'status': job.status,
+        'items_done': items_done,
+        'items_total': items_total,
+        'items_per_second': items_per_second,
+        'result': job.result,
+        'error': job.error,
+        'created': _isoformat(job.created),
+        'started': _isoformat(job.started),
+        'finished': _isoformat(job.finished)
+    }
+
+def recover_stale_jobs():
+    '''
+        Mark running jobs whose worker is gone (no process with its id exists
+        on this host) or that started more than JOB_TIMEOUT seconds ago as
+        failed, and remove their uploaded files and progress.  Workers share
+        JOB_SPOOL_DIR, so they all run on this host.
+
+        :return Ids of the jobs marked as failed
+    '''
+    db_session = db.data_connection.new_session()
+
+    recovered = []
+
+    try:
+        running = db_session.query(models.Job.job_id, models.Job.worker, models.Job.started, models.Job.arguments).filter(models.Job.status == 'running').all()
+
+        for job in running:
+            if _worker_alive(job.worker) and (JOB_TIMEOUT == None or job.started == None or (datetime.now() - job.started).total_seconds() < JOB_TIMEOUT):
+                continue
+
+            # Only one worker can record the failure (and remove the files), the job may also have just finished
+            failed = db_session.query(models.Job).filter(models.Job.job_id == job.job_id).filter(models.Job.status == 'running').filter(models.Job.worker == job.worker).update({'status': 'failed', 'error': "The worker running the job stopped before the job finished", 'finished': datetime.now()}, synchronize_session=False)
+            db_session.commit()
+
+            if failed == 1:
+                print "Job %d was lost by worker %s, marked as failed" % (job.job_id, job.worker)
+                _remove_job_files(job.job_id, json.loads(job.arguments))
+                recovered.append(job.job_id)
+    finally:
+        db_session.close()
+
+    return recovered
+
+def claim_next_job(worker_id):
+    '''
+        Move the oldest queued job to running.  Jobs lost by workers that
+        died are marked as failed first (see recover_stale_jobs).
+
+        :param worker_id: Id of the worker claiming the job (eg its process id)
+        :return Id of the claimed job, or None if no job is queued
+    '''
+    recover_stale_jobs()
+
+    db_session = db.data_connection.new_session()
+
+    try:
+        while True:
+            candidate = db_session.query(models.Job.job_id).filter(models.Job.status == 'queued').order_by(models.Job.job_id).first()
+
+            if candidate == None:
+                return None
+
+            # Another worker may have claimed the job in the meantime, only one UPDATE can succeed
+            claimed = db_session.query(models.Job).filter(models.Job.job_id == candidate.job_id).filter(models.Job.status == 'queued').update({'status': 'running', 'worker': worker_id, 'started': datetime.now()}, synchronize_session=False)
+            db_session.commit()
+
+            if claimed == 1:
+                return candidate.job_id
+    finally:
+        db_session.close()
+
+def run_job(job_id):
+    '''
+        Run a claimed job and record its outcome.
+
+        :param job_id: Id of the job (see claim_next_job)
+    '''
+    db_session = db.data_connection.new_session()
+    job = db_session.query(models.Job).filter(models.Job.job_id == job_id).one()
+    db_session.expunge(job)
+    db_session.close()
+
+    arguments = json.loads(job.arguments)
+    reporter = ProgressReporter(job_id)
+
+    result = None
+    error = None
+
+    try:
+        result = JOB_TYPES[job.job_type](job, arguments, reporter)
+    except JobError as ex:
+        error = str(ex)
+    except Exception as ex:
+        traceback.print_exc()
+        error = "An error was encountered while running the job: " + str(ex)
+
+    if error == None:
+        status = 'done'
+    else:
+        status = 'failed'
+
+    print "Job %d (%s) %s in %.3f seconds" % (job_id, job.job_type, status, time.time() - reporter.start_time)
+
+    db_session = db.data_connection.new_session()
+    db_session.query(models.Job).filter(models.Job.job_id == job_id).update({'status': status, 'result': result, 'error': error, 'items_done': reporter.items_done, 'items_total': reporter.items_total, 'finished': datetime.now()}, synchronize_session=False)
+    db_session.commit()
+    db_session.close()
+
+    # The job is over, its files are not needed anymore
+    _remove_job_files(job_id, arguments)
+
+def work(worker_id, max_jobs=None):
+    '''
+        Main loop of a worker process: run queued jobs one at a time, and
+        wait JOB_POLL_INTERVAL seconds whenever the queue is empty.
+
+        :param worker_id: Id of the worker (eg its process id)
+        :param max_jobs: Stop after this many jobs (None to run forever)
+    '''
+    jobs_run = 0
+
+    while max_jobs == None or jobs_run < max_jobs:
+        job_id = claim_next_job(worker_id)
+
+        if job_id == None:
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+
+        run_job(job_id)
+        jobs_run += 1
+
+class ProgressReporter(object):
+    '''
+        Progress callback handed to a job.  Called with the number of items
+        (rows or graphs) done so far, and optionally the total.  Writes the
+        progress to the spool directory at most every PROGRESS_INTERVAL seconds.
+    '''
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.items_done = 0
+        self.items_total = None
+        self.start_time = time.time()
+        self.last_write = 0
+
+    def __call__(self, items_done, items_total=None):
+        self.items_done = items_done
+        if items_total != None:
+            self.items_total = items_total
+
+        now = time.time()
+        if now - self.last_write >= PROGRESS_INTERVAL:
+            self.last_write = now
+            _write_progress(self.job_id, {'items_done': self.items_done, 'items_total': self.items_total})
+
+def _worker_alive(worker_id):
+    '''
+        Is there a process with the id of the worker?
+    '''
+    if worker_id == None:
+        return False
+
+    try:
+        # Signal 0 only checks that the process exists
+        os.kill(worker_id, 0)
+    except OSError as ex:
+        # EPERM: the process exists but belongs to another user
+        return ex.errno == errno.EPERM
+
+    return True
+
+def _remove_job_files(job_id, arguments):
+    '''
+        Remove the uploaded file and the progress of a job that is over.
+    '''
+    for path in (_progress_path(job_id), arguments.get('path')):
+        if path != None and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError:
+                # Removed by another process in the meantime
+                pass
+
+def _spool_upload(upload):
+    '''
+        Copy an uploaded file to the spool directory.
+
+        :param upload: Uploaded file (django UploadedFile)
+        :return Path of the copy
+    '''
+    _make_spool_dir()
+
+    handle, path = tempfile.mkstemp(suffix='.json', prefix='upload_', dir=JOB_SPOOL_DIR)
+    with os.fdopen(handle, 'wb') as spool:
+        for chunk in upload.chunks():
+            spool.write(chunk)
+
+    return path
+
+def _progress_path(job_id):
+    return os.path.join(JOB_SPOOL_DIR, 'job_%d.progress' % job_id)
+
+def _write_progress(job_id, current):
+    _make_spool_dir()
+
+    # Write to a temporary file first, so readers never see a half written file
+    path = _progress_path(job_id)
+    with open(path + '.tmp', 'w') as progress_file:
+        json.dump(current, progress_file)
+    os.rename(path + '.tmp', path)
+
+def _read_progress(job_id):
+    try:
+        with open(_progress_path(job_id)) as progress_file:
+            return json.load(progress_file)
+    except (IOError, ValueError):
+        return None
+
+def _make_spool_dir():
+    if not os.path.isdir(JOB_SPOOL_DIR):
+        try:
+            os.makedirs(JOB_SPOOL_DIR)
+        except OSError:
+            # Created by another process in the meantime
+            pass
+
+def _isoformat(value):
+    if value == None:
+        return None
+    return value.isoformat()
@@ -0,0 +1,339 @@
+'''
+    Storage format of the graph JSON kept in the graph.json column.
+
+    Graph JSON is serialized compactly and, by default, compressed before it
+    is written.  Compressed values are stored as a BLOB that starts with a
+    tag naming the format (eg GSJ:zlib:), so every row says how it has to be
+    read.  Rows written as plain JSON text (including every row written
+    before compression was added) are read back unchanged, which lets old
+    and new rows live side by side until they are rewritten with the
+    compress_graph_json management command.
+
+    Graph JSON is content addressed: it is kept once in the graph_blob table
+    under the SHA-256 hash of its compact text, and graph.json only holds a
+    reference to it (GSJ:ref:<hash>), so identical graphs share their JSON.
+    See store_graph_json and load_graph_json in graphs.util.db.
+'''
+
+import hashlib
+import json
+import tempfile
+import zlib
+
+from django.conf import settings
+
+# zstandard is optional, zlib is used when it is not installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Formats graph JSON can be stored in
+STORAGE_FORMATS = ('text', 'zlib', 'zstd')
+
+# Tags that start compressed values.  JSON text starts with '{' (or
+# whitespace), so a tag can never be mistaken for the start of plain JSON
+_FORMAT_TAGS = {
+    'zlib': 'GSJ:zlib:',
+    'zstd': 'GSJ:zstd:'
+}
+
+# Tag of graph.json values that refer to a row of the graph_blob table
+REFERENCE_TAG = 'GSJ:ref:'
+
+# Length of a reference (tag and hex SHA-256 hash)
+REFERENCE_LENGTH = len(REFERENCE_TAG) + 64
+
+# Format new graphs are written in
+STORAGE_FORMAT = getattr(settings, 'GRAPH_JSON_STORAGE_FORMAT', 'zlib')
+
+# Compression levels (zlib: 1-9, zstd: 1-22)
+ZLIB_LEVEL = getattr(settings, 'GRAPH_JSON_ZLIB_LEVEL', 6)
+ZSTD_LEVEL = getattr(settings, 'GRAPH_JSON_ZSTD_LEVEL', 3)
+
+def resolve_format(storage_format=None):
+    '''
+        Format that is actually used for a requested format.
+
+        :param storage_format: text, zlib or zstd (None for the configured format)
+        :return Format: text, zlib or zstd
+    '''
+    if storage_format == None:
+        storage_format = STORAGE_FORMAT
+
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError("Unknown graph JSON storage format: " + str(storage_format))
+
+    # Fall back to zlib if zstandard is not installed
+    if storage_format == 'zstd' and zstandard == None:
+        print "zstandard is not installed, storing graph JSON with zlib"
+        return 'zlib'
+
+    return storage_format
+
+# Compact encoder.  Without sort_keys the json module uses its C encoder,
+# sorting every key would fall back to the pure Python one (several times slower)
+_ENCODER = json.JSONEncoder(separators=(',', ':'))
+
+def dumps(graph_json):
+    '''
+        Serialize graph JSON without any whitespace.  Properties of the graph
+        and of its graph property are written in sorted order, so a graph is
+        always written the same way (also by GraphJsonWriter).  Nodes, edges
+        and other values are written as they are.
+
+        :param graph_json: Graph JSON (dictionary)
+        :return JSON: Compact JSON text
+    '''
+    return ''.join(_sorted_chunks(graph_json, 2))
+
+def _sorted_chunks(value, depth):
+    '''
+        Pieces of the compact JSON text of value, with the keys of the
+        dictionaries in the top depth levels written in sorted order.
+    '''
+    if depth == 0 or not isinstance(value, dict):
+        yield _ENCODER.encode(value)
+        return
+
+    yield '{'
+    for i, key in enumerate(sorted(value.keys())):
+        if i > 0:
+            yield ','
+        yield _ENCODER.encode(key) + ':'
+        for chunk in _sorted_chunks(value[key], depth - 1):
+            yield chunk
+    yield '}'
+
+def encode(json_text, storage_format=None):
+    '''
+        Value to write to the graph.json column.
+
+        :param json_text: JSON text of the graph
+        :param storage_format: text, zlib or zstd (None for the configured format)
+        :return Value: JSON text, or a tagged compressed buffer (stored as a BLOB)
+    '''
+    storage_format = resolve_format(storage_format)
+
+    if storage_format == 'text':
+        return json_text
+
+    if isinstance(json_text, unicode):
+        json_text = json_text.encode('utf-8')
+
+    if storage_format == 'zstd':
+        compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(json_text)
+    else:
+        compressed = zlib.compress(json_text, ZLIB_LEVEL)
+
+    # Byte strings have to be handed to the database as buffers to be stored as BLOBs
+    return buffer(_FORMAT_TAGS[storage_format] + compressed)
+
+def encode_chunks(chunks, storage_format=None):
+    '''
+        Same as encode for JSON text that arrives in pieces.  Compressed
+        formats compress every piece as it arrives, so only the compressed
+        value is held in memory.
+
+        :param chunks: Iterable of pieces of JSON text
+        :param storage_format: text, zlib or zstd (None for the configured format)
+        :return Value: JSON text, or a tagged compressed buffer (stored as a BLOB)
+    '''
+    storage_format = resolve_format(storage_format)
+
+    if storage_format == 'text':
+        return u''.join(chunks)
+
+    if storage_format == 'zstd':
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    else:
+        compressor = zlib.compressobj(ZLIB_LEVEL)
+
+    parts = [_FORMAT_TAGS[storage_format]]
+    for chunk in chunks:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode('utf-8')
+        parts.append(compressor.compress(chunk))
+    parts.append(compressor.flush())
+
+    # Byte strings have to be handed to the database as buffers to be stored as BLOBs
+    return buffer(''.join(parts))
+
+class GraphJsonWriter(object):
+    '''
+        Builds the stored JSON of a graph one node and edge at a time.
+        Nodes and edges are serialized as they are added and spooled to
+        temporary files, so the graph is never held in memory as a whole.
+        The result is the same as dumps() of the whole graph.
+    '''
+
+    # Bytes of serialized nodes (and edges) kept in memory before spooling to disk
+    SPOOL_SIZE = 1024 * 1024
+
+    def __init__(self):
+        self.lists = {
+            'nodes': tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE),
+            'edges': tempfile.SpooledTemporaryFile(max_size=self.SPOOL_SIZE)
+        }
+        self.counts = {'nodes': 0, 'edges': 0}
+
+    def add(self, list_name, element):
+        '''
+            Append a node or an edge.
+
+            :param list_name: nodes or edges
+            :param element: Node or edge ({"data": {...}})
+        '''
+        if self.counts[list_name] > 0:
+            self.lists[list_name].write(',')
+
+        # Non-ASCII characters are escaped, so the text is plain ASCII
+        self.lists[list_name].write(_ENCODER.encode(element))
+        self.counts[list_name] += 1
+
+    def chunks(self, graph_properties, top_properties):
+        '''
+            Pieces of the JSON text of the graph, with keys in the same order as dumps writes them.
+
+            :param graph_properties: Other properties of the graph property
+            :param top_properties: Properties next to the graph property (eg metadata)
+        '''
+        yield '{'
+
+        top_keys = sorted(list(top_properties.keys()) + ['graph'])
+        for i, top_key in enumerate(top_keys):
+            if i > 0:
+                yield ','
+            yield _ENCODER.encode(top_key) + ':'
+
+            if top_key != 'graph':
+                for chunk in _sorted_chunks(top_properties[top_key], 1):
+                    yield chunk
+                continue
+
+            yield '{'
+
+            graph_keys = sorted(list(graph_properties.keys()) + list(self.lists.keys()))
+            for j, graph_key in enumerate(graph_keys):
+                if j > 0:
+                    yield ','
+                yield _ENCODER.encode(graph_key) + ':'
+
+                if graph_key not in self.lists:
+                    yield _ENCODER.encode(graph_properties[graph_key])
+                    continue
+
+                yield '['
+                spool = self.lists[graph_key]
+                spool.seek(0)
+                while True:
+                    block = spool.read(64 * 1024)
+                    if not block:
+                        break
+                    yield block
+                yield ']'
+
+            yield '}'
+
+        yield '}'
+
+    def content_hash(self, graph_properties, top_properties):
+        '''
+            Hash of the JSON text of the graph (see content_hash).
+        '''
+        digest = hashlib.sha256()
+        for chunk in self.chunks(graph_properties, top_properties):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def encode(self, graph_properties, top_properties, storage_format=None):
+        '''
+            Value to write to the graph.json column (see encode).
+        '''
+        return encode_chunks(self.chunks(graph_properties, top_properties), storage_format)
+
+    def close(self):
+        for spool in self.lists.values():
+            spool.close()
+
+def content_hash(json_text):
+    '''
+        Key of graph JSON in the graph_blob table.
+
+        :param json_text: Compact JSON text of the graph (see dumps)
+        :return Hash: Hex SHA-256 hash of the text
+    '''
+    if isinstance(json_text, unicode):
+        json_text = json_text.encode('utf-8')
+
+    return hashlib.sha256(json_text).hexdigest()
+
+def reference(json_hash):
+    '''
+        Value written to the graph.json column for JSON kept in the graph_blob table.
+
+        :param json_hash: Hash of the JSON (see content_hash)
+        :return Reference: GSJ:ref:<hash>
+    '''
+    return REFERENCE_TAG + json_hash
+
+def referenced_hash(value):
+    '''
+        Hash a graph.json value refers to.
+
+        :param value: Value read from the graph.json column (or its first REFERENCE_LENGTH characters)
+        :return Hash: Hash of the JSON in the graph_blob table, or None if the JSON is stored in the graph row
+    '''
+    if isinstance(value, basestring) and value.startswith(REFERENCE_TAG):
+        return str(value[len(REFERENCE_TAG):])
+
+    return None
+
+def format_of(value):
+    '''
+        Format a graph.json value is stored in.
+
+        :param value: Value read from the graph.json column
+        :return Format: text, zlib or zstd
+    '''
+    if isinstance(value, (buffer, bytearray, str)):
+        prefix = str(value[:len(_FORMAT_TAGS['zlib'])])
+        for storage_format in _FORMAT_TAGS:
+            if prefix == _FORMAT_TAGS[storage_format]:
+                return storage_format
+
+    return 'text'
+
+def decode(value):
+    '''
+        JSON text of a value read from the graph.json column.
+
+        :param value: Value read from the graph.json column
+        :return JSON: JSON text of the graph (None if value is None)
+    '''
+    if value == None:
+        return None
+
+    if referenced_hash(value) != None:
+        raise ValueError("Graph JSON is kept in the graph_blob table, read it with db.load_graph_json")
+
+    storage_format = format_of(value)
+
+    if storage_format == 'text':
+        # Plain JSON that came back as bytes
+        if isinstance(value, (buffer, bytearray)):
+            return str(value).decode('utf-8')
+        return value
+
+    compressed = str(value)[len(_FORMAT_TAGS[storage_format]):]
+
+    if storage_format == 'zstd':
+        if zstandard == None:
+            raise ValueError("Graph JSON is compressed with zstd but zstandard is not installed")
+        # Frames written by encode_chunks do not record their content size
+        # in the header, which ZstdDecompressor().decompress() requires
+        json_text = zstandard.ZstdDecompressor().decompressobj().decompress(compressed)
+    else:
+        json_text = zlib.decompress(compressed)
+
+    return json_text.decode('utf-8')
@@ -31,12 +31,63 @@ ALLOWED_ARROW_FILL = ['filled', 'hollow']
 
 import json
 
-def verify_json(graph_json):
-    graph_json = json.loads(graph_json)
+from decimal import Decimal
+
+# ijson is optional, it is only needed to validate uploads without loading them into memory
+try:
+    import ijson
+    import ijson.common
+except ImportError:
+    ijson = None
+
+# Types a node ID (and the source and target of an edge) may have.
+# JSON strings are parsed into unicode, ijson parses floats into Decimal
+_ID_TYPES = (basestring, int, long, float, Decimal)
+
+def normalize_graph(graph_json, default_shapes=True, label_to_content=True, edge_ids=True):
+    """
+    Normalizes a parsed graph for CytoscapeJS.  All stages work on the same
+    parsed object, so a graph is parsed and serialized only once no matter
+    how many stages run:
+
+        1. Cytoscape Web graphs are converted to the CytoscapeJS structure
+        2. Node shapes are lower cased, missing or unknown shapes become ellipses
+        3. Node labels are moved to the content property (used by CytoscapeJS)
+        4. Edges get unique IDs (see assign_edge_ids)
+
+    Stages 2 and 3 share a single pass over the nodes.
+
+    @param graph_json: Parsed JSON of graph
+    @param default_shapes: Run stage 2
+    @param label_to_content: Run stage 3
+    @param edge_ids: Run stage 4
+    @return graph_json: Normalized JSON of graph
+    """
+
+    # Needed for old graphs, converts CytoscapeWeb to CytoscapeJS standard
+    if 'data' in graph_json['graph']:
+        graph_json = convert_graph(graph_json)
+
+    if default_shapes or label_to_content:
+        for node in graph_json["graph"]["nodes"]:
+            normalize_node(node["data"], default_shapes, label_to_content)
 
-    for node in graph_json["graph"]["nodes"]:
-        node = node["data"]
+    # Attach ID's to each edge for traversing the element
+    if edge_ids:
+        graph_json = assign_edge_ids(graph_json)
 
+    return graph_json
+
+def normalize_node(node, default_shapes=True, label_to_content=True):
+    """
+    Stages 2 and 3 of normalize_graph for a single node.
+
+    @param node: Data of the node (modified in place)
+    @param default_shapes: Default the shape of the node
+    @param label_to_content: Move the label of the node to its content
+    @return node: Data of the node
+    """
+    if default_shapes:
         if "shape" in node:
             shape = node["shape"].lower()
         else:
@@ -46,174 +97,348 @@ def verify_json(graph_json):
             shape = "ellipse"
 
         node["shape"] = shape
-    
-    return json.dumps(graph_json)
 
-def validate_json(graphJson):
+    if label_to_content:
+        # Used for backwards-compatibility since some JSON have label 
+        # but new CytoscapeJS uses the content property
+        if "label" in node:
+            node["content"] = node["label"]
+            del node["label"]
+
+        # If the node has any content inside of it, display that content, otherwise, just make it an empty string
+        if "content" not in node:
+            node["content"] = ""
+
+    return node
+
+def verify_json(graph_json):
+    """
+    Makes sure that all nodes have a shape that CytoscapeJS can draw.
+
+    @param graph_json: JSON of graph (string)
+    @return JSON: JSON of graph (string)
+    """
+    return json.dumps(normalize_graph(json.loads(graph_json), label_to_content=False, edge_ids=False))
+
+def validate_json(graphJson, max_errors=None):
     """
     Validates JSON to see if all properties are consistent with API.
 
-    @param graphJson: JSON of graph
+    @param graphJson: JSON of graph (string, or already parsed)
+    @param max_errors: Stop after this many property errors (None to report all of them)
     """
 
-    cleaned_json = json.loads(graphJson)
+    if isinstance(graphJson, basestring):
+        cleaned_json = json.loads(graphJson)
+    else:
+        cleaned_json = graphJson
 
-    if 'data' in cleaned_json:
-        cleaned_json = convert_json(cleaned_json)
+    # Validate old graphs in their CytoscapeJS form
+    if 'graph' in cleaned_json and 'data' in cleaned_json['graph']:
+        cleaned_json = convert_graph(cleaned_json)
 
     if "graph" not in cleaned_json:
         return "JSON of graph must have 'graph' property"
 
-	if "nodes" not in cleaned_json["graph"]:
-		return "JSON of graph must have 'nodes' property"
+    if "nodes" not in cleaned_json["graph"]:
+        return "JSON of graph must have 'nodes' property"
 
-	if not isinstance(cleaned_json["graph"]["nodes"], list):
-		return "Nodes property must contain an array"
+    if not isinstance(cleaned_json["graph"]["nodes"], list):
+        return "Nodes property must contain an array"
 
     if "edges" not in cleaned_json["graph"]:
-		return "JSON of graph must have 'edges' property"
+        return "JSON of graph must have 'edges' property"
 
     if not isinstance(cleaned_json["graph"]["edges"], list):
-		return "Edges property must contain an array"
+        return "Edges property must contain an array"
 
     # Validate all node properties
-    error = validate_node_properties(cleaned_json["graph"]["nodes"])
+    error = validate_node_properties(cleaned_json["graph"]["nodes"], max_errors)
 
     if error != None:
         return error
 
     # Validate all edge properties
-    error = validate_edge_properties(cleaned_json["graph"]["edges"])
+    error = validate_edge_properties(cleaned_json["graph"]["edges"], max_errors)
 
     if error != None:
         return error
 
-def validate_edge_properties(edges):
+def validate_json_stream(stream, max_errors=None):
+    """
+    Validates JSON of graph while it is being read, without loading the
+    whole graph into memory.  Nodes and edges are checked one at a time as
+    the incremental parser (ijson) reaches the end of each of them, so only
+    one element and the set of node IDs (to detect duplicates) are kept.
+    Accepts the same graphs as validate_json, including old Cytoscape Web graphs.
+
+    If ijson is not installed, the stream is parsed in full and validated
+    with validate_json.
+
+    @param stream: File-like object to read the JSON of graph from
+    @param max_errors: Stop reading after this many property errors (None to report all of them)
+    @return Error: Error message, or None if the graph is valid
+    """
+    if ijson == None:
+        print "ijson is not installed, validating the whole graph in memory"
+        try:
+            return validate_json(json.load(stream), max_errors)
+        except ValueError as ex:
+            return "JSON of graph could not be parsed: " + str(ex)
+
+    # Node errors are reported before edge errors, as in validate_json
+    node_errors = ValidationErrors(max_errors)
+    edge_errors = ValidationErrors(max_errors)
+    unique_ids = set()
+
+    # Lists of the graph that were found, and the element (node or edge) being read
+    found = set()
+    element_type = None
+    element_prefix = None
+    builder = None
+
+    try:
+        for prefix, event, value in ijson.parse(stream):
+
+            # Inside a node or an edge, rebuild it and check it once it is complete
+            if builder != None:
+                builder.event(event, value)
+
+                if prefix == element_prefix and event == 'end_map':
+                    builder_value = builder.value
+                    builder = None
+
+                    if element_type == 'nodes':
+                        error = validate_node(builder_value, unique_ids, node_errors)
+
+                        if error != None:
+                            return error
+                    else:
+                        error = validate_edge(builder_value, edge_errors)
+
+                        if error != None:
+                            return node_errors.message() or error
+
+                    # Stop reading once enough errors have been found
+                    if node_errors.full() or edge_errors.full():
+                        return node_errors.message() or edge_errors.message()
+
+                continue
+
+            # Lists of nodes and edges (CytoscapeJS and Cytoscape Web forms)
+            if prefix in _STREAM_LIST_PREFIXES and _STREAM_LIST_PREFIXES[prefix] not in found:
+                list_name = _STREAM_LIST_PREFIXES[prefix]
+                found.add(list_name)
+
+                if event != 'start_array':
+                    if list_name == 'nodes':
+                        return "Nodes property must contain an array"
+                    return "Edges property must contain an array"
+
+            # Start of a node or an edge
+            elif prefix in _STREAM_ELEMENT_PREFIXES and event == 'start_map':
+                element_type = _STREAM_ELEMENT_PREFIXES[prefix]
+                element_prefix = prefix
+                builder = ijson.common.ObjectBuilder()
+                builder.event(event, value)
+
+            elif prefix == 'graph':
+                found.add('graph')
+
+    except ijson.common.JSONError as ex:
+        return "JSON of graph could not be parsed: " + str(ex)
+
+    if "graph" not in found:
+        return "JSON of graph must have 'graph' property"
+
+    if "nodes" not in found:
+        return "JSON of graph must have 'nodes' property"
+
+    if "edges" not in found:
+        return "JSON of graph must have 'edges' property"
+
+    return node_errors.message() or edge_errors.message()
+
+# Prefixes (see ijson.parse) of the node and edge lists, and of a single node or edge
+_STREAM_LIST_PREFIXES = {
+    'graph.nodes': 'nodes',
+    'graph.edges': 'edges',
+    'graph.data.nodes': 'nodes',
+    'graph.data.edges': 'edges'
+}
+
+_STREAM_ELEMENT_PREFIXES = {
+    'graph.nodes.item.data': 'nodes',
+    'graph.edges.item.data': 'edges',
+    'graph.data.nodes.item': 'nodes',
+    'graph.data.edges.item': 'edges'
+}
+
+class ValidationErrors(object):
+    """
+    Property errors found so far, optionally bounded.
+    """
+    def __init__(self, max_errors=None):
+        self.max_errors = max_errors
+        self.errors = []
+
+    def add(self, error):
+        if len(error) > 0 and not self.full():
+            self.errors.append(error)
+
+    def full(self):
+        return self.max_errors != None and len(self.errors) >= self.max_errors
+
+    def message(self):
+        if len(self.errors) > 0:
+            return "".join(self.errors)
+        else:
+            return None
+
+def validate_edge_properties(edges, max_errors=None):
     """
     Validates all edge properties.
 
     @param edges: Array of edge objects (http://js.cytoscape.org)
+    @param max_errors: Stop after this many property errors (None to report all of them)
     """
 
-    error = ""
-    edge_id = None
+    errors = ValidationErrors(max_errors)
+
     # Go through all edges to verify if edges contain valid properties
     # recognized by CytoscapeJS
     for edge in edges:
-        edge = edge["data"]
+        error = validate_edge(edge["data"], errors)
 
-    	# If edge has no source and target nodes, throw error since they are required
-    	if "source" not in edge or "target" not in edge:
-    		return "All edges must have at least a source and target property.  Please verify that all edges meet this requirement."
+        if error != None:
+            return error
 
-        # Check if source and target nodes are strings, integers or floats
-        if not (isinstance(edge["source"], (str, int, float)) and isinstance(edge["target"], (str, int, float))):
-            return "Source and target nodes of the edge must be strings, integers or floats"
+        if errors.full():
+            break
 
-        edge_id = "with source: " + str(edge["source"]) + "and target: " + str(edge["target"])
+    return errors.message()
 
-        # If edge is directed, it must have a target_arrow_shape
-        if "directed" in edge and edge["directed"] == "true":
-            if "target_arrow_shape" not in edge:
-                return "Edge", edge_id, "must have a target_arrow_shape property if directed is set to true"
-
-        if "source_arrow_shape" in edge:
-            error += find_property_in_array("Edge", edge_id, edge, edge["source_arrow_shape"], ALLOWED_ARROW_SHAPES)
+def validate_edge(edge, errors):
+    """
+    Validates the properties of a single edge.
 
-        if "mid_source_arrow_shape" in edge:
-            error +=  find_property_in_array("Edge", edge_id, edge, edge["source_arrow_shape"], ALLOWED_ARROW_SHAPES)
+    @param edge: Data of the edge
+    @param errors: ValidationErrors that property errors are added to
+    @return Error: Error that makes the whole graph invalid, otherwise None
+    """
 
-        if "target_arrow_shape" in edge:
-            error +=  find_property_in_array("Edge", edge_id, edge, edge["target_arrow_shape"], ALLOWED_ARROW_SHAPES)
+    # If edge has no source and target nodes, throw error since they are required
+    if "source" not in edge or "target" not in edge:
+        return "All edges must have at least a source and target property.  Please verify that all edges meet this requirement."
 
-        if "mid_target_arrow_shape" in edge:
-            error +=  find_property_in_array("Edge", edge_id, edge, edge["mid_target_arrow_shape"], ALLOWED_ARROW_SHAPES)
+    # Check if source and target nodes are strings, integers or floats
+    if not (isinstance(edge["source"], _ID_TYPES) and isinstance(edge["target"], _ID_TYPES)):
+        return "Source and target nodes of the edge must be strings, integers or floats"
 
-        if "line_style" in edge:
-            error +=  find_property_in_array("Edge", edge_id, edge, edge["line_style"], ALLOWED_EDGE_STYLES)
+    edge_id = "with source: " + unicode(edge["source"]) + " and target: " + unicode(edge["target"])
 
-        if "source_arrow_fill" in edge:
-            error +=  find_property_in_array("Edge", edge_id, edge, edge["source_arrow_fill"], ALLOWED_ARROW_FILL)
+    # If edge is directed, it must have a target_arrow_shape
+    if "directed" in edge and edge["directed"] == "true":
+        if "target_arrow_shape" not in edge:
+            return "Edge " + edge_id + " must have a target_arrow_shape property if directed is set to true"
 
-        if "mid_source_arrow_fill" in edge:
-            error +=  find_property_in_array("Edge", edge_id, edge, edge["mid_source_arrow_fill"], ALLOWED_ARROW_FILL)
+    for prop in ["source_arrow_shape", "mid_source_arrow_shape", "target_arrow_shape", "mid_target_arrow_shape"]:
+        if prop in edge:
+            errors.add(find_property_in_array("Edge", edge_id, prop, edge[prop], ALLOWED_ARROW_SHAPES))
 
-        if "target_arrow_fill" in edge:
-            error +=  find_property_in_array("Edge", edge_id, edge, edge["target_arrow_fill"], ALLOWED_ARROW_FILL)
+    if "line_style" in edge:
+        errors.add(find_property_in_array("Edge", edge_id, "line_style", edge["line_style"], ALLOWED_EDGE_STYLES))
 
-        if "mid_target_arrow_fill" in edge:
-            error +=  find_property_in_array("Edge", edge_id, edge, edge["mid_target_arrow_fill"], ALLOWED_ARROW_FILL)
+    for prop in ["source_arrow_fill", "mid_source_arrow_fill", "target_arrow_fill", "mid_target_arrow_fill"]:
+        if prop in edge:
+            errors.add(find_property_in_array("Edge", edge_id, prop, edge[prop], ALLOWED_ARROW_FILL))
 
-    if len(error) > 0:
-        return error
-    else:
-        return None
+    return None
 
-def validate_node_properties(nodes):
+def validate_node_properties(nodes, max_errors=None):
     """
     Validates all node properties.
 
-    :param G: NetworkX object.
+    @param nodes: Array of node objects (http://js.cytoscape.org)
+    @param max_errors: Stop after this many property errors (None to report all of them)
     """
 
     unique_ids = set()
 
-    error = ""
+    errors = ValidationErrors(max_errors)
 
     # Go through all nodes to verify if the nodes contain valid properties
     # recognized by CytoscapeJS
     for node in nodes:
-        node = node["data"]
-        # Check the data type of node, should be int, float or string
-        if not isinstance(node["id"], (str, int, float)):
-            return "All nodes must be strings, integers or floats"
-
-    	# Check to see if ID is in node
-    	if "id" not in node:
-    		return "All nodes must have a unique ID.  Please verify that all nodes meet this requirement."
-		
-		if node["id"] not in unique_ids:
-			unique_ids.add(node["id"])
-		else:
-			return "There are multiple nodes with ID: " + str(node["id"]) + ".  Please make sure all node IDs are unique."
+        error = validate_node(node["data"], unique_ids, errors)
 
-        # Checks shape of nodes to make sure it contains only legal shapes
-        if "shape" in node:
-            error += find_property_in_array("Node", node["id"], "shape", node["shape"], ALLOWED_NODE_SHAPES)
+        if error != None:
+            return error
 
-        # If node contains a border-style property, check to make sure it is 
-        # a legal value
-        if "border_style" in node:
-            error += find_property_in_array("Node", node["id"], "border_style", node["border_style"], ALLOWED_NODE_BORDER_STYLES)
+        if errors.full():
+            break
 
-        # If node contains a background_black property, check to make sure
-        # they have values [-1, 1]
-        if "border_blacken" in node:
-            if node["border_blacken"] >= -1 and node["border_blacken"] <= -1:
-                error += "Node: " + str(node["id"]) + " contains illegal border_blacken value.  Must be between [-1, 1]."
+    return errors.message()
+
+def validate_node(node, unique_ids, errors):
+    """
+    Validates the properties of a single node.
 
-        if "background_repeat" in node:
-            error += find_property_in_array("Node", node["id"], "background_repeat", node["background_repeat"], ALLOWED_NODE_BACKGROUND_REPEAT)
+    @param node: Data of the node
+    @param unique_ids: IDs of the nodes seen so far (the ID of this node is added)
+    @param errors: ValidationErrors that property errors are added to
+    @return Error: Error that makes the whole graph invalid, otherwise None
+    """
 
-        if "text_transform" in node:
-            error += find_property_in_array("Node", node["id"], "text_transform", node["text_transform"], ALLOWED_NODE_TEXT_TRANSFORM)
+    # Check to see if ID is in node
+    if "id" not in node:
+        return "All nodes must have a unique ID.  Please verify that all nodes meet this requirement."
 
-        if "text_wrap" in node:
-            error += find_property_in_array("Node", node["id"], "text_wrap", node["text_wrap"], ALLOWED_NODE_TEXT_WRAP)
+    # Check the data type of node, should be int, float or string
+    if not isinstance(node["id"], _ID_TYPES):
+        return "All nodes must be strings, integers or floats"
 
-        if "text_background_shape" in node:
-            error += find_property_in_array("Node", node["id"], "text_background_shape", node["text_background_shape"], ALLOWED_NODE_SHAPES)
+    if node["id"] not in unique_ids:
+        unique_ids.add(node["id"])
+    else:
+        return "There are multiple nodes with ID: " + unicode(node["id"]) + ".  Please make sure all node IDs are unique."
 
-        if "text_halign" in node:
-            error += find_property_in_array("Node", node["id"], "text_halign", node["text_halign"], ALLOWED_TEXT_HALIGN)
+    node_id = unicode(node["id"])
 
-        if "text_valign" in node:
-            error += find_property_in_array("Node", node["id"], "text_valign", node["text_valign"], ALLOWED_TEXT_VALIGN)
+    # Checks shape of nodes to make sure it contains only legal shapes
+    if "shape" in node:
+        errors.add(find_property_in_array("Node", node_id, "shape", node["shape"], ALLOWED_NODE_SHAPES))
 
-    if len(error) > 0:
-        return error
-    else:
-        return None
+    # If node contains a border-style property, check to make sure it is 
+    # a legal value
+    if "border_style" in node:
+        errors.add(find_property_in_array("Node", node_id, "border_style", node["border_style"], ALLOWED_NODE_BORDER_STYLES))
+
+    # If node contains a background_black property, check to make sure
+    # they have values [-1, 1]
+    if "border_blacken" in node:
+        if not isinstance(node["border_blacken"], (int, long, float, Decimal)) or node["border_blacken"] < -1 or node["border_blacken"] > 1:
+            errors.add("Node: " + node_id + " contains illegal border_blacken value.  Must be between [-1, 1].")
+
+    if "background_repeat" in node:
+        errors.add(find_property_in_array("Node", node_id, "background_repeat", node["background_repeat"], ALLOWED_NODE_BACKGROUND_REPEAT))
+
+    if "text_transform" in node:
+        errors.add(find_property_in_array("Node", node_id, "text_transform", node["text_transform"], ALLOWED_NODE_TEXT_TRANSFORM))
+
+    if "text_wrap" in node:
+        errors.add(find_property_in_array("Node", node_id, "text_wrap", node["text_wrap"], ALLOWED_NODE_TEXT_WRAP))
+
+    if "text_background_shape" in node:
+        errors.add(find_property_in_array("Node", node_id, "text_background_shape", node["text_background_shape"], ALLOWED_NODE_SHAPES))
+
+    if "text_halign" in node:
+        errors.add(find_property_in_array("Node", node_id, "text_halign", node["text_halign"], ALLOWED_TEXT_HALIGN))
+
+    if "text_valign" in node:
+        errors.add(find_property_in_array("Node", node_id, "text_valign", node["text_valign"], ALLOWED_TEXT_VALIGN))
+
+    return None
 
 def find_property_in_array(elementType, key, prop, value, array):
     """
@@ -227,45 +452,176 @@ def find_property_in_array(elementType, key, prop, value, array):
     """
     if value not in array:
         array_list = ",".join(array)
-        return elementType + " " + key + " contains illegal value for property: " + prop + ".  Value given for this property was: " + value + ".  Accepted values for property: " + prop + " are: [" + array_list + "]"
+        return elementType + " " + unicode(key) + " contains illegal value for property: " + prop + ".  Value given for this property was: " + unicode(value) + ".  Accepted values for property: " + prop + " are: [" + array_list + "]"
     else:
         return ""
 
-def assign_edge_ids(json_string):
+def assign_edge_ids(json_string, keep_existing=False):
 	'''
 		Modifies all ID's of edges to be the names of the nodes that they are attached to.
+		Runs in O(E), see EdgeIdAssigner.
 
 		:param json_string: JSON of graph
+		:param keep_existing: Only assign ID's to edges that do not have one yet
 		:return json_string: JSON of graph having unique ID's for all edges
 	'''
-	
-	ids = []
-	# Creates ID's for all of the edges by creating utilizing the source and target nodes
-	# The edge ID would have the form: source-target
-	for edge in json_string['graph']['edges']:
-		# To make sure int and floats are also accepted as source and target nodes of an edge
-		source_node = str(edge['data']['source'])
-		target_node = str(edge['data']['target'])
-		edge['data']['id'] = source_node + '-' + target_node
-
-		# If the ID has not yet been seen (is unique), simply store the ID 
-		# of that edge as source-target
-		if edge['data']['id'] not in ids:
-			ids.append(edge['data']['id'])
-		else:
-			# Otherwise if there are multiple edges with the same ID,
-			# append a number to the end of the ID so we can distinguish
-			# multiple edges having the same source and target.
-			# This needs to be done because HTML DOM needs unique IDs.
-			counter = 0
-			while edge['data']['id'] in ids:
-				counter += 1
-				edge['data']['id'] = edge['data']['id'] + str(counter)
-			ids.append(edge['data']['id'])
+	edges = json_string['graph']['edges']
+
+	assigner = EdgeIdAssigner()
+
+	# ID's that are kept must not be handed out again
+	if keep_existing:
+		for edge in edges:
+			if 'id' in edge['data']:
+				assigner.reserve(edge['data']['id'])
+
+	for edge in edges:
+		if keep_existing and 'id' in edge['data']:
+			continue
+
+		assigner.assign(edge['data'])
 
 	# Return JSON having all edges containing unique ID's
 	return json_string
 
+class EdgeIdAssigner(object):
+	'''
+		Hands out unique edge ID's of the form source-target, one edge at a time.
+		Seen ID's are kept in a set and every (source, target) pair remembers
+		the last counter it used, so multi-edges never rescan earlier ID's.
+	'''
+	def __init__(self):
+		self.ids = set()
+
+		# Next counter to try for each source-target ID
+		self.counters = {}
+
+	def reserve(self, edge_id):
+		'''
+			Marks an ID as taken.
+		'''
+		self.ids.add(unicode(edge_id))
+
+	def assign(self, edge):
+		'''
+			Sets the ID of an edge.
+
+			:param edge: Data of the edge (modified in place)
+			:return ID: ID of the edge
+		'''
+		# To make sure int and floats are also accepted as source and target nodes of an edge
+		edge_id = unicode(edge['source']) + '-' + unicode(edge['target'])
+
+		# If there are multiple edges with the same ID, append a number to
+		# the end of the ID so we can distinguish multiple edges having the
+		# same source and target.
+		# This needs to be done because HTML DOM needs unique IDs.
+		if edge_id in self.ids:
+			counter = self.counters.get(edge_id, 1)
+			while edge_id + unicode(counter) in self.ids:
+				counter += 1
+			self.counters[edge_id] = counter + 1
+			edge_id = edge_id + unicode(counter)
+
+		self.ids.add(edge_id)
+		edge['id'] = edge_id
+
+		return edge_id
+
+def iter_graph_elements(stream):
+	'''
+		Reads a graph from a file-like object one element at a time with the
+		incremental ijson parser.  Only the element being read is held in memory.
+		The graph should have been validated with validate_json_stream first.
+
+		Yields (section, key, value) tuples in the order they appear in the stream:
+			('nodes', None, node) and ('edges', None, edge) for every node and edge,
+			in their CytoscapeJS form ({"data": {...}}), also for Cytoscape Web graphs
+			('graph', key, value) for other properties of the graph property
+			('top', key, value) for properties next to the graph property (eg metadata)
+			('format', 'cytoscape_web', None) if the graph is an old Cytoscape Web graph
+
+		:param stream: File-like object to read the JSON of graph from
+	'''
+	capture = None
+
+	for prefix, event, value in ijson.parse(stream):
+
+		# Inside a value that is being rebuilt
+		if capture != None:
+			builder.event(event, value)
+
+			if prefix == capture[0] and event in ('end_map', 'end_array'):
+				section, key = capture[1], capture[2]
+				capture = None
+
+				if section == 'cytoscape_web':
+					yield (key, None, {'data': _plain(builder.value)})
+				else:
+					yield (section, key, _plain(builder.value))
+			continue
+
+		if event == 'map_key':
+			continue
+
+		# Nodes and edges
+		if prefix in _ELEMENT_PREFIXES:
+			section, key = _ELEMENT_PREFIXES[prefix]
+
+		# Containers of the nodes and edges
+		elif prefix in _CONTAINER_PREFIXES:
+			if prefix == 'graph.data' and event == 'start_map':
+				yield ('format', 'cytoscape_web', None)
+			continue
+
+		# Other properties of an old graph are dropped by convert_graph
+		elif prefix.startswith('graph.data.'):
+			continue
+
+		# Other properties of the graph
+		elif prefix.startswith('graph.'):
+			section, key = 'graph', prefix[len('graph.'):]
+
+		# Properties next to the graph
+		else:
+			section, key = 'top', prefix
+
+		if event in ('start_map', 'start_array'):
+			capture = (prefix, section, key)
+			builder = ijson.common.ObjectBuilder()
+			builder.event(event, value)
+		elif section == 'cytoscape_web':
+			yield (key, None, {'data': _plain(value)})
+		else:
+			yield (section, key, _plain(value))
+
+# Prefixes (see ijson.parse) of single nodes and edges: (section, key)
+_ELEMENT_PREFIXES = {
+	'graph.nodes.item': ('nodes', None),
+	'graph.edges.item': ('edges', None),
+	'graph.data.nodes.item': ('cytoscape_web', 'nodes'),
+	'graph.data.edges.item': ('cytoscape_web', 'edges')
+}
+
+# Prefixes of the containers of the nodes and edges
+_CONTAINER_PREFIXES = set(['', 'graph', 'graph.nodes', 'graph.edges', 'graph.data', 'graph.data.nodes', 'graph.data.edges'])
+
+def _plain(value):
+	'''
+		Converts the Decimal numbers produced by ijson to floats, so values
+		serialize the same way as values parsed with json.loads.
+	'''
+	if isinstance(value, Decimal):
+		return float(value)
+	elif isinstance(value, dict):
+		for key in value:
+			value[key] = _plain(value[key])
+	elif isinstance(value, list):
+		for i in xrange(len(value)):
+			value[i] = _plain(value[i])
+
+	return value
+
 # This file is a wrapper to communicate with sqlite3 database 
 # that does not need authentication for connection.
 
@@ -321,8 +677,16 @@ def convert_json(original_json):
         }
     '''
 
-    #parse old json data
-    old_json = json.loads(original_json)
+    #parse old json data and convert it
+    return json.dumps(convert_graph(json.loads(original_json)), indent=4)
+
+def convert_graph(old_json):
+    """
+    Same as convert_json, for a graph that is already parsed.
+
+    @param old_json: Parsed Cytoscape Web JSON of graph
+    @return JSON: Parsed CytoscapeJS JSON of graph
+    """
     old_nodes = old_json['graph']['data']['nodes']
     old_edges = old_json['graph']['data']['edges']
 
@@ -342,4 +706,4 @@ def convert_json(original_json):
     new_json['graph']['nodes'] = new_nodes
     new_json['graph']['edges'] = new_edges
 
-    return json.dumps(new_json, indent=4)
+    return new_json
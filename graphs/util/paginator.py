@@ -1,5 +1,10 @@
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from graphs.util import db
+from datetime import datetime
+import base64
+import json
+
+# Datetimes inside cursors keep their microseconds so that cursors are exact
+_CURSOR_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
 
 def pager(request, content, page_size=25, adjacent_pages=3):
     '''
@@ -69,4 +74,77 @@ def pager(request, content, page_size=25, adjacent_pages=3):
     except EmptyPage:
         pass
     
-    return context
\ No newline at end of file
+    return context
+def encode_cursor(key):
+    '''
+        Encodes the key of a graph listing row (see db.keyset_columns)
+        into an opaque string that can be put in a URL.
+
+        key - tuple of column values (strings and datetimes)
+    '''
+    values = []
+    for value in key:
+        if isinstance(value, datetime):
+            values.append({'dt': value.strftime(_CURSOR_DATETIME_FORMAT)})
+        else:
+            values.append(value)
+
+    return base64.urlsafe_b64encode(json.dumps(values))
+
+def decode_cursor(cursor):
+    '''
+        Decodes a cursor created by encode_cursor.
+        Returns None if there is no cursor or it is not valid.
+
+        cursor - string from the query string of the page
+    '''
+    if not cursor:
+        return None
+
+    try:
+        values = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        key = []
+        for value in values:
+            if isinstance(value, dict):
+                key.append(datetime.strptime(value['dt'], _CURSOR_DATETIME_FORMAT))
+            else:
+                key.append(value)
+        return tuple(key)
+    except (TypeError, ValueError, KeyError):
+        #If the cursor is malformed, deliver the first page.
+        return None
+
+def cursor_pager(request, page):
+    '''
+        Adds pagination context variables for a keyset (cursor) paginated
+        listing. Instead of page numbers, the previous and next links carry
+        the key of the first and last row of the page, so every page costs
+        the same no matter how deep the user pages.
+
+        request - request whose query string is carried over to the links
+        page - page returned by db.view_graphs_page (or db.keyset_page)
+    '''
+
+    context = {}
+
+    context['current_page'] = page['graphs']
+    context['has_next'] = page['has_next']
+    context['has_previous'] = page['has_previous']
+
+    if page['has_next'] and page['last_key'] != None:
+        context['next_cursor'] = encode_cursor(page['last_key'])
+
+    if page['has_previous'] and page['first_key'] != None:
+        context['previous_cursor'] = encode_cursor(page['first_key'])
+
+    # Query string of the current listing (search terms, tags, order) without the position
+    query = request.GET.copy()
+    for name in ['cursor', 'direction', 'page']:
+        if name in query:
+            del query[name]
+
+    context['cursor_query'] = query.urlencode()
+    if len(context['cursor_query']) > 0:
+        context['cursor_query'] += '&'
+
+    return context
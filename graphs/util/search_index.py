@@ -0,0 +1,197 @@
+'''
+    Full-text index over node ids, node labels and graph ids.
+
+    The index lives in SQLite FTS5 virtual tables using the trigram tokenizer,
+    which lets SQLite answer LIKE '%term%' queries from the index instead of
+    scanning the whole node table.  If the SQLite library does not support
+    FTS5 trigrams, the index is disabled and searches fall back to the
+    regular node and graph tables.
+'''
+
+from sqlalchemy import MetaData, Table, Column, String, DateTime
+from sqlalchemy.exc import OperationalError
+
+import graphs.models as models
+
+# Virtual tables are not part of the declarative models, so keep them
+# in their own metadata (create_all must never try to create them)
+_search_meta = MetaData()
+
+# One row per node of every graph
+node_search = Table('node_search', _search_meta,
+    Column('node_id', String),
+    Column('label', String),
+    Column('graph_id', String),
+    Column('user_id', String),
+    Column('modified', DateTime)
+)
+
+# One row per graph
+graph_search = Table('graph_search', _search_meta,
+    Column('graph_id', String),
+    Column('user_id', String)
+)
+
+_NODE_SEARCH_DDL = "CREATE VIRTUAL TABLE node_search USING fts5(node_id, label, graph_id, user_id UNINDEXED, modified UNINDEXED, tokenize='trigram')"
+_GRAPH_SEARCH_DDL = "CREATE VIRTUAL TABLE graph_search USING fts5(graph_id, user_id UNINDEXED, tokenize='trigram')"
+
+# Set by create_search_index once the virtual tables are known to exist
+SEARCH_INDEX_ENABLED = False
+
+def create_search_index(engine):
+    '''
+        Create the search tables (if needed) and fill them from the
+        existing node and graph tables the first time they are created.
+
+        :param engine: Engine of the GraphSpace database
+        :return True if the index can be used, False otherwise
+    '''
+    global SEARCH_INDEX_ENABLED
+
+    if engine.dialect.name != 'sqlite':
+        SEARCH_INDEX_ENABLED = False
+        return SEARCH_INDEX_ENABLED
+
+    connection = engine.connect()
+    transaction = connection.begin()
+
+    try:
+        existing = set([row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")])
+
+        if 'node_search' not in existing:
+            connection.execute(_NODE_SEARCH_DDL)
+            connection.execute("INSERT INTO node_search (node_id, label, graph_id, user_id, modified) SELECT node_id, label, graph_id, user_id, modified FROM node")
+
+        if 'graph_search' not in existing:
+            connection.execute(_GRAPH_SEARCH_DDL)
+            connection.execute("INSERT INTO graph_search (graph_id, user_id) SELECT graph_id, user_id FROM graph")
+
+        transaction.commit()
+        SEARCH_INDEX_ENABLED = True
+
+    except OperationalError as ex:
+        # SQLite was built without FTS5 or the trigram tokenizer (needs 3.34+)
+        transaction.rollback()
+        print "Search index disabled: ", ex
+        SEARCH_INDEX_ENABLED = False
+
+    finally:
+        connection.close()
+
+    return SEARCH_INDEX_ENABLED
+
+def node_table():
+    '''
+        Table to run node id/label searches against.  Both tables share
+        the graph_id, node_id, label, modified and user_id columns.
+
+        :return Table: node_search if the index is enabled, node otherwise
+    '''
+    if SEARCH_INDEX_ENABLED:
+        return node_search
+
+    return models.Node.__table__
+
+def graph_ids_like(db_session, pattern):
+    '''
+        Subquery of graph names matching a LIKE pattern.
+
+        :param db_session: Database session
+        :param pattern: LIKE pattern (eg %term%)
+        :return Query: Query selecting matching graph ids
+    '''
+    if SEARCH_INDEX_ENABLED:
+        return db_session.query(graph_search.c.graph_id).filter(graph_search.c.graph_id.like(pattern))
+
+    return db_session.query(models.Graph.graph_id).filter(models.Graph.graph_id.like(pattern))
+
+def index_graph(db_session, user_id, graph_id, node_rows, batch_size=5000):
+    '''
+        Add a graph and its nodes to the search index.  Runs inside the
+        transaction of db_session, nothing is committed here.
+
+        :param db_session: Database session
+        :param user_id: Owner of the graph
+        :param graph_id: Name of the graph
+        :param node_rows: Rows (dictionaries) that were inserted into the node table
+        :param batch_size: Number of rows sent per statement
+    '''
+    if not SEARCH_INDEX_ENABLED:
+        return
+
+    db_session.execute(graph_search.insert(), [{'graph_id': graph_id, 'user_id': user_id}])
+
+    index_nodes(db_session, node_rows, batch_size)
+
+def index_nodes(db_session, node_rows, batch_size=5000):
+    '''
+        Add nodes of a graph that is already indexed (see index_graph) to
+        the search index, eg while a graph is inserted in batches.  Runs
+        inside the transaction of db_session, nothing is committed here.
+
+        :param db_session: Database session
+        :param node_rows: Rows (dictionaries) that were inserted into the node table
+        :param batch_size: Number of rows sent per statement
+    '''
+    if not SEARCH_INDEX_ENABLED:
+        return
+
+    for start in xrange(0, len(node_rows), batch_size):
+        db_session.execute(node_search.insert(), node_rows[start:start + batch_size])
+
+def unindex_graph(db_session, user_id, graph_id):
+    '''
+        Remove a graph and its nodes from the search index.  Runs inside the
+        transaction of db_session, nothing is committed here.
+
+        :param db_session: Database session
+        :param user_id: Owner of the graph
+        :param graph_id: Name of the graph
+    '''
+    if not SEARCH_INDEX_ENABLED:
+        return
+
+    condition, params = _graph_condition('node_search', user_id, graph_id)
+    db_session.execute("DELETE FROM node_search WHERE " + condition, params)
+
+    condition, params = _graph_condition('graph_search', user_id, graph_id)
+    db_session.execute("DELETE FROM graph_search WHERE " + condition, params)
+
+def unindex_nodes(db_session, user_id, graph_id, node_ids, batch_size=5000):
+    '''
+        Remove some nodes of a graph from the search index (eg nodes that
+        were deleted or relabeled by an update).  Runs inside the
+        transaction of db_session, nothing is committed here.
+
+        :param db_session: Database session
+        :param user_id: Owner of the graph
+        :param graph_id: Name of the graph
+        :param node_ids: ID's of the nodes to remove
+        :param batch_size: Number of rows sent per statement
+    '''
+    if not SEARCH_INDEX_ENABLED or len(node_ids) == 0:
+        return
+
+    node_ids = set(node_ids)
+
+    # Look up the rows of the graph once, then delete them by rowid
+    condition, params = _graph_condition('node_search', user_id, graph_id)
+    rows = db_session.execute("SELECT rowid, node_id FROM node_search WHERE " + condition, params)
+    rowids = [{'b_rowid': row[0]} for row in rows if row[1] in node_ids]
+
+    for start in xrange(0, len(rowids), batch_size):
+        db_session.execute("DELETE FROM node_search WHERE rowid = :b_rowid", rowids[start:start + batch_size])
+
+def _graph_condition(table_name, user_id, graph_id):
+    '''
+        WHERE condition (and its parameters) selecting the rows of a graph in a search table.
+    '''
+    params = {'graph_id': graph_id, 'user_id': user_id}
+    condition = "graph_id = :graph_id AND user_id = :user_id"
+
+    # Trigram queries need at least 3 characters, shorter names are matched by scanning
+    if len(graph_id) >= 3:
+        params['match'] = 'graph_id : "' + graph_id.replace('"', '""') + '"'
+        condition = table_name + " MATCH :match AND " + condition
+
+    return condition, params
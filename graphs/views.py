@@ -6,8 +6,10 @@ from django.templatetags.static import static
 
 from django.shortcuts import render_to_response
 
-from graphs.util.paginator import pager
+from graphs.util.paginator import pager, cursor_pager, decode_cursor
 from graphs.util import db
+from graphs.util import jobs
+from graphs.util import http_cache
 from graphs.auth.login import login
 from forms import LoginForm, SearchForm, RegisterForm
 from django.conf import settings
@@ -15,7 +17,6 @@ from django.conf import settings
 import json
 import bcrypt
 import os
-import operator
 
 from operator import itemgetter
 from itertools import groupby
@@ -173,31 +174,35 @@ def _graphs_page(request, view_type):
     elif 'full_search' in request.GET:
         search_type = 'full_search'
 
+    # Position in the listing (keyset pagination, see graphs.util.paginator.cursor_pager)
+    cursor = decode_cursor(request.GET.get('cursor'))
+    direction = request.GET.get('direction') or 'next'
+
     # Set all information abouut graphs to the front-end
     # Information of graphs consists of all data for an individual graph
     # as well as any search queries and tag queries being performed
-    context = db.get_graphs_for_view_type(context, view_type, uid, request)
-
-    # Holds the amount of times a tag appears for a graph 
-    all_tags = {}
+    context = db.get_graphs_for_view_type(context, view_type, uid, request, cursor, direction)
 
     # Goes through all the graphs that are currently on a page
     if context['graph_list'] != None:
-        pager_context = pager(request, context['graph_list'])
-        if type(pager_context) is dict:
-            context.update(pager_context)
-            for i in xrange(len(context['current_page'].object_list)):
-                graph = list(context['current_page'][i])
+        context.update(cursor_pager(request, context['graph_page']))
 
-                graph_tags = []
-                if request.GET.get(search_type):
-                    graph_tags = db.get_all_tags_for_graph(graph[0], graph[5])
-                    graph[1] = graph_tags
-                else:
-                    graph_tags = db.get_all_tags_for_graph(graph[0], graph[2])
-                    graph.insert(1, graph_tags)
+        # Owner of the graph is in a different column for search results
+        owner_column = 5 if request.GET.get(search_type) else 2
 
-                context['current_page'].object_list[i] = graph
+        # Read the tags of every graph on the page at once
+        tags_by_graph = db.get_tags_for_graphs([(graph[0], graph[owner_column]) for graph in context['current_page']])
+
+        for i in xrange(len(context['current_page'])):
+            graph = list(context['current_page'][i])
+
+            graph_tags = tags_by_graph[(graph[0], graph[owner_column])]
+            if request.GET.get(search_type):
+                graph[1] = graph_tags
+            else:
+                graph.insert(1, graph_tags)
+
+            context['current_page'][i] = graph
 
     # reset the search form
     context['search_form'] = SearchForm(placeholder='Search...')
@@ -210,33 +215,8 @@ def _graphs_page(request, view_type):
     if len(context['graph_list']) == 0:
         context = constructGraphMessage(context, view_type, request.GET.get(search_type), request_tags)
 
-    recent_graphs = context['graph_list']
-
-    recent_graphs.sort(key=lambda r: r[2], reverse=True)
-
-    if len(recent_graphs) > 250:
-        recent_graphs = recent_graphs[:250]
-
-    for graph in recent_graphs:
-
-        if request.GET.get(search_type):
-            graph_tags = db.get_all_tags_for_graph(graph[0], graph[5])
-        else:
-            graph_tags = db.get_all_tags_for_graph(graph[0], graph[2])
-
-        for tag in graph_tags:
-            if len(tag) > 0:
-                if tag in all_tags:
-                    all_tags[tag] += 1
-                else:
-                    all_tags[tag] = 1
-
-    sorted_tags = sorted(all_tags.items(), key=operator.itemgetter(1), reverse = True)[:10]
-
-    all_tags_refined = [i[0] for i in sorted_tags]
-
     # Populates tags search bar with most used tags of last 250 graphs
-    context['all_tags'] = all_tags_refined #list(set(all_tags))[:10]
+    # (context['all_tags'] is set by db.get_graphs_for_view_type)
 
     # indicator to include css/js footer for side menu support etc.
     context['footer'] = True
@@ -327,7 +307,7 @@ def view_graph(request, uid, gid):
     # or if he owns this graph, then allow him to view it
     # otherwise do not allow it
     if db.is_public_graph(uid, gid) or 'Public_User_' in uid:
-        graph_to_view = db.get_all_info_for_graph(uid, gid)
+        graph_to_view = db.get_graph_for_view(uid, gid)
     elif request.session['uid'] == None:
         context['Error'] = "You are not authorized to view this graph, create an account and contact graph's owner for permission to see this graph."
         return render(request, 'graphs/error.html', context)
@@ -337,7 +317,7 @@ def view_graph(request, uid, gid):
 
         # if user is owner of graph or a member of group that shares graph
         if request.session['uid'] == uid or user_is_member == True:
-            graph_info = db.getGraphInfo(uid, gid)
+            graph_info = db.get_graph_for_view(uid, gid)
             if graph_info != None:
                 graph_to_view =  graph_info
             else: 
@@ -352,12 +332,16 @@ def view_graph(request, uid, gid):
     if context['Error']:
         return render(request, 'graphs/error.html', context)
 
-    # Convert JSON for CytoscapeJS, if needed
-    context['graph'] = db.retrieve_cytoscape_json(graph_to_view[0])
+    if graph_to_view == None:
+        context['Error'] = "Graph: " + gid + " does not exist for " + uid + ".  Upload a graph with this name into GraphSpace in order to see it."
+        return render(request, 'graphs/error.html', context)
+
+    # JSON for CytoscapeJS (verified and converted by db.get_graph_for_view)
+    context['graph'] = graph_to_view['json']
     context['draw_graph'] = True
 
     # Get all the groups that are shared for this graph
-    shared_groups = db.get_all_groups_for_this_graph(uid, graph_to_view[2])
+    shared_groups = db.get_all_groups_for_this_graph(uid, graph_to_view['graph_id'])
 
     format_shared_groups = []
     for shared_group in shared_groups:
@@ -365,42 +349,40 @@ def view_graph(request, uid, gid):
 
     context['shared_groups'] = format_shared_groups
 
-    if graph_to_view[1] == 1:
+    if graph_to_view['public'] == 1:
         context['shared'] = 'Publicly Shared'
     else:
         context['shared'] = 'Privately Shared'
 
-    # TODO: This will eventually get deleted
-    json_data = json.loads(context['graph'])
     #add sidebar information to the context for display
-    if 'description' in json_data['metadata']:
-        context['description'] = json_data['metadata']['description'] + "</table></html>"
-    else:
-        context['description'] = ""
+    context['description'] = graph_to_view['description']
 
     # id of the owner of this graph
     context['owner'] = uid
 
-    # If the metadata has either a name or a title (backward-compatible)
-    # display it on the top of the graph
-    if 'name' in json_data['metadata']:
-        context['graph_name'] = json_data['metadata']['name']
-    elif 'title' in json_data['metadata']:
-        context['graph_name'] = json_data['metadata']['title']
-    else:
-        context['graph_name'] = ''
+    # Name or title from the metadata, displayed on the top of the graph
+    context['graph_name'] = graph_to_view['graph_name']
 
     # graph id
     context['graph_id'] = gid
 
-    if len(json_data['graph']['edges']) > 0 and 'k' in json_data['graph']['edges'][0]['data']:
+    if graph_to_view['filters']:
         context['filters'] = True
 
     # redirect if the user wishes to view the json data
     if request.method == "GET" and 'view_json' in request.GET:
         return HttpResponseRedirect("/json/%s/%s" % (uid, gid))
 
-    return render(request, 'graphs/view_graph.html', context)
+    page = render(request, 'graphs/view_graph.html', context)
+
+    # The page depends on the user viewing it (login, layouts), so its ETag is derived from
+    # the rendered page. Rendering is cheap (the drawing is cached), sending the graph is not
+    etag = http_cache.content_etag('view_graph', page.content)
+    response = http_cache.not_modified(request, etag)
+    if response != None:
+        return response
+
+    return http_cache.compressed_response(request, etag, page.content, page['Content-Type'], cache=False)
 
 def view_json(request, uid, gid):
     '''
@@ -421,7 +403,7 @@ def view_json(request, uid, gid):
     # or if he owns this graph, then allow him to view it's JSON
     # otherwise do not allow it
     if db.is_public_graph(uid, gid) or 'Public_User_' in uid:
-        graph_to_view = db.get_all_info_for_graph(uid, gid)
+        pass
     elif request.session['uid'] == None:
         context['Error'] = "You are not authorized to view JSON for this graph, create an account and contact graph's owner for permission to see this."
         return render(request, 'graphs/error.html', context)
@@ -430,17 +412,22 @@ def view_json(request, uid, gid):
         user_is_member = db.can_see_shared_graph(context['uid'], uid, gid)
 
         # if user is owner of graph or a member of group that shares graph
-        if request.session['uid'] == uid or user_is_member == True:
-            graph_info = db.getGraphInfo(uid, gid)
-            if graph_info != None:
-                graph_to_view =  graph_info
-            else:
-                context['Error'] = "Graph: " + gid + " does not exist for " + uid + ".  Upload a graph with this name into GraphSpace in order to see it's JSON."
-                return render(request, 'graphs/error.html', context)
-        else:
+        if request.session['uid'] != uid and user_is_member != True:
             context['Error'] = "You are not authorized to view JSON for this graph, please contact graph's owner for permission."
             return render(request, 'graphs/error.html', context)
 
+    # Version of the graph, read without reading its JSON
+    version = db.get_graph_version(uid, gid)
+
+    if version == None:
+        context['Error'] = "Graph: " + gid + " does not exist for " + uid + ".  Upload a graph with this name into GraphSpace in order to see it's JSON."
+        return render(request, 'graphs/error.html', context)
+
+    # Answer with 304 Not Modified if the client has this version, or with the cached page
+    etag = http_cache.graph_etag('view_json', uid, gid, version)
+    response = http_cache.cached_response(request, etag)
+    if response != None:
+        return response
 
     graph_to_view = db.get_graph_json(uid, gid)
 
@@ -457,11 +444,9 @@ def view_json(request, uid, gid):
     # graph id
     context['graph_id'] = gid
 
-    # If it is http request, render it in the specific page, otherwise just return the JSON
-    if request:
-        return render(request, 'graphs/view_json.html', context)
-    else:
-        return HttpResponse(context['json'])
+    # The page only shows the JSON, so it is the same for every user that may see it
+    page = render(request, 'graphs/view_json.html', context)
+    return http_cache.compressed_response(request, etag, page.content, page['Content-Type'])
 
 def groups(request):
     ''' 
@@ -609,8 +594,13 @@ def graphs_in_group(request, group_owner, group_id):
                 context['Error'] = "You need to be a member of a group to see its contents!  Please contact group's owner to add you to the group!"
                 return render(request, 'graphs/error.html', context)
 
-            # Get all graph information that belong to this group
-            graph_data = db.get_all_graphs_for_group(context['uid'], group_owner, group_id, request)
+            # Position in the listing (keyset pagination, see graphs.util.paginator.cursor_pager)
+            cursor = decode_cursor(request.GET.get('cursor'))
+            direction = request.GET.get('direction') or 'next'
+
+            # Get the page of graph information that belong to this group
+            graph_page = db.get_all_graphs_for_group(context['uid'], group_owner, group_id, request, cursor, direction)
+            graph_data = graph_page['graphs']
 
             search_type = None
             context['search_result'] = False
@@ -664,22 +654,26 @@ def graphs_in_group(request, group_owner, group_id):
             all_tags = []
 
             # Goes through all the graphs that are currently on a page
-            pager_context = pager(request, graph_data)
-            if type(pager_context) is dict:
-                context.update(pager_context)
-                for i in xrange(len(context['current_page'].object_list)):
+            if len(graph_data) != 0:
+                context.update(cursor_pager(request, graph_page))
+
+                # Owner of the graph is in a different column for search results
+                owner_column = 5 if request.GET.get(search_type) else 2
+
+                # Read the tags of every graph on the page at once
+                tags_by_graph = db.get_tags_for_graphs([(graph[0], graph[owner_column]) for graph in context['current_page']])
+
+                for i in xrange(len(context['current_page'])):
                     graph = list(context['current_page'][i])
 
-                    graph_tags = []
+                    graph_tags = tags_by_graph[(graph[0], graph[owner_column])]
                     if request.GET.get(search_type):
-                        graph_tags = db.get_all_tags_for_graph(graph[0], graph[5])
                         graph[1] = graph_tags
                     else:
-                        graph_tags = db.get_all_tags_for_graph(graph[0], graph[2])
                         graph.insert(1, graph_tags)
                     all_tags += graph_tags
 
-                    context['current_page'].object_list[i] = graph
+                    context['current_page'][i] = graph
 
             context['all_tags'] = list(set(all_tags))
             # indicator to include css/js footer for side menu support etc.
@@ -1274,7 +1268,7 @@ def upload_graph(request, user_id, graphname):
 
         :param request: Incoming HTTP POST Request containing:
 
-        {"username": <username>,"password": <password>}
+        {"username": <username>,"password": <password>, "replace": <1 to update the graph if it already exists (optional)>}
 
         :param user_id: Id of the user
         :param graphname: Name of the graph
@@ -1290,7 +1284,20 @@ def upload_graph(request, user_id, graphname):
         if db.get_valid_user(user_id, request.POST['password']) == None:
             return HttpResponse(json.dumps(db.userNotFoundError(), indent=4, separators=(',', ': ')), content_type="application/json")
 
-        graph_errors = db.insert_graph(user_id, graphname, request.FILES['graphname'].read())
+        # Clients that do not know whether the graph exists yet can ask for it to be replaced,
+        # instead of checking first (one request per graph)
+        if request.POST.get('replace', '').lower() in ('1', 'true', 'yes') and db.get_graph(user_id, graphname) != None:
+            return update_graph(request, user_id, graphname)
+
+        # Big graphs can be inserted by a background worker
+        if run_as_job(request):
+            if db.get_graph(user_id, graphname) != None:
+                return HttpResponse(json.dumps(db.throwError(400, 'Graph ' + graphname + ' already exists for ' + user_id + '!'), indent=4, separators=(',', ': ')), content_type="application/json")
+            job_id = jobs.enqueue(user_id, 'upload_graph', {'graph_id': graphname}, request.FILES['graphname'])
+            return job_queued_response(job_id, "Graph is being inserted into GraphSpace")
+
+        # The uploaded file is read in chunks while it is validated and inserted
+        graph_errors = db.insert_graph_stream(user_id, graphname, request.FILES['graphname'])
         if graph_errors != None:
             return HttpResponse(json.dumps(db.throwError(400, graph_errors), indent=4, separators=(',', ': ')), content_type="application/json")
         else:
@@ -1318,6 +1325,13 @@ def update_graph(request, user_id, graphname):
         if db.get_valid_user(user_id, request.POST['password']) == None:
             return HttpResponse(json.dumps(db.userNotFoundError(), indent=4, separators=(',', ': ')), content_type="application/json")
 
+        # Big graphs can be updated by a background worker
+        if run_as_job(request):
+            if db.get_graph(user_id, graphname) == None:
+                return HttpResponse(json.dumps(db.throwError(404, "Can't update " + graphname + " because it does not exist for " + user_id), indent=4, separators=(',', ': ')), content_type="application/json")
+            job_id = jobs.enqueue(user_id, 'update_graph', {'graph_id': graphname}, request.FILES['graphname'])
+            return job_queued_response(job_id, "Graph is being updated")
+
         graph_errors = db.update_graph(user_id, graphname, request.FILES['graphname'].read())
         if graph_errors != None:
             return HttpResponse(json.dumps(db.throwError(404, graph_errors), indent=4, separators=(',', ': ')), content_type="application/json")
@@ -1336,7 +1350,9 @@ def retrieve_graph(request, user_id, graphname):
         :param user_id: Id of the user
         :param graphname: Name of the graph
         
-        :return response: JSON Response: {"Graph|Error": <message>}
+        :return response: JSON of the graph (compressed if the client accepts gzip or deflate, with an ETag:
+            requests whose If-None-Match has the ETag of the current version get 304 Not Modified),
+            or JSON Response: {"Error": <message>}
     '''
     if request.method == 'POST':
 
@@ -1346,9 +1362,20 @@ def retrieve_graph(request, user_id, graphname):
         if db.get_valid_user(user_id, request.POST['password']) == None:
             return HttpResponse(json.dumps(db.userNotFoundError(), indent=4, separators=(',', ': ')), content_type="application/json")
 
+        # Version of the graph, read without reading its JSON
+        version = db.get_graph_version(user_id, graphname)
+        if version == None:
+            return HttpResponse(json.dumps(db.throwError(404, "No Such Graph Exists!"), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        # Answer with 304 Not Modified if the client has this version (If-None-Match), or with the cached JSON
+        etag = http_cache.graph_etag('json', user_id, graphname, version)
+        response = http_cache.cached_response(request, etag)
+        if response != None:
+            return response
+
         jsonData = db.get_graph_json(user_id, graphname)
         if jsonData != None:
-            return HttpResponse(jsonData)
+            return http_cache.compressed_response(request, etag, jsonData, settings.DEFAULT_CONTENT_TYPE + '; charset=' + settings.DEFAULT_CHARSET)
         else:
             return HttpResponse(json.dumps(db.throwError(404, "No Such Graph Exists!"), indent=4, separators=(',', ': ')), content_type="application/json")
 
@@ -1726,6 +1753,10 @@ def make_all_graphs_for_tag_public(request, username, tagname):
             return HttpResponse(json.dumps(db.userNotFoundError(), indent=4, separators=(',', ': ')), content_type="application/json")
 
         if username == request.POST['username']:
+            if run_as_job(request):
+                job_id = jobs.enqueue(username, 'change_visibility_for_tag', {'tag': tagname, 'public': 1})
+                return job_queued_response(job_id, "Graphs with tag are being made public")
+
             error = db.change_graph_visibility_for_tag(1, tagname, username)
             if error == None:
                 return HttpResponse(json.dumps(db.sendMessage(200, "Graphs with tag have been made public"), indent=4, separators=(',', ': ')), content_type="application/json")
@@ -1751,6 +1782,10 @@ def make_all_graphs_for_tag_private(request, username, tagname):
             return HttpResponse(json.dumps(db.userNotFoundError(), indent=4, separators=(',', ': ')), content_type="application/json")
 
         if username == request.POST['username']:
+            if run_as_job(request):
+                job_id = jobs.enqueue(username, 'change_visibility_for_tag', {'tag': tagname, 'public': 0})
+                return job_queued_response(job_id, "Graphs with tag are being made private")
+
             error = db.change_graph_visibility_for_tag(0, tagname, username)
             if error == None:
                 return HttpResponse(json.dumps(db.sendMessage(200, "Graphs with tag have been made private"), indent=4, separators=(',', ': ')), content_type="application/json")
@@ -1776,14 +1811,216 @@ def delete_all_graphs_for_tag(request, username, tagname):
             return HttpResponse(json.dumps(db.userNotFoundError(), indent=4, separators=(',', ': ')), content_type="application/json")
 
         if username == request.POST['username']:
+            if run_as_job(request):
+                job_id = jobs.enqueue(username, 'delete_graphs_for_tag', {'tag': tagname})
+                return job_queued_response(job_id, "Graphs with tag are being deleted")
+
             db.delete_all_graphs_for_tag(tagname, username)
             return HttpResponse(json.dumps(db.sendMessage(200, "Graphs with tag have been deleted"), indent=4, separators=(',', ': ')), content_type="application/json")
         else:
             return HttpResponse(json.dumps(db.throwError(400, "The tag owner and the person making this request are not the same person!"), indent=4, separators=(',', ': ')), content_type="application/json")
 
+def job_status(request, job_id):
+    '''
+        Reports the status of a background job.
+
+        :param HTTP POST Request containing
+        {"username": <user_id>, "password": <password>}
+        :param job_id: Id of the job (returned when the job was queued)
+
+        :return JSON: {"StatusCode": 200, "Message": "<status>", "Job": {"job_id", "job_type", "status",
+            "items_done", "items_total", "items_per_second", "result", "error", "created", "started", "finished"}}
+    '''
+
+    if request.method == 'POST':
+
+        if db.get_valid_user(request.POST['username'], request.POST['password']) == None:
+            return HttpResponse(json.dumps(db.userNotFoundError(), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        job = jobs.get_job(int(job_id))
+
+        # Users only see their own jobs
+        if job == None or job['user_id'] != request.POST['username']:
+            return HttpResponse(json.dumps(db.throwError(404, "Job " + job_id + " does not exist for " + request.POST['username']), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        response = db.sendMessage(200, job['status'])
+        response['Job'] = job
+        return HttpResponse(json.dumps(response, indent=4, separators=(',', ': ')), content_type="application/json")
+
+
+def add_api_token(request, user_id):
+    '''
+        Creates an API token, which can be sent as the password of any REST API call.
+        Checking a token is much faster than checking a password.
+
+        :param request: Incoming HTTP POST Request containing:
+        {"username": <username>,"password": <password>, "description": <what the token is for (optional)>}
+        :param user_id: Id of the user
+
+        :return JSON: {"StatusCode": 201, "Message": <message>, "Token": <token>}
+    '''
+    if request.method == 'POST':
+
+        if request.POST['username'] != user_id:
+            return HttpResponse(json.dumps(db.usernameMismatchError(), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        # Tokens can only be created with the password, so a leaked token can not be used to create more
+        if db.get_valid_user(user_id, request.POST['password'], allow_token=False) == None:
+            return HttpResponse(json.dumps(db.userNotFoundError(), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        token = db.create_api_token(user_id, request.POST.get('description'))
+
+        # The token is not stored, this is the only time it can be seen
+        response = db.sendMessage(201, "Created API token for " + user_id + ". Keep it safe, it can not be shown again.")
+        response['Token'] = token
+        return HttpResponse(json.dumps(response, indent=4, separators=(',', ': ')), content_type="application/json")
+
+def delete_api_token(request, user_id):
+    '''
+        Revokes an API token, or every API token of the user.
+
+        :param request: Incoming HTTP POST Request containing:
+        {"username": <username>,"password": <password or token>, "token": <token to revoke (all tokens if it is left out)>}
+        :param user_id: Id of the user
+
+        :return JSON: {"StatusCode": 200, "Message": <message>}
+    '''
+    if request.method == 'POST':
+
+        if request.POST['username'] != user_id:
+            return HttpResponse(json.dumps(db.usernameMismatchError(), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        if db.get_valid_user(user_id, request.POST['password']) == None:
+            return HttpResponse(json.dumps(db.userNotFoundError(), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        revoked = db.delete_api_tokens(user_id, request.POST.get('token'))
+
+        if revoked == 0 and 'token' in request.POST:
+            return HttpResponse(json.dumps(db.throwError(404, "No such API token exists for " + user_id + "."), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        return HttpResponse(json.dumps(db.sendMessage(200, "Revoked " + str(revoked) + " API token(s) of " + user_id + "."), indent=4, separators=(',', ': ')), content_type="application/json")
+
+
+def batch_graph_operations(request, user_id):
+    '''
+        Applies a list of operations to many graphs of a user in one request.
+        The user is authenticated once, and every operation reads or updates
+        all of its graphs with a few set-based queries (see db.get_graphs_json).
+
+        :param request: Incoming HTTP POST Request containing:
+        {"username": <username>,"password": <password>, "operations": <JSON list of operations>}
+
+        where every operation is:
+        {"operation": "get|exists|delete|make_public|make_private|share", "graph_ids": [<graph id>, ...],
+         "group_owner": <owner of group (share only)>, "group_id": <id of group (share only)>}
+
+        :param user_id: Id of the user
+
+        :return JSON: {"StatusCode": 200, "Message": <message>, "Results": [{"operation": <operation>,
+            "graphs": {<graph id>: <JSON of graph or null (get), true|false (others)>}, "Error": <message (optional)>}]}
+    '''
+    if request.method == 'POST':
+
+        if request.POST['username'] != user_id:
+            return HttpResponse(json.dumps(db.usernameMismatchError(), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        if db.get_valid_user(user_id, request.POST['password']) == None:
+            return HttpResponse(json.dumps(db.userNotFoundError(), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        try:
+            operations = json.loads(request.POST['operations'])
+        except (KeyError, ValueError):
+            return HttpResponse(json.dumps(db.throwError(400, "operations must be a JSON list of operations!"), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        # Check every operation before applying any of them
+        error = check_batch_operations(operations)
+        if error != None:
+            return HttpResponse(json.dumps(db.throwError(400, error), indent=4, separators=(',', ': ')), content_type="application/json")
+
+        results = [apply_batch_operation(user_id, operation) for operation in operations]
+
+        response = db.sendMessage(200, "Applied " + str(len(operations)) + " operation(s) to graphs owned by " + user_id + ".")
+        response['Results'] = results
+
+        # No indentation, the response can hold the JSON of thousands of graphs
+        return HttpResponse(json.dumps(response, separators=(',', ':')), content_type="application/json")
+
 
 # Private Utility methods used throughout views.py
 
+# Operations of batch_graph_operations
+BATCH_OPERATIONS = ('get', 'exists', 'delete', 'make_public', 'make_private', 'share')
+
+def check_batch_operations(operations):
+    '''
+        Error in the operations sent to batch_graph_operations, or None if they are all valid.
+    '''
+    if not isinstance(operations, list):
+        return "operations must be a JSON list of operations!"
+
+    for i, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('operation') not in BATCH_OPERATIONS:
+            return "Operation " + str(i) + " must have an operation: " + ', '.join(BATCH_OPERATIONS) + "."
+
+        graph_ids = operation.get('graph_ids')
+        if not isinstance(graph_ids, list) or not all([isinstance(graph_id, basestring) for graph_id in graph_ids]):
+            return "Operation " + str(i) + " must have a list of graph_ids."
+
+        if operation['operation'] == 'share' and not (isinstance(operation.get('group_owner'), basestring) and isinstance(operation.get('group_id'), basestring)):
+            return "Operation " + str(i) + " must have the group_owner and group_id of the group to share with."
+
+    return None
+
+def apply_batch_operation(user_id, operation):
+    '''
+        Applies one operation of batch_graph_operations to all of its graphs.
+
+        :param user_id: Owner of the graphs
+        :param operation: Operation (see batch_graph_operations)
+        :return Result: {"operation": <operation>, "graphs": {<graph id>: <result>}, "Error": <message (optional)>}
+    '''
+    name = operation['operation']
+    graph_ids = operation['graph_ids']
+    result = {'operation': name}
+
+    if name == 'get':
+        graphs_json = db.get_graphs_json(user_id, graph_ids)
+        result['graphs'] = dict([(graph_id, json.loads(graphs_json[graph_id]) if graph_id in graphs_json else None) for graph_id in graph_ids])
+        return result
+
+    if name == 'exists':
+        done = db.find_existing_graphs(user_id, graph_ids)
+    elif name == 'delete':
+        done = db.find_existing_graphs(user_id, graph_ids)
+        db.delete_graphs([(user_id, graph_id) for graph_id in done])
+    elif name == 'make_public':
+        done = db.change_graphs_visibility(1, user_id, graph_ids)
+    elif name == 'make_private':
+        done = db.change_graphs_visibility(0, user_id, graph_ids)
+    else:
+        error, done = db.share_graphs_with_group(user_id, graph_ids, operation['group_id'], operation['group_owner'])
+        if error != None:
+            result['Error'] = error
+
+    # Graphs that do not exist are reported as false
+    result['graphs'] = dict([(graph_id, graph_id in done) for graph_id in graph_ids])
+    return result
+
+def run_as_job(request):
+    '''
+        Should the request be handled by a background worker? (POST parameter async=1)
+    '''
+    return request.POST.get('async', '').lower() in ('1', 'true', 'yes')
+
+def job_queued_response(job_id, message):
+    '''
+        Response to a request that was queued as a background job.
+        The job can be followed through /api/jobs/<job_id>/.
+    '''
+    response = db.sendMessage(202, message)
+    response['JobId'] = job_id
+    return HttpResponse(json.dumps(response, indent=4, separators=(',', ': ')), content_type="application/json")
+
 def handler_404(request):
     if request.method == 'POST':
         return HttpResponse(json.dumps(db.throwError(404, "REST API endpoint does not exist!")), content_type="application/json")
@@ -33,6 +33,38 @@ DB_FULL_PATH = os.path.join(BASE_DIR, 'graphspace.db')
 URL_PATH = "http://localhost:8000/"
 DATABASE_LOCATION = 'sqlite:///graphspace.db'
 
+## Number of rows sent per executemany statement when inserting the nodes, edges and tags of a graph
+BULK_INSERT_BATCH_SIZE = 5000
+
+## Format the JSON of graphs is stored in: 'text', 'zlib' or 'zstd' (needs the zstandard package)
+## Existing graphs are rewritten with: python manage.py compress_graph_json
+GRAPH_JSON_STORAGE_FORMAT = 'zlib'
+
+## Bytes of memory each server process may use to cache graphs that are ready to be drawn
+GRAPH_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+## Bytes of memory each server process may use to cache compressed graph JSON responses
+RESPONSE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+## Directory where uploads that are processed in the background are kept until a worker picks them up
+## Workers are started with: python manage.py run_job_workers
+JOB_SPOOL_DIR = os.path.join(BASE_DIR, 'job_spool')
+
+## Seconds an idle job worker waits before looking for new jobs
+JOB_POLL_INTERVAL = 1
+
+## Seconds after which a job that is still running is considered lost (its worker was killed or hangs) and marked as failed
+JOB_TIMEOUT = 24 * 60 * 60
+
+## Seconds a username/password pair that passed the (slow) bcrypt check is accepted without checking it again
+## REST clients can avoid the check altogether with API tokens (api/users/<user_id>/tokens/add/)
+CREDENTIAL_CACHE_TTL = 300
+
+## Size of the SQLAlchemy connection pool shared by all request threads
+DATABASE_POOL_SIZE = 10
+DATABASE_POOL_MAX_OVERFLOW = 20
+DATABASE_POOL_RECYCLE = 3600
+
 # Application definition
 
 INSTALLED_APPS = (
@@ -45,7 +77,8 @@ INSTALLED_APPS = (
 
 MIDDLEWARE_CLASSES = (
     'django.contrib.sessions.middleware.SessionMiddleware',
-    'django.middleware.common.CommonMiddleware'
+    'django.middleware.common.CommonMiddleware',
+    'graphs.middleware.DatabaseSessionMiddleware'
 )
 
 ROOT_URLCONF = 'graphspace.urls'
@@ -14,7 +14,9 @@
 ## module implements  functions that call  the REST API for  posting a
 ## graph, deleting  a graph, and sharing  a graph with a  group. These
 ## functions support  a subset of the  allowed Cytoscape.js attributes
-## and the REST API calls.
+## and the REST API calls.  The REST API is called in process by
+## GraphSpaceClient, which keeps its connections to GraphSpace open
+## between calls, so scripts posting many graphs can reuse one client.
 ##
 ## The main() method  contains two examples of  creating, posting, and
 ## sharing graphs.  TODO: these should be moved to their own help page
@@ -25,10 +27,17 @@
 ## Import Statements
 import sys
 import os
-import subprocess
 import re
 import urllib
+import urlparse
+import httplib
+import socket
+import threading
+import Queue
+import uuid
 import json
+import time
+import multiprocessing
 from optparse import OptionParser
 import networkx as nx
 from networkx.readwrite import json_graph
@@ -598,6 +607,162 @@ def get_edge_attribute(G,source,target,attr):
     else:
         return None
 
+####################################################################
+### BULK STYLING FUNCTIONS #########################################
+## Style many nodes or edges in one call.  Every style is given as a
+## single value (for all nodes/edges), a dictionary (node id or
+## (source,target) -> value, for some of them), or a list/NumPy array
+## of values in the same order as the nodes/edges.  Each distinct value
+## is validated once, instead of once per node or edge.
+
+## style -> (node attributes it sets, allowed values or None)
+NODE_STYLES = {
+    'label': (('content',),None),
+    'wrap': (('text_wrap',),ALLOWED_TEXT_WRAP),
+    'shape': (('shape',),ALLOWED_NODE_SHAPES),
+    'color': (('background_color',),None),
+    'height': (('height',),None),
+    'width': (('width',),None),
+    'popup': (('popup',),None),
+    'k': (('k',),None),
+    'border_color': (('border_color',),None),
+    'border_width': (('border_width',),None),
+    'border_style': (('border_style',),ALLOWED_NODE_BORDER_STYLES),
+}
+
+## style -> (edge attributes it sets, allowed values or None)
+EDGE_STYLES = {
+    'color': (('line_color','target_arrow_color'),None),
+    'width': (('width',),None),
+    'arrow_shape': (('target_arrow_shape',),ALLOWED_ARROW_SHAPES),
+    'line_style': (('line_style',),ALLOWED_EDGE_STYLES),
+    'popup': (('popup',),None),
+    'k': (('k',),None),
+}
+
+def style_nodes(G,nodes=None,**styles):
+    '''
+    Sets styles of many nodes in graph "G" at once, eg
+    style_nodes(G,color='#ACFA58',shape=shapes_by_node,height=numpy_array).
+
+    :param G: NetworkX object.
+    :param nodes: list of node ids that lists and arrays of values are in the order of. Default = G.nodes().
+    :param styles: style=value for any style in NODE_STYLES (label, wrap, shape, color, height,
+    width, popup, k, border_color, border_width, border_style).  As with add_node_label,
+    labelled nodes also get wrap = 'wrap' unless a wrap style is given.
+    :raise exception: if a value is not allowed for its style (eg an unknown shape),
+    or a list of values does not have a value for every node.
+    '''
+    if nodes is None:
+        nodes = G.nodes()
+    else:
+        nodes = list(nodes)
+    node_data = G.node
+
+    for style in styles:
+        if style not in NODE_STYLES:
+            raise Exception('"%s" is not a node style. Node styles are: %s.' % (style,sorted(NODE_STYLES)))
+
+    ## validate every style before changing any node
+    resolved = [(style,NODE_STYLES[style][0],_style_values('Node',style,value,nodes,NODE_STYLES[style][1])) for style,value in styles.items()]
+
+    for style,attributes,pairs in resolved:
+        for attribute in attributes:
+            for node_id,node_value in pairs:
+                node_data[node_id][attribute] = node_value
+
+        if style == 'label' and 'wrap' not in styles:
+            for node_id,node_value in pairs:
+                node_data[node_id]['text_wrap'] = 'wrap'
+
+def style_edges(G,edges=None,directed=None,**styles):
+    '''
+    Sets styles of many edges in graph "G" at once, eg
+    style_edges(G,color=colors_by_edge,width=numpy_array,directed=True).
+
+    :param G: NetworkX object.
+    :param edges: list of (source,target) pairs that lists and arrays of values are in the order of. Default = G.edges().
+    :param directed: bool, or values as for styles -- if True, draw the edge as directed (see add_edge_directionality).
+    The arrow_shape style overrides the arrow this sets.  Optional.
+    :param styles: style=value for any style in EDGE_STYLES (color, width, arrow_shape, line_style, popup, k).
+    :raise exception: if a value is not allowed for its style (eg an unknown arrow shape),
+    a list of values does not have a value for every edge, or an edge has a k value
+    but its nodes do not have smaller ones (see add_edge_k).
+    '''
+    if edges is None:
+        edges = G.edges()
+    else:
+        edges = list(edges)
+    edge_data = G.edge
+
+    for style in styles:
+        if style not in EDGE_STYLES:
+            raise Exception('"%s" is not an edge style. Edge styles are: %s.' % (style,sorted(EDGE_STYLES)))
+
+    ## validate every style before changing any edge
+    resolved = [(style,EDGE_STYLES[style][0],_style_values('Edge',style,value,edges,EDGE_STYLES[style][1])) for style,value in styles.items()]
+    for style,attributes,pairs in resolved:
+        if style == 'k':
+            _check_edge_k(G,pairs)
+
+    if directed is not None:
+        for (source,target),edge_directed in _style_values('Edge','directed',directed,edges,None):
+            data = edge_data[source][target]
+            if edge_directed:
+                data['directed'] = 'true'
+                data['target_arrow_shape'] = 'triangle'
+            else:
+                data['directed'] = 'false'
+                data['target_arrow_shape'] = 'none'
+
+    for style,attributes,pairs in resolved:
+        for attribute in attributes:
+            for (source,target),edge_value in pairs:
+                edge_data[source][target][attribute] = edge_value
+
+def _style_values(element_type,style,value,elements,allowed):
+    '''
+    (element, value) pairs of a style given for many elements, validated against the allowed values.
+    '''
+    if isinstance(value,dict):
+        pairs = [(element,_plain(element_value)) for element,element_value in value.items()]
+    elif isinstance(value,(list,tuple)) or getattr(value,'ndim',0) > 0:
+        ## NumPy arrays become lists of Python numbers, which can be written as JSON
+        if hasattr(value,'tolist'):
+            value = value.tolist()
+        if len(value) != len(elements):
+            raise Exception('%d values of %s given for %d %ss.' % (len(value),style,len(elements),element_type.lower()))
+        pairs = zip(elements,value)
+    else:
+        value = _plain(value)
+        pairs = [(element,value) for element in elements]
+
+    if allowed is not None:
+        for distinct_value in set([element_value for element,element_value in pairs]):
+            if distinct_value not in allowed:
+                raise Exception('"%s" is not an allowed %s. Accepted values for this property are: %s.' % (distinct_value,style,allowed))
+
+    return pairs
+
+def _plain(value):
+    ## NumPy numbers become Python numbers
+    if hasattr(value,'tolist') and getattr(value,'ndim',None) == 0:
+        return value.tolist()
+    return value
+
+def _check_edge_k(G,pairs):
+    '''
+    Edges may only have a k value if both of their nodes have one that is not larger (see add_edge_k).
+    '''
+    node_data = G.node
+    for (source,target),k in pairs:
+        for node_id in (source,target):
+            nodek = node_data[node_id].get('k')
+            if not nodek:
+                raise Exception('Attempting to add a k value %d for edge ("%s","%s"), but node "%s" does not have a k-value.' % (k,source,target,node_id))
+            if nodek > k:
+                raise Exception('Attempting to add a k value %d for edge ("%s","%s"), but node "%s" has a larger k-value (%d).' % (k,source,target,node_id,nodek))
+
 ####################################################################
 ### POSTING FUNCTIONS ##############################################
     
@@ -706,6 +871,9 @@ def convertNXToDict(G,metadata={'description':'','tags':[],'title':''}):
 
     return out
 
+## Compact JSON encoder (no whitespace), used for JSON sent to GraphSpace
+_COMPACT_JSON = json.JSONEncoder(separators=(',',':'))
+
 def convertNXToJSON(G,outfile,metadata=None):
     """ 
     Converts a NetworkX object to a JSON object.
@@ -719,14 +887,21 @@ def convertNXToJSON(G,outfile,metadata=None):
     else:
         graph_dict = convertNXToDict(G)
 
-    ## if outfile is specified, write json to outfile.
-    json.dump(graph_dict,open(outfile,'w'),indent=4)
-    print '\nWrote JSON for graph to outfile %s' % (outfile)
+    _writeJSON(graph_dict,outfile)
     return
 
-def postGraph(G,graphid,outfile,user,password,metadata=None,logfile=None):
+def _writeJSON(graph_dict,outfile):
+    ## write json to outfile, indented so it is easy to read.
+    with open(outfile,'w') as out:
+        json.dump(graph_dict,out,indent=4)
+    print '\nWrote JSON for graph to outfile %s' % (outfile)
+
+def postGraph(G,graphid,outfile=None,user=None,password=None,metadata=None,logfile=None):
     """
     Posts NetworkX graph with id 'graphid' to the account of the user 'user' to GraphSpace.
+    If the user already has a graph with this id, it is replaced.  The graph
+    is encoded as compact JSON in memory and sent as one string, without
+    writing a temporary file.
 
     :param G: NetworkX object
     :param graphid: string -- ID of GraphSpace graph (graph name)
@@ -736,48 +911,45 @@ def postGraph(G,graphid,outfile,user,password,metadata=None,logfile=None):
     :param password: string -- graph owner's password
     :param metadata: dictionary of metadata for graph. Optional.
     :param logfile: filename for command outputs.  Optional.
+    :returns: dictionary -- JSON response of GraphSpace
     """
+    if user is None or password is None:
+        raise TypeError('postGraph() needs the user and password of the graph owner.\n')
+
     if logfile:
         logout = open(logfile,'w')
     else:
         logout = None
         
-    # convert NetworkX object to a serialized_graph
-    convertNXToJSON(G,outfile,metadata)
-
-    # check to see if this graph is already in GraphSpace.
-    graph_exists = False
-    cmd = _constructExistsCommand(graphid,user,password)
-    outstring = execute(cmd,logout)
-    outstring = json.loads(outstring)
-    if outstring["StatusCode"] == 200:
-        # a status code of 200 indicates that a graph already exists.
-        graph_exists = True
-
-    if graph_exists:  
-        #print '\nUpdating existing graph %s from user %s' % (graphid,user)
-        cmd = _constructUpdateCommand(graphid,user,password,outfile)
-        execute(cmd,logout)
-        
+    # convert NetworkX object to a JSON-ready dictionary
+    if metadata:
+        graph_dict = convertNXToDict(G,metadata)
     else:
-        #print '\nGraph does not exist. Posting new graph %s from user %s' % (graphid,user)
-        cmd = _constructPostCommand(graphid,user,password,outfile)
-        execute(cmd,logout)
+        graph_dict = convertNXToDict(G)
+
+    if outfile:
+        _writeJSON(graph_dict,outfile)
+
+    # posts the graph, or updates it if it already exists (one request, no separate check)
+    client = GraphSpaceClient(user,password,logout=logout)
+    response = client.put_graph(graphid,_COMPACT_JSON.encode(graph_dict))
     
     if logout:
         print 'command output written to %s' % (logfile)
         logout.close()
 
+    return response
+
 def deleteGraph(graphid,user,password):
     """
     Removes a graph (denoted by graphid and user) from GraphSpace.
     :param graphid: ID of GraphSpace graph (graph name)
     :param user: graph owner's username
     :param password: graph owner's password
+    :returns: dictionary -- JSON response of GraphSpace
     """
     print '\nRemoving existing graph %s from user %s' % (graphid,user)
-    cmd = _constructDeleteCommand(graphid,user,password)
-    execute(cmd)
+    return GraphSpaceClient(user,password).delete_graph(graphid)
    
 def shareGraph(graphid,user,password,group):
     """
@@ -786,60 +958,503 @@ def shareGraph(graphid,user,password,group):
     :param user: graph owner's username
     :param password: graph owner's password
     :param group: group to share graph with.
+    :returns: dictionary -- JSON response of GraphSpace
     """
     print '\nSharing existing graph %s from user %s with group %s' % (graphid,user,group)
-    cmd = _constructShareCommand(graphid,user,password,group)
-    outstring = execute(cmd)
+    return GraphSpaceClient(user,password).share_graph(graphid,group)
 
 
 ####################################################################
-### CURL COMMANDS  #################################################
-
-## TODO: add block comments with param/return descriptions.
-def _constructExistsCommand(graphid,user,password):
-    cmd = 'curl -X POST %s/api/users/%s/graph/exists/%s/ -F username=%s -F password=%s ; echo' % \
-          (URL,user,graphid,user,password)
-    return cmd
-
-def _constructPostCommand(graphid,user,password,outfile):
-    cmd = 'curl -X POST %s/api/users/%s/graph/add/%s/ -F username=%s -F password=%s -F graphname=@%s ; echo'  % \
-          (URL, user, graphid, user, password, outfile) 
-    return cmd
-
-def _constructUpdateCommand(graphid,user,password,outfile):
-    cmd = 'curl -X POST %s/api/users/%s/graph/update/%s/ -F username=%s -F password=%s -F graphname=@%s ; echo'  % \
-          (URL, user, graphid, user, password, outfile) 
-    return cmd
-
-def _constructDeleteCommand(graphid,user,password):
-    cmd = 'curl -X POST %s/api/users/%s/graph/delete/%s/ -F username=%s -F password=%s ; echo'  % \
-          (URL, user, graphid, user, password) 
-    return cmd
-
-def _constructShareCommand(graphid,user,password,groupid):
-    cmd = 'curl -X POST %s/api/users/graphs/%s/share/%s/%s/ -F username=%s -F password=%s ; echo'  % \
-          (URL, graphid,user,groupid,user,password)
-    return cmd
-
-def execute(cmd,logout=None):
-    """
-    Executes the command, using subprocess.Popen.  We need to capture
-    the output, so we cannot simply us os.system().
-    :param cmd: string -- command to execute
-    :param logout: File object -- File of log output or None.
-    :return out: string -- output of command
-    """
-    print cmd
-    proc = subprocess.Popen(cmd.split(), shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (out, err) = proc.communicate()
-    if logout:
-        logout.write(cmd+'\n')
-        logout.write(out+'\n')
-    if 'ERROR' in out:
-        print 'Error in output string of CURL command:'
-        print out
-        sys.exit()
-    return out
+### REST API CLIENT  ###############################################
+
+class GraphSpaceError(Exception):
+    """
+    GraphSpace could not be reached, or did not answer with JSON.
+    """
+    pass
+
+class ConnectionPool(object):
+    """
+    Open HTTP(S) connections to one GraphSpace server.  A connection is
+    handed to one request at a time and kept open afterwards (keep-alive),
+    so consecutive calls do not pay for a new TCP/TLS handshake.  Safe to
+    share between threads.
+    """
+    def __init__(self,url,max_idle=4,timeout=300):
+        """
+        :param url: string -- address of GraphSpace (eg http://localhost:8000)
+        :param max_idle: int -- most idle connections kept open
+        :param timeout: int -- seconds to wait for the server
+        """
+        parsed = urlparse.urlparse(url)
+        if parsed.scheme == 'https':
+            self.connection_class = httplib.HTTPSConnection
+        else:
+            self.connection_class = httplib.HTTPConnection
+        self.host = parsed.netloc
+        self.base_path = parsed.path.rstrip('/')
+        self.timeout = timeout
+        self.idle = Queue.LifoQueue(max_idle)
+
+    def get(self):
+        """
+        :returns: (connection, reused) -- an idle connection, or a new one
+        """
+        try:
+            return self.idle.get_nowait(), True
+        except Queue.Empty:
+            return self.connection_class(self.host,timeout=self.timeout), False
+
+    def put(self,connection):
+        """
+        Return a connection whose response has been read completely.
+        """
+        try:
+            self.idle.put_nowait(connection)
+        except Queue.Full:
+            connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except Queue.Empty:
+                return
+
+## connection pools, by GraphSpace address
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _pool_for(url):
+    with _pools_lock:
+        if url not in _pools:
+            _pools[url] = ConnectionPool(url)
+        return _pools[url]
+
+class GraphSpaceClient(object):
+    """
+    Calls the GraphSpace REST API for one user, in process and over
+    connections that stay open between calls (see ConnectionPool).  Graphs
+    are uploaded as streamed multipart requests, so they are never read
+    into memory as a whole, and responses are returned as dictionaries.
+
+    Clients are cheap to create: all clients for the same address share
+    their connections.
+
+    Example:
+      client = GraphSpaceClient('tester@test.com','test')
+      with open('graph.json','rb') as graph_file:
+          client.add_graph('graph1',graph_file)
+      client.share_graph('graph1','testgroup')
+    """
+
+    ## bytes of a file sent at a time
+    BLOCK_SIZE = 64*1024
+
+    def __init__(self,user,password,url=None,logout=None):
+        """
+        :param user: string -- username (email) of the user
+        :param password: string -- password or API token of the user
+        :param url: string -- address of GraphSpace (the module's URL if not specified)
+        :param logout: File object -- File to log requests and responses to, or None.
+        """
+        self.user = user
+        self.password = password
+        self.pool = _pool_for(url or URL)
+        self.logout = logout
+
+    def graph_exists(self,graphid):
+        """
+        :param graphid: string -- ID of GraphSpace graph (graph name)
+        :returns: boolean -- True if the user owns a graph with this ID
+        """
+        response = self.request('/api/users/%s/graph/exists/%s/' % (_quote(self.user),_quote(graphid)))
+        return response.get('StatusCode') == 200
+
+    def add_graph(self,graphid,graph):
+        """
+        Posts a new graph.
+
+        :param graphid: string -- ID of GraphSpace graph (graph name)
+        :param graph: JSON of the graph -- string, or file object to stream it from
+        :returns: dictionary -- JSON response of GraphSpace
+        """
+        return self.request('/api/users/%s/graph/add/%s/' % (_quote(self.user),_quote(graphid)),files={'graphname':(graphid+'.json',graph)})
+
+    def update_graph(self,graphid,graph):
+        """
+        Replaces an existing graph.
+
+        :param graphid: string -- ID of GraphSpace graph (graph name)
+        :param graph: JSON of the graph -- string, or file object to stream it from
+        :returns: dictionary -- JSON response of GraphSpace
+        """
+        return self.request('/api/users/%s/graph/update/%s/' % (_quote(self.user),_quote(graphid)),files={'graphname':(graphid+'.json',graph)})
+
+    def put_graph(self,graphid,graph):
+        """
+        Posts a graph, replacing the graph with the same ID if the user
+        already has one (in a single request, without checking first).
+
+        :param graphid: string -- ID of GraphSpace graph (graph name)
+        :param graph: JSON of the graph -- string, or file object to stream it from
+        :returns: dictionary -- JSON response of GraphSpace
+        """
+        return self.request('/api/users/%s/graph/add/%s/' % (_quote(self.user),_quote(graphid)),fields={'replace':'1'},files={'graphname':(graphid+'.json',graph)})
+
+    def delete_graph(self,graphid):
+        """
+        :param graphid: string -- ID of GraphSpace graph (graph name)
+        :returns: dictionary -- JSON response of GraphSpace
+        """
+        return self.request('/api/users/%s/graph/delete/%s/' % (_quote(self.user),_quote(graphid)))
+
+    def share_graph(self,graphid,group):
+        """
+        Shares a graph of the user with a group the user owns.
+
+        :param graphid: string -- ID of GraphSpace graph (graph name)
+        :param group: string -- group to share graph with
+        :returns: dictionary -- JSON response of GraphSpace
+        """
+        return self.request('/api/users/graphs/%s/share/%s/%s/' % (_quote(graphid),_quote(self.user),_quote(group)))
+
+    def batch(self,operations):
+        """
+        Applies a list of operations to many graphs of the user in a single
+        request.  Every operation is a dictionary, eg
+        {'operation':'make_public','graph_ids':['graph1','graph2']} or
+        {'operation':'share','graph_ids':['graph1'],'group_owner':'tester@test.com','group_id':'testgroup'}.
+        Operations are get, exists, delete, make_public, make_private and share.
+
+        :param operations: list -- operations to apply, in order
+        :returns: dictionary -- JSON response of GraphSpace. Its Results list holds, for every operation,
+        the result for each of its graphs (JSON of the graph or None for get, True or False otherwise).
+        """
+        return self.request('/api/users/%s/graphs/batch/' % (_quote(self.user)),fields={'operations':json.dumps(operations)})
+
+    def request(self,path,fields=None,files=None):
+        """
+        POSTs a multipart form (with the username and password of the client) to GraphSpace.
+
+        :param path: string -- path of the REST API call (eg /api/users/<user>/graphs/)
+        :param fields: dictionary -- other form fields. Optional.
+        :param files: dictionary -- field name to (file name, string or file object). Optional.
+        :returns: dictionary -- JSON response of GraphSpace
+        :raises GraphSpaceError: GraphSpace could not be reached or did not answer with JSON.
+        """
+        form = {'username':self.user,'password':self.password}
+        form.update(fields or {})
+
+        boundary = uuid.uuid4().hex
+        parts = _multipart_parts(boundary,form,files or {})
+        length = sum([_part_length(part) for part in parts])
+
+        # start of every file, so the body can be sent again
+        files = [part for part in parts if _is_file(part)]
+        starts = [part.tell() for part in files]
+
+        path = self.pool.base_path + path
+        if self.logout:
+            self.logout.write('POST %s\n' % (path))
+
+        connection,reused = self.pool.get()
+        while True:
+            try:
+                status,body,will_close = self._send(connection,path,boundary,parts,length)
+                break
+            except (httplib.HTTPException,socket.error) as e:
+                connection.close()
+                if not reused:
+                    raise GraphSpaceError('Could not reach GraphSpace at %s: %s' % (self.pool.host,e))
+            # the server closed the idle connection, try once more with a new one
+            for part,start in zip(files,starts):
+                part.seek(start)
+            connection,reused = self.pool.connection_class(self.pool.host,timeout=self.pool.timeout),False
+
+        if will_close:
+            connection.close()
+        else:
+            self.pool.put(connection)
+
+        if self.logout:
+            self.logout.write(body+'\n')
+
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise GraphSpaceError('GraphSpace answered %s with HTTP %d: %s' % (path,status,body[:200]))
+
+    def _send(self,connection,path,boundary,parts,length):
+        connection.putrequest('POST',path,skip_accept_encoding=True)
+        connection.putheader('Content-Type','multipart/form-data; boundary=%s' % (boundary))
+        connection.putheader('Content-Length',str(length))
+        connection.endheaders()
+
+        for part in parts:
+            if isinstance(part,str):
+                connection.send(part)
+                continue
+            # stream files instead of reading them into memory
+            while True:
+                block = part.read(self.BLOCK_SIZE)
+                if not block:
+                    break
+                if isinstance(block,unicode):
+                    block = block.encode('utf-8')
+                connection.send(block)
+
+        response = connection.getresponse()
+        # the whole response has to be read before the connection can be used again
+        body = response.read()
+        return response.status,body,response.will_close
+
+####################################################################
+### BULK POSTING  ##################################################
+
+def postGraphs(graphs,user,password,processes=None,threads=4,retries=3,backoff=1.0,metadata=None,logfile=None):
+    """
+    Posts many graphs to the account of the user 'user'.  Graphs are
+    converted to JSON in a pool of processes and uploaded by a bounded
+    pool of threads over kept-alive connections (see GraphSpaceClient).
+    Existing graphs with the same ID are replaced.  Uploads that fail
+    because GraphSpace could not be reached are retried, waiting
+    backoff, 2*backoff, 4*backoff, ... seconds in between.  Graphs that
+    GraphSpace rejects (eg invalid JSON) are not retried.
+
+    :param graphs: directory of graphs, or iterable of (graphid, G) or
+    (graphid, G, metadata) tuples.  In a directory, every <graphid>.json
+    file (GraphSpace JSON, eg written by convertNXToJSON) and every
+    <graphid>.gpickle file (pickled NetworkX object) is posted.
+    :param user: string -- graph owner's username
+    :param password: string -- graph owner's password or API token
+    :param processes: int -- processes converting graphs (number of CPUs if not specified, 1 converts in this process)
+    :param threads: int -- simultaneous uploads
+    :param retries: int -- attempts after the first one for an upload that could not reach GraphSpace
+    :param backoff: float -- seconds to wait before the first retry
+    :param metadata: dictionary of metadata for graphs without their own. Optional.
+    :param logfile: filename for a line per graph posted.  Optional.
+    :returns: dictionary -- {'posted': <int>, 'failed': <list of (graphid, error)>, 'seconds': <float>,
+      'graphs_per_second': <float>, 'megabytes_per_second': <float>}
+    """
+    if isinstance(graphs,basestring):
+        graphs = _graphs_in_directory(graphs)
+
+    if logfile:
+        logout = open(logfile,'w')
+    else:
+        logout = None
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+
+    # graphs being converted, waiting for an upload thread or being uploaded.  Taken before a
+    # graph is handed to the converters and given back once it is uploaded, so conversion
+    # never runs more than this many graphs ahead of the uploads
+    in_flight = threading.Semaphore(processes+threads*2)
+    # (graphid, result of the conversion) in the order the graphs were handed to the converters
+    converting = Queue.Queue()
+    # converted graphs waiting for an upload thread
+    pending = Queue.Queue()
+    report = {'posted':0,'failed':[],'bytes':0}
+    report_lock = threading.Lock()
+
+    def failed(graphid,error):
+        with report_lock:
+            report['failed'].append((graphid,error))
+            if logout:
+                logout.write('%s\t%s\n' % (graphid,error))
+        in_flight.release()
+
+    def converted(result):
+        graphid,graph_json,path,error = result
+        if error is not None:
+            failed(graphid,error)
+        else:
+            pending.put((graphid,graph_json,path))
+
+    def collect():
+        # hands the graphs converted in the pool to the upload threads
+        while True:
+            item = converting.get()
+            if item is None:
+                return
+            graphid,result = item
+            try:
+                converted(result.get())
+            except Exception as e:
+                # the graph could not be sent to the conversion processes (eg it can not be pickled)
+                failed(graphid,'Could not convert graph: %s' % (e))
+
+    def upload():
+        client = GraphSpaceClient(user,password)
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            graphid,graph_json,path = item
+            try:
+                error,size = _post_with_retries(client,graphid,graph_json,path,retries,backoff)
+            except Exception as e:
+                # keep the thread alive, the other graphs still have to be posted
+                error,size = str(e),0
+            in_flight.release()
+            with report_lock:
+                if error is None:
+                    report['posted'] += 1
+                    report['bytes'] += size
+                else:
+                    report['failed'].append((graphid,error))
+                if logout:
+                    logout.write('%s\t%s\n' % (graphid,error or 'posted'))
+
+    uploaders = [threading.Thread(target=upload) for i in range(threads)]
+    for uploader in uploaders:
+        uploader.daemon = True
+        uploader.start()
+
+    start = time.time()
+    pool = None
+    collector = None
+    try:
+        if processes > 1:
+            pool = multiprocessing.Pool(processes)
+            collector = threading.Thread(target=collect)
+            collector.daemon = True
+            collector.start()
+
+        for graph in graphs:
+            task = _conversion_task(graph,metadata)
+            in_flight.acquire()
+            if pool is not None:
+                converting.put((task[0],pool.apply_async(_convert_graph,(task,))))
+            else:
+                converted(_convert_graph(task))
+    finally:
+        if collector is not None:
+            converting.put(None)
+            collector.join()
+        for uploader in uploaders:
+            pending.put(None)
+        for uploader in uploaders:
+            uploader.join()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if logout:
+            logout.close()
+
+    seconds = time.time() - start
+    summary = {'posted':report['posted'],'failed':report['failed'],'seconds':seconds,
+               'graphs_per_second':report['posted']/max(seconds,1e-6),
+               'megabytes_per_second':report['bytes']/1e6/max(seconds,1e-6)}
+    print 'Posted %d graphs (%d failed) in %.1f seconds: %.1f graphs/second, %.2f MB/second' % \
+        (summary['posted'],len(summary['failed']),seconds,summary['graphs_per_second'],summary['megabytes_per_second'])
+    return summary
+
+def _graphs_in_directory(directory):
+    """
+    (graphid, path) of every graph file in a directory.
+    """
+    for filename in sorted(os.listdir(directory)):
+        graphid,extension = os.path.splitext(filename)
+        if extension in ('.json','.gpickle'):
+            yield (graphid,os.path.join(directory,filename))
+
+def _conversion_task(graph,metadata):
+    """
+    (graphid, G or path, metadata) for _convert_graph.
+    """
+    if len(graph) == 3:
+        return graph
+    return (graph[0],graph[1],metadata)
+
+def _convert_graph(task):
+    """
+    Converts a graph to compact JSON (runs in the conversion processes).
+
+    :param task: (graphid, G or path of a graph file, metadata)
+    :returns: (graphid, JSON string or None, path of a JSON file to post or None, error or None)
+    """
+    graphid,graph,metadata = task
+    try:
+        if isinstance(graph,basestring):
+            # JSON files are posted as they are, straight from the file
+            if graph.endswith('.json'):
+                return (graphid,None,graph,None)
+            graph = nx.read_gpickle(graph)
+        if metadata:
+            graph_dict = convertNXToDict(graph,metadata)
+        else:
+            graph_dict = convertNXToDict(graph)
+        return (graphid,_COMPACT_JSON.encode(graph_dict),None,None)
+    except Exception as e:
+        return (graphid,None,None,'Could not convert graph: %s' % (e))
+
+def _post_with_retries(client,graphid,graph_json,path,retries,backoff):
+    """
+    Posts a graph, retrying while GraphSpace can not be reached.
+
+    :returns: (error or None, bytes posted)
+    """
+    for attempt in range(retries+1):
+        try:
+            if path is not None:
+                with open(path,'rb') as graph_file:
+                    response = client.put_graph(graphid,graph_file)
+                size = os.path.getsize(path)
+            else:
+                response = client.put_graph(graphid,graph_json)
+                size = len(graph_json)
+        except GraphSpaceError as e:
+            if attempt == retries:
+                return (str(e),0)
+            time.sleep(backoff*(2**attempt))
+            continue
+
+        if response.get('StatusCode') in (200,201,202):
+            return (None,size)
+        return (response.get('Error','Unexpected response: %s' % (response)),0)
+
+def _quote(value):
+    return urllib.quote(_utf8(value),safe='@')
+
+def _utf8(value):
+    if isinstance(value,unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+def _multipart_parts(boundary,fields,files):
+    """
+    Pieces of a multipart/form-data body: strings, and file objects to stream.
+    """
+    parts = []
+    for name,value in fields.items():
+        if value is None:
+            continue
+        parts.append('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n' % (boundary,_utf8(name),_utf8(value)))
+    for name,(filename,content) in files.items():
+        parts.append('--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\nContent-Type: application/json\r\n\r\n' % (boundary,_utf8(name),_utf8(filename).replace('"','')))
+        if isinstance(content,basestring):
+            parts.append(_utf8(content))
+        else:
+            parts.append(content)
+        parts.append('\r\n')
+    parts.append('--%s--\r\n' % (boundary))
+    return parts
+
+def _is_file(part):
+    return hasattr(part,'read')
+
+def _part_length(part):
+    if isinstance(part,str):
+        return len(part)
+    # bytes left in the file
+    start = part.tell()
+    part.seek(0,os.SEEK_END)
+    end = part.tell()
+    part.seek(start)
+    return end - start
 
 ## AR: The examples in this main() function will bepart of the Programmer's Guide instead of here.  I have left it in for now for testing.
 # make user and password command line options.
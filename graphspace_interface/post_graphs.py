@@ -0,0 +1,46 @@
+#!/usr/bin/python
+
+## Posts every graph in a directory to GraphSpace (see postGraphs in
+## graphspace_interface.py).  Graphs that already exist are replaced.
+##
+## Usage (from within the current directory):
+##
+## python post_graphs.py --user=tester@test.com --password=test graphs/
+##
+## The directory may contain GraphSpace JSON files (<graphid>.json) and
+## pickled NetworkX graphs (<graphid>.gpickle).
+
+import sys
+from optparse import OptionParser
+
+import graphspace_interface as interface
+
+def main(args):
+    usage = 'python post_graphs.py [options] <directory>'
+    parser = OptionParser(usage=usage)
+    parser.add_option('--user',type='string',help='Username (email) of the owner of the graphs. Required.')
+    parser.add_option('--password',type='string',help='Password or API token of the owner of the graphs. Required.')
+    parser.add_option('--url',type='string',default=interface.URL,help='Address of GraphSpace. Default=%default.')
+    parser.add_option('--processes',type='int',default=None,help='Processes converting graphs. Default=number of CPUs.')
+    parser.add_option('--threads',type='int',default=4,help='Simultaneous uploads. Default=%default.')
+    parser.add_option('--retries',type='int',default=3,help='Retries of an upload that could not reach GraphSpace. Default=%default.')
+    parser.add_option('--backoff',type='float',default=1.0,help='Seconds to wait before the first retry, doubled for every next one. Default=%default.')
+    parser.add_option('--logfile',type='string',default=None,help='File to write a line per graph to. Optional.')
+    (opts,directories) = parser.parse_args(args[1:])
+
+    if len(directories) != 1 or not opts.user or not opts.password:
+        parser.error('A directory, --user and --password are required.')
+
+    interface.URL = opts.url
+
+    summary = interface.postGraphs(directories[0],opts.user,opts.password,processes=opts.processes,
+                                   threads=opts.threads,retries=opts.retries,backoff=opts.backoff,logfile=opts.logfile)
+
+    for graphid,error in summary['failed']:
+        print 'Could not post %s: %s' % (graphid,error)
+
+    if summary['failed']:
+        sys.exit(1)
+
+if __name__=='__main__':
+    main(sys.argv)
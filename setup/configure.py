@@ -37,6 +37,7 @@ if __name__ == "__main__":
 	# sudo pip install django-analytical
 	# sudo pip install poster
 	# sudo pip install networkx
+	# sudo pip install ijson (optional, validates large uploads without loading them into memory)
 	import pip
 
 	install("django")
@@ -45,6 +46,7 @@ if __name__ == "__main__":
 	install("django-analytical")
 	install("poster")
 	install("networkx")
+	install("ijson")
 
 	version =  django.VERSION
 
@@ -0,0 +1,75 @@
+'''
+	Tests of json_validator.assign_edge_ids: every edge gets an ID of the
+	form source-target, parallel edges get source-target1, source-target2,
+	... and no ID is ever handed out twice.
+
+	Run from the tests directory: python edge_ids_test.py
+'''
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from graphs.util.json_validator import assign_edge_ids
+
+def graph_with_edges(edges):
+	'''
+		Graph JSON with the given edges (list of edge data dictionaries).
+	'''
+	return {'metadata': {}, 'graph': {'nodes': [], 'edges': [{'data': edge} for edge in edges]}}
+
+def edge_ids(graph):
+	return [edge['data']['id'] for edge in graph['graph']['edges']]
+
+def testParallelEdges():
+	graph = assign_edge_ids(graph_with_edges([{'source': 'A', 'target': 'B'}, {'source': 'A', 'target': 'B'}, {'source': 'A', 'target': 'B'}, {'source': 'B', 'target': 'A'}]))
+
+	assert edge_ids(graph) == ['A-B', 'A-B1', 'A-B2', 'B-A'], "Wrong ID's for parallel edges: " + str(edge_ids(graph))
+
+	print "Passed testParallelEdges test!"
+
+def testGeneratedIdsDoNotCollide():
+	# The third edge can not get A-B1, an edge between A and B1 already has it
+	graph = assign_edge_ids(graph_with_edges([{'source': 'A', 'target': 'B'}, {'source': 'A', 'target': 'B1'}, {'source': 'A', 'target': 'B'}]))
+
+	assert edge_ids(graph) == ['A-B', 'A-B1', 'A-B2'], "Generated ID's collide: " + str(edge_ids(graph))
+
+	print "Passed testGeneratedIdsDoNotCollide test!"
+
+def testExistingIdsAreReserved():
+	# Edges that come with an ID keep it, and nothing else is given that ID (even edges before them)
+	graph = assign_edge_ids(graph_with_edges([{'source': 'A', 'target': 'B'}, {'source': 'A', 'target': 'B'}, {'source': 'C', 'target': 'D', 'id': 'A-B'}, {'source': 'C', 'target': 'D', 'id': 'A-B1'}]), keep_existing=True)
+
+	ids = edge_ids(graph)
+
+	assert ids[2:] == ['A-B', 'A-B1'], "Existing ID's were changed: " + str(ids)
+	assert len(set(ids)) == len(ids), "Reserved ID's were handed out again: " + str(ids)
+	assert ids[:2] == ['A-B2', 'A-B3'], "Wrong ID's next to reserved ones: " + str(ids)
+
+	print "Passed testExistingIdsAreReserved test!"
+
+def testNumericNodes():
+	graph = assign_edge_ids(graph_with_edges([{'source': 1, 'target': 2}, {'source': 1, 'target': 2}, {'source': 1.5, 'target': 2}, {'source': 1, 'target': '2'}]))
+
+	assert edge_ids(graph) == ['1-2', '1-21', '1.5-2', '1-22'], "Wrong ID's for numeric nodes: " + str(edge_ids(graph))
+
+	print "Passed testNumericNodes test!"
+
+def testAllIdsUnique():
+	edges = []
+	for i in xrange(3000):
+		edges.append({'source': i % 7, 'target': (i % 11) + 1})
+
+	ids = edge_ids(assign_edge_ids(graph_with_edges(edges)))
+
+	assert len(set(ids)) == len(ids), "assign_edge_ids produced duplicate ID's"
+
+	print "Passed testAllIdsUnique test!"
+
+if __name__ == '__main__':
+	testParallelEdges()
+	testGeneratedIdsDoNotCollide()
+	testExistingIdsAreReserved()
+	testNumericNodes()
+	testAllIdsUnique()
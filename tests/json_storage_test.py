@@ -0,0 +1,83 @@
+'''
+	Round trip tests of graphs.util.json_storage: graph JSON written in every
+	storage format, in one piece (encode) or in pieces (encode_chunks, as
+	insert_graph_stream writes it), has to read back unchanged (decode).
+
+	Run from the tests directory: python json_storage_test.py
+'''
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'graphspace.settings')
+
+from graphs.util import json_storage
+
+def example_json():
+	'''
+		JSON text of a graph large enough to be compressed in several blocks.
+	'''
+	nodes = [{'data': {'id': 'n%d' % i, 'content': u'Node \u00e9 %d' % i}} for i in xrange(20000)]
+	edges = [{'data': {'source': 'n%d' % i, 'target': 'n%d' % (i + 1)}} for i in xrange(19999)]
+	return json_storage.dumps({'metadata': {'tags': ['tutorial']}, 'graph': {'nodes': nodes, 'edges': edges}})
+
+def chunks_of(json_text, size):
+	return [json_text[start:start + size] for start in xrange(0, len(json_text), size)]
+
+def formats():
+	'''
+		Formats that can be tested here (zstd needs the zstandard package).
+	'''
+	if json_storage.zstandard == None:
+		print "zstandard is not installed, skipping the zstd format"
+		return ['text', 'zlib']
+
+	return ['text', 'zlib', 'zstd']
+
+def testEncodeRoundTrip():
+	json_text = example_json()
+
+	for storage_format in formats():
+		value = json_storage.encode(json_text, storage_format)
+
+		assert json_storage.format_of(value) == storage_format, "encode wrote " + json_storage.format_of(value) + " instead of " + storage_format
+		assert json_storage.decode(value) == json_text, "encode/decode changed the JSON in " + storage_format
+
+	print "Passed testEncodeRoundTrip test!"
+
+def testEncodeChunksRoundTrip():
+	json_text = example_json()
+
+	for storage_format in formats():
+		for size in (1, 1000, 64 * 1024):
+			value = json_storage.encode_chunks(chunks_of(json_text, size), storage_format)
+
+			assert json_storage.format_of(value) == storage_format, "encode_chunks wrote " + json_storage.format_of(value) + " instead of " + storage_format
+			assert json_storage.decode(value) == json_text, "encode_chunks/decode changed the JSON in " + storage_format + " (chunks of " + str(size) + ")"
+
+	print "Passed testEncodeChunksRoundTrip test!"
+
+def testGraphJsonWriterRoundTrip():
+	graph_json = json.loads(example_json())
+
+	for storage_format in formats():
+		writer = json_storage.GraphJsonWriter()
+		try:
+			for list_name in ('nodes', 'edges'):
+				for element in graph_json['graph'][list_name]:
+					writer.add(list_name, element)
+
+			value = writer.encode({}, {'metadata': graph_json['metadata']}, storage_format)
+		finally:
+			writer.close()
+
+		assert json.loads(json_storage.decode(value)) == graph_json, "GraphJsonWriter/decode changed the JSON in " + storage_format
+
+	print "Passed testGraphJsonWriterRoundTrip test!"
+
+if __name__ == '__main__':
+	testEncodeRoundTrip()
+	testEncodeChunksRoundTrip()
+	testGraphJsonWriterRoundTrip()
@@ -5,6 +5,7 @@ import json
 import sqlite3 as lite
 import bcrypt
 import os
+import time
 
 URL_PATH = "http://localhost:8000/"
 DB_FULL_PATH = os.path.dirname(os.path.realpath("../graphspace.db")) + "/graphspace.db"
@@ -170,6 +171,43 @@ def testUpdateGraph(email, password, filename):
 
 	os.remove("test.json")
 
+def testUpsertGraph(email, password, filename):
+	register_openers()
+
+	orig_json = byteify(json.loads(open(filename, 'r').read()))
+	orig_json['metadata']['name'] = "Testing Upsert"
+
+	new_json = open('test.json', 'w+')
+	new_json.write(json.dumps(orig_json, sort_keys=True, indent=4, separators=(',', ': ')))
+	new_json.close()
+
+	# Adding a graph that already exists with replace=1 updates it
+	datagen, headers = multipart_encode({"username": email, "password": password, "replace": "1", "graphname": open('test.json', "r")})
+	url = URL_PATH + "api/users/" + email + "/graph/add/" + filename + "/"
+
+	request = urllib2.Request(url, datagen, headers)
+
+	response = byteify(json.loads(urllib2.urlopen(request).read()))
+
+	if 'Error' in response:
+		print "Error in testUpsertGraph: " + response['Error']
+	else:
+		datagen, headers = multipart_encode({"username": email, "password": password})
+		url = URL_PATH + "api/users/" + email + "/graph/get/" + filename + "/"
+
+		request = urllib2.Request(url, datagen, headers)
+
+		response = byteify(json.loads(urllib2.urlopen(request).read()))
+
+		if 'Error' in response:
+			print "Error in testUpsertGraph: " + response['Error']
+		elif response['metadata']['name'] == 'Testing Upsert':
+			print "Passed testUpsertGraph test!"
+		else:
+			print "Error in testUpsertGraph: Didn't replace JSON correctly!"
+
+	os.remove("test.json")
+
 def testGetUserGraphs(email, password):
 	register_openers()
 	
@@ -263,6 +301,57 @@ def testMakeGraphPrivate(email, password, filename):
 			if con:
 				con.close()
 
+def testBatchOperations(email, password, filename):
+	register_openers()
+
+	operations = [
+		{"operation": "exists", "graph_ids": [filename, "no_such_graph"]},
+		{"operation": "make_public", "graph_ids": [filename]},
+		{"operation": "get", "graph_ids": [filename]},
+		{"operation": "make_private", "graph_ids": [filename]}
+	]
+
+	datagen, headers = multipart_encode({"username": email, "password": password, "operations": json.dumps(operations)})
+	url = URL_PATH + "api/users/" + email + "/graphs/batch/"
+
+	request = urllib2.Request(url, datagen, headers)
+
+	response = byteify(json.loads(urllib2.urlopen(request).read()))
+
+	if 'Error' in response:
+		print "Error in testBatchOperations: " + response['Error']
+		return
+
+	results = response['Results']
+
+	if results[0]['graphs'] != {filename: True, "no_such_graph": False}:
+		print "Error in testBatchOperations: Wrong result for exists: ", results[0]['graphs']
+	elif results[1]['graphs'] != {filename: True} or results[3]['graphs'] != {filename: True}:
+		print "Error in testBatchOperations: Visibility was not changed!"
+	elif results[2]['graphs'][filename] == None or 'metadata' not in results[2]['graphs'][filename]:
+		print "Error in testBatchOperations: Retrieved wrong JSON!"
+	else:
+		con = None
+		try:
+			con = lite.connect(DB_FULL_PATH)
+			cur = con.cursor()
+
+			cur.execute('select public from graph where graph_id = ? and user_id = ?', (filename, email))
+			data = cur.fetchone()
+
+			if data == None:
+				print "Error in testBatchOperations: " + filename + " does not exist!"
+			elif data[0] == 0:
+				print "Passed testBatchOperations test!"
+			else:
+				print "Error in testBatchOperations: " + filename + " is still public!"
+
+		except lite.Error, e:
+			print 'Error %s:' % e.args[0]
+
+		finally:
+			if con:
+				con.close()
 
 def testRemoveGraph(email, password, filename):
 	register_openers()
@@ -279,6 +368,111 @@ def testRemoveGraph(email, password, filename):
 	else:
 		print "Passed testRemoveGraph test!"
 
+def testAsyncUploadAndJobStatus(email, password, filename):
+	register_openers()
+
+	graph_name = "async_" + filename
+
+	datagen, headers = multipart_encode({"username": email, "password": password, "async": "1", "graphname": open(filename, "r")})
+	url = URL_PATH + "api/users/" + email + "/graph/add/" + graph_name + "/"
+
+	request = urllib2.Request(url, datagen, headers)
+
+	response = byteify(json.loads(urllib2.urlopen(request).read()))
+
+	if 'Error' in response:
+		print "Error in testAsyncUploadAndJobStatus: " + response['Error']
+		return
+	elif response['StatusCode'] != 202 or 'JobId' not in response:
+		print "Error in testAsyncUploadAndJobStatus: Upload was not queued as a job!"
+		return
+
+	# Wait for a job worker (python manage.py run_job_workers) to run the job
+	job = None
+	for attempt in range(30):
+		datagen, headers = multipart_encode({"username": email, "password": password})
+		url = URL_PATH + "api/jobs/" + str(response['JobId']) + "/"
+
+		request = urllib2.Request(url, datagen, headers)
+
+		status = byteify(json.loads(urllib2.urlopen(request).read()))
+
+		if 'Error' in status:
+			print "Error in testAsyncUploadAndJobStatus: " + status['Error']
+			return
+
+		job = status['Job']
+		if job['status'] in ('done', 'failed'):
+			break
+
+		time.sleep(1)
+
+	if job['status'] == 'done':
+		print "Passed testAsyncUploadAndJobStatus test!"
+	elif job['status'] == 'failed':
+		print "Error in testAsyncUploadAndJobStatus: " + job['error']
+	else:
+		print "Error in testAsyncUploadAndJobStatus: Job is still " + job['status'] + ", are job workers running?"
+
+	# Remove the graph again, so the other tests see a single graph
+	datagen, headers = multipart_encode({"username": email, "password": password})
+	url = URL_PATH + "api/users/" + email + "/graph/delete/" + graph_name + "/"
+
+	request = urllib2.Request(url, datagen, headers)
+	urllib2.urlopen(request).read()
+
+def testApiToken(email, password, filename):
+	register_openers()
+
+	datagen, headers = multipart_encode({"username": email, "password": password, "description": "restapi_test"})
+	url = URL_PATH + "api/users/" + email + "/tokens/add/"
+
+	request = urllib2.Request(url, datagen, headers)
+
+	response = byteify(json.loads(urllib2.urlopen(request).read()))
+
+	if 'Error' in response:
+		print "Error in testApiToken: " + response['Error']
+		return
+
+	token = response['Token']
+
+	# The token is accepted instead of the password
+	datagen, headers = multipart_encode({"username": email, "password": token})
+	url = URL_PATH + "api/users/" + email + "/graph/exists/" + filename + "/"
+
+	request = urllib2.Request(url, datagen, headers)
+
+	response = byteify(json.loads(urllib2.urlopen(request).read()))
+
+	if 'Error' in response:
+		print "Error in testApiToken: Token was not accepted: " + response['Error']
+		return
+
+	datagen, headers = multipart_encode({"username": email, "password": password, "token": token})
+	url = URL_PATH + "api/users/" + email + "/tokens/delete/"
+
+	request = urllib2.Request(url, datagen, headers)
+
+	response = byteify(json.loads(urllib2.urlopen(request).read()))
+
+	if 'Error' in response:
+		print "Error in testApiToken: " + response['Error']
+		return
+
+	# A revoked token is not accepted anymore
+	datagen, headers = multipart_encode({"username": email, "password": token})
+	url = URL_PATH + "api/users/" + email + "/graph/exists/" + filename + "/"
+
+	request = urllib2.Request(url, datagen, headers)
+
+	response = byteify(json.loads(urllib2.urlopen(request).read()))
+
+	if 'Error' in response:
+		print "Passed testApiToken test!"
+	else:
+		print "Error in testApiToken: Revoked token was still accepted!"
+
 def testCreateGroup(email, password, group_name):
 	register_openers()
 	
@@ -572,9 +766,15 @@ if __name__ == '__main__':
 	testGetGraph(email, password, graph_name)
 	testGetGraphExists(email, password, graph_name)
 	testUpdateGraph(email, password, graph_name)
+	testUpsertGraph(email, password, graph_name)
 	testMakeGraphPublic(email, password, graph_name)
 	testMakeGraphPrivate(email, password, graph_name)
+	testBatchOperations(email, password, graph_name)
 	testGetUserGraphs(email, password)
+	testAsyncUploadAndJobStatus(email, password, graph_name)
+
+	# API token Tests
+	testApiToken(email, password, graph_name)
 
 	# Group API Tests
 	testCreateGroup(email, password, group_name)